@@ -0,0 +1,309 @@
+'''
+FilePath: /AutoEmail/backend/app/api.py
+Description: 简历库 REST 接口 (异步，aiosqlite)
+             数据库读写统一由后端进程完成，Streamlit 页面只通过 HTTP 调用 (见 frontend/app/api_client.py)，
+             SQLite 只有一个写入进程，前端可以开多个实例。
+             只给 Streamlit 进程调用，需要 AUTOEMAIL_API_TOKEN 或从本机访问 (见 auth.py)
+
+    GET   /api/resumes/exists?uid=          查重
+    POST  /api/resumes                      提交申请 (multipart：表单字段 + 简历文件)
+    GET   /api/resumes                      筛选 + 时间排序 + keyset 分页
+    GET   /api/resumes/search               全文检索，按相关度排序
+    GET   /api/resumes/count                符合筛选条件的数量
+    GET   /api/jobs                         岗位列表
+    PATCH /api/resumes/{id}/status          修改状态 (带 version 时做乐观锁，被别人改过返回 409)
+    PATCH /api/resumes/status               批量修改状态 (一条 UPDATE，一个事务)
+    GET   /api/resumes/{id}/history         状态变更记录
+    GET   /api/resumes/{id}/files           简历关联的文件
+    GET   /api/blobs/{sha256}               单个文件的元数据 (含原始文件名)
+'''
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Query, UploadFile
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.auth import require_internal
+from backend.app.blob_store import BlobStore, InvalidExtension, filename_ext
+from backend.app.database import (
+    Blob, Resume, ResumeBlob, StatusAudit, blob_rows, build_resume_page_query, build_resume_query,
+    build_resume_search_query, build_status_update, cached_uid_exists, get_async_engine, remember_uid,
+    status_update_result,
+)
+from backend.app.metrics import timed
+from backend.app.rate_limit import SubmitRateLimiter
+from backend.app.text_extract import TextExtractor
+from backend.app.upload import upload_manager
+
+
+router = APIRouter(prefix="/api", tags=["resumes"], dependencies=[Depends(require_internal)])
+blob_store = BlobStore()
+# 页面进程才知道候选人的真实 IP，这里只按手机号限流
+rate_limiter = SubmitRateLimiter()
+# 提交成功后在后台抽取简历正文 (写入全文索引)，响应不等它。
+# 第一次用到时才创建 (连带 ResumeInit 和 engine)，导入本模块不碰数据库
+_text_extractor = None
+_text_extractor_lock = threading.Lock()
+
+
+def get_text_extractor() -> TextExtractor:
+    global _text_extractor
+    with _text_extractor_lock:
+        if _text_extractor is None:
+            _text_extractor = TextExtractor(workers=1)
+        return _text_extractor
+
+PAGE_LIMIT_MAX = 200
+
+
+async def get_session():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def _resume_json(resume: Resume) -> dict:
+    return resume.model_dump(mode="json")
+
+
+def _file_url(sha256: str, ext: str) -> str:
+    return f"/files/{sha256}{ext}"
+
+
+async def _resume_exists(session: AsyncSession, uid: str) -> bool:
+    """进程内缓存 (存在 / 已知不存在) + uid 唯一索引 (与 ResumeInit.uid_exists 相同)"""
+    cached = cached_uid_exists(uid)
+    if cached is not None:
+        return cached
+    found = (await session.exec(select(Resume.id).where(Resume.uid == uid))).first() is not None
+    remember_uid(uid, found)
+    return found
+
+
+@router.get("/resumes/exists")
+async def resume_exists(uid: str, session: AsyncSession = Depends(get_session)):
+    return {"uid": uid, "exists": await _resume_exists(session, uid)}
+
+
+@router.post("/resumes", status_code=201)
+async def submit_resume(
+    background_tasks: BackgroundTasks,
+    uid: str = Form(...),
+    name: str = Form(...),
+    phone_num: str = Form(...),
+    job_position: Optional[str] = Form(None),
+    resume_file: UploadFile = File(...),
+    portfolio_file: Optional[UploadFile] = File(None),
+    portfolio_upload_id: Optional[str] = Form(None),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    候选人提交申请，以 uid (页面按 姓名+电话 生成，见 CandidatePage.generate_hash_uid) 为键幂等：
+    文件先暂存，INSERT ... ON CONFLICT(uid) DO NOTHING 插入成功后才放进仓库，与登记在同一事务；
+    已存在时返回 409，同一手机号提交过于频繁时返回 429。作品集可以直接随表单上传，也可以传分块上传完成后的 upload_id
+    """
+    wait = await run_in_threadpool(rate_limiter.check, None, phone_num)
+    if wait is not None:
+        raise HTTPException(status_code=429, detail="提交过于频繁", headers={"Retry-After": str(int(wait) + 1)})
+
+    # 扩展名来自客户端文件名，先校验再写盘
+    try:
+        res_ext = filename_ext(resume_file.filename)
+        port_ext = filename_ext(portfolio_file.filename) if portfolio_file is not None and portfolio_file.filename else None
+    except InvalidExtension:
+        raise HTTPException(status_code=400, detail="不支持的文件类型")
+
+    port_ref = None
+    if portfolio_upload_id:
+        port_ref = upload_manager.get_completed(portfolio_upload_id)
+        if port_ref is None:
+            raise HTTPException(status_code=400, detail="作品集尚未上传完成")
+
+    staged = []
+    try:
+        # 文件写盘是阻塞操作，放到线程池里；UploadFile 已经是落盘的临时文件，这里分块读
+        res_stage = await run_in_threadpool(blob_store.stage_file, resume_file.file, res_ext)
+        staged.append(res_stage)
+        files = [(res_stage, "attachment", f"{name}_resume{res_ext}")]
+        if port_ext is not None:
+            port_ref = await run_in_threadpool(blob_store.stage_file, portfolio_file.file, port_ext)
+            staged.append(port_ref)
+        if port_ref:
+            files.append((port_ref, "collection", f"{name}_portfolio.{port_ref['ext'].lstrip('.')}"))
+
+        data = Resume(
+            uid=uid, name=name, phone_num=phone_num, job_position=job_position,
+            send_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            attachment_path=res_stage["path"], collection_path=port_ref["path"] if port_ref else None,
+        ).model_dump(exclude={"id"})
+        result = await session.execute(
+            sqlite_insert(Resume).values(**data).on_conflict_do_nothing(index_elements=["uid"])
+        )
+        if result.rowcount == 0:
+            await session.rollback()
+            remember_uid(uid)
+            raise HTTPException(status_code=409, detail="已提交过申请")
+
+        # 插入成功：暂存文件 rename 进仓库，再在同一事务里登记
+        refs = []
+        for ref, role, filename in files:
+            if "tmp_path" in ref:
+                ref = await run_in_threadpool(blob_store.commit_staged, ref)
+            refs.append({**ref, "role": role, "filename": filename})
+        with timed("db_commit"):
+            await session.execute(sqlite_insert(Blob).on_conflict_do_nothing(), blob_rows(refs))
+            session.add_all([ResumeBlob(resume_uid=uid, sha256=r["sha256"], ext=r["ext"], role=r["role"],
+                                        filename=r["filename"])
+                             for r in refs])
+            await session.commit()
+    finally:
+        for ref in staged:
+            blob_store.discard_staged(ref)
+
+    remember_uid(uid)
+    background_tasks.add_task(get_text_extractor().extract_resumes, [uid])
+    print(f"💾 [入库成功] ID: {result.lastrowid} | {name}")
+    return {"id": result.lastrowid, "uid": uid}
+
+
+@router.get("/resumes")
+async def list_resumes(
+    jobs: List[str] = Query(default=[]),
+    statuses: List[str] = Query(default=[]),
+    keyword: Optional[str] = None,
+    ascending: bool = False,
+    cursor_time: Optional[str] = None,
+    cursor_id: Optional[int] = None,
+    limit: int = Query(default=50, ge=1, le=PAGE_LIMIT_MAX),
+    session: AsyncSession = Depends(get_session),
+):
+    """keyset 分页：下一页把返回的 next_cursor 拆成 cursor_time / cursor_id 传回来"""
+    cursor = (cursor_time, cursor_id) if cursor_id is not None else None
+    statement = build_resume_page_query(jobs, statuses, keyword, ascending, cursor, limit)
+    with timed("dashboard_query"):
+        rows = (await session.exec(statement)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = [rows[-1].send_time, rows[-1].id]
+    return {"items": [_resume_json(r) for r in rows], "next_cursor": next_cursor}
+
+
+@router.get("/resumes/search")
+async def search_resumes(
+    keyword: str,
+    jobs: List[str] = Query(default=[]),
+    statuses: List[str] = Query(default=[]),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=PAGE_LIMIT_MAX),
+    session: AsyncSession = Depends(get_session),
+):
+    with timed("dashboard_query"):
+        rows = (await session.exec(build_resume_search_query(keyword, jobs, statuses, limit, offset))).all()
+    return {"items": [_resume_json(r) for r in rows[:limit]],
+            "next_offset": offset + limit if len(rows) > limit else None}
+
+
+@router.get("/resumes/count")
+async def count_resumes(
+    jobs: List[str] = Query(default=[]),
+    statuses: List[str] = Query(default=[]),
+    keyword: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    statement = build_resume_query(select(func.count()).select_from(Resume), jobs, statuses, keyword)
+    with timed("dashboard_query"):
+        return {"count": (await session.exec(statement)).one()}
+
+
+@router.get("/jobs")
+async def job_positions(session: AsyncSession = Depends(get_session)):
+    statement = select(Resume.job_position).where(Resume.job_position.is_not(None)) \
+        .distinct().order_by(Resume.job_position)
+    return {"jobs": (await session.exec(statement)).all()}
+
+
+class StatusUpdate(BaseModel):
+    status: str
+    version: Optional[int] = None   # 页面上看到的行版本；为空时直接覆盖
+
+
+class StatusItem(BaseModel):
+    id: int
+    version: Optional[int] = None
+
+
+class BatchStatusUpdate(BaseModel):
+    status: str
+    items: List[StatusItem]
+
+
+async def _update_statuses(session: AsyncSession, expected: dict, new_status: str) -> dict:
+    """与 ResumeInit.update_statuses 相同：审计记录 + 一条 UPDATE，同一个事务"""
+    audit, update, current = build_status_update(expected, new_status)
+    with timed("db_commit"):
+        await session.execute(audit)
+        updated = (await session.execute(update)).scalars().all()
+        rest = set(expected) - set(updated)
+        current_rows = (await session.execute(current(rest))).all() if rest else []
+        await session.commit()
+    return status_update_result(expected, new_status, updated, current_rows)
+
+
+@router.patch("/resumes/status")
+async def update_statuses(body: BatchStatusUpdate, session: AsyncSession = Depends(get_session)):
+    """返回 {updated, unchanged, conflicts, missing}：conflicts 是 version 对不上 (被别人改过) 的"""
+    if not body.items:
+        return status_update_result({}, body.status, [], [])
+    return await _update_statuses(session, {item.id: item.version for item in body.items}, body.status)
+
+
+@router.patch("/resumes/{resume_id}/status")
+async def update_status(resume_id: int, body: StatusUpdate, session: AsyncSession = Depends(get_session)):
+    result = await _update_statuses(session, {resume_id: body.version}, body.status)
+    if result["missing"]:
+        raise HTTPException(status_code=404, detail="未找到该候选人记录")
+    if result["conflicts"]:
+        raise HTTPException(status_code=409, detail="记录已被他人修改，请刷新后重试")
+    return {"id": resume_id, "status": body.status}
+
+
+@router.get("/resumes/{resume_id}/history")
+async def status_history(resume_id: int, session: AsyncSession = Depends(get_session)):
+    statement = select(StatusAudit).where(StatusAudit.resume_id == resume_id).order_by(StatusAudit.id)
+    return {"history": [row.model_dump(mode="json", exclude={"id", "resume_id"})
+                        for row in (await session.exec(statement)).all()]}
+
+
+@router.get("/resumes/{resume_id}/files")
+async def resume_files(resume_id: int, session: AsyncSession = Depends(get_session)):
+    resume = await session.get(Resume, resume_id)
+    if resume is None:
+        raise HTTPException(status_code=404, detail="未找到该候选人记录")
+    statement = select(ResumeBlob, Blob).join(Blob, (Blob.sha256 == ResumeBlob.sha256) & (Blob.ext == ResumeBlob.ext)) \
+        .where(ResumeBlob.resume_uid == resume.uid).order_by(ResumeBlob.id)
+    return {"files": [
+        {"role": link.role, "filename": link.filename, "sha256": blob.sha256, "ext": blob.ext,
+         "size": blob.size, "url": _file_url(blob.sha256, blob.ext)}
+        for link, blob in (await session.exec(statement)).all()
+    ]}
+
+
+@router.get("/blobs/{sha256}")
+async def blob_meta(sha256: str, ext: Optional[str] = None, session: AsyncSession = Depends(get_session)):
+    # 同内容可能以不同扩展名各存一份；没指定 ext 时取最早登记的那个
+    statement = select(Blob).where(Blob.sha256 == sha256).order_by(Blob.created_at)
+    if ext is not None:
+        statement = statement.where(Blob.ext == ext)
+    blob = (await session.exec(statement)).first()
+    if blob is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    filename = (await session.exec(select(ResumeBlob.filename)
+                                   .where(ResumeBlob.sha256 == sha256, ResumeBlob.ext == blob.ext))).first()
+    return {"sha256": blob.sha256, "ext": blob.ext, "size": blob.size,
+            "filename": filename, "url": _file_url(blob.sha256, blob.ext)}
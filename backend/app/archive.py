@@ -0,0 +1,371 @@
+'''
+FilePath: /AutoEmail/backend/app/archive.py
+Description: 冷数据归档：流程已结束 (rejected / finished) 的简历，其 .eml 与附件从仓库 (blobs/ab/cd/...)
+             打包进少量的 pack 文件，散落的小文件删掉，热数据目录只剩在流程中的候选人。
+             读取时 mmap 打包文件随机访问，file_server 和 FilePreviewer 都能照常打开已归档的文件
+
+    storage/archive/pack-<时间>-<随机>.pack   文件内容首尾相接 (压缩后或原样)
+    storage/archive/pack-<时间>-<随机>.idx    按 sha256 排序的定长记录，二分查找：
+        sha256 (32 字节) | 偏移 | 存储长度 | 原始长度 (各 8 字节) | 标志 (1 字节，1 = zlib)
+
+文本类 (.eml) 压缩率高；PDF/图片/视频本身已压缩，抽样压缩率不够时原样存放，读取时直接是 mmap 的切片，
+按 Range 读视频也不用解压整个文件。压缩的条目限制在 COMPRESS_MAX_BYTES 以内，
+按范围读压缩条目时边解压边输出，解到范围末尾就停，内存里最多一块
+
+用法 (在项目根目录):
+    python backend/app/archive.py                      # 归档 14 天前就已结束的简历的文件
+    python backend/app/archive.py --min-age-days 0 --dry-run
+'''
+import io
+import os
+import re
+import sys
+import mmap
+import zlib
+import uuid
+import time
+import struct
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 将项目根目录加入 sys.path，保证能找到 backend 包 (与 frontend/app/senddb.py 相同)
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.app.utils import STORAGE_DIR
+
+
+ARCHIVE_DIR = STORAGE_DIR / "archive"
+# 流程已结束、文件可以归档的状态
+TERMINAL_STATUSES = ("rejected", "finished")
+
+PACK_MAGIC = b"AEPACK1\n"
+INDEX_MAGIC = b"AEIDX01\n"
+# sha256, offset, stored_len, size, flags
+INDEX_ENTRY = struct.Struct("<32sQQQB")
+INDEX_HEADER = struct.Struct("<8sQ")
+FLAG_ZLIB = 1
+
+CHUNK_SIZE = 1024 * 1024
+# 超过这个大小的文件不压缩：按范围读压缩条目要从头解压，条目越大每次 Range 请求越慢
+COMPRESS_MAX_BYTES = 8 * 1024 * 1024
+# 抽样 (文件开头 CHUNK_SIZE) 压缩后不到原来的这个比例才压缩
+COMPRESS_MIN_RATIO = 0.9
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def sha_from_path(file_path) -> str | None:
+    """仓库文件的文件名就是 sha256 (+ 后缀)"""
+    stem = Path(str(file_path)).name.split(".", 1)[0]
+    return stem if SHA256_RE.match(stem) else None
+
+
+# ---------------------------------------------------------------------------
+# 读
+# ---------------------------------------------------------------------------
+
+class ArchivedFile:
+    """打包文件里的一个条目"""
+    __slots__ = ("pack", "sha256", "offset", "stored", "size", "flags")
+
+    def __init__(self, pack, sha256, offset, stored, size, flags):
+        self.pack, self.sha256 = pack, sha256
+        self.offset, self.stored, self.size, self.flags = offset, stored, size, flags
+
+    @property
+    def compressed(self) -> bool:
+        return bool(self.flags & FLAG_ZLIB)
+
+    def read(self) -> bytes:
+        data = self.pack.data[self.offset:self.offset + self.stored]
+        return zlib.decompress(data) if self.compressed else data
+
+    def open(self) -> io.BytesIO:
+        """只读文件对象 (给 mammoth / st.download_button 这类要文件对象的地方)"""
+        return io.BytesIO(self.read())
+
+    def iter_range(self, start: int = 0, end: int = None, chunk_size: int = CHUNK_SIZE):
+        """按块 yield [start, end) 的内容；原样存放的条目直接切 mmap，不解压、不整体读入"""
+        end = self.size if end is None else end
+        if self.compressed:
+            yield from self._iter_inflated(start, end, chunk_size)
+            return
+        view = memoryview(self.pack.data)
+        for pos in range(start, end, chunk_size):
+            yield bytes(view[self.offset + pos:self.offset + min(pos + chunk_size, end)])
+
+    def _iter_inflated(self, start: int, end: int, chunk_size: int):
+        """压缩条目：流式解压，每次最多解出 chunk_size，start 之前的丢掉，到 end 为止"""
+        view = memoryview(self.pack.data)[self.offset:self.offset + self.stored]
+        inflater = zlib.decompressobj()
+        pos = read = 0
+        tail = b""
+        while pos < end:
+            if not tail:
+                if read >= self.stored:
+                    break
+                tail = view[read:read + chunk_size]
+                read += chunk_size
+            out = inflater.decompress(tail, chunk_size)
+            tail = inflater.unconsumed_tail
+            lo, hi = max(start - pos, 0), min(end - pos, len(out))
+            if lo < hi:
+                yield out[lo:hi]
+            pos += len(out)
+
+
+class PackReader:
+    """一个 pack + idx，两者都 mmap；索引定长且按 sha256 排序，查找是二分"""
+    def __init__(self, idx_path: Path):
+        self.name = idx_path.stem
+        with open(idx_path, "rb") as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = INDEX_HEADER.unpack_from(self.index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"不是归档索引文件: {idx_path}")
+        with open(idx_path.with_suffix(".pack"), "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _key(self, i: int) -> bytes:
+        pos = INDEX_HEADER.size + i * INDEX_ENTRY.size
+        return self.index[pos:pos + 32]
+
+    def find(self, sha256: str) -> ArchivedFile | None:
+        key = bytes.fromhex(sha256)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count or self._key(lo) != key:
+            return None
+        _, offset, stored, size, flags = INDEX_ENTRY.unpack_from(self.index, INDEX_HEADER.size + lo * INDEX_ENTRY.size)
+        return ArchivedFile(self, sha256, offset, stored, size, flags)
+
+
+class ArchiveStore:
+    """
+    所有 pack 的读取入口 (进程内共用一个实例，线程安全)。
+    查不到时看一眼目录有没有新 pack (归档任务在别的进程里跑)，有就打开
+    """
+    def __init__(self, root: Path = ARCHIVE_DIR):
+        self.root = Path(root)
+        self._packs = {}
+        self._dir_mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = self.root.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if mtime == self._dir_mtime:
+                return
+            for idx_path in sorted(self.root.glob("pack-*.idx")):
+                if idx_path.stem not in self._packs:
+                    self._packs[idx_path.stem] = PackReader(idx_path)
+            self._dir_mtime = mtime
+
+    def find(self, sha256: str) -> ArchivedFile | None:
+        for attempt in range(2):
+            for pack in list(self._packs.values()):
+                entry = pack.find(sha256)
+                if entry is not None:
+                    return entry
+            if attempt == 0:
+                self._refresh()
+        return None
+
+    def find_path(self, file_path) -> ArchivedFile | None:
+        """按仓库路径 (简历上记录的 attachment_path) 查找"""
+        sha256 = sha_from_path(file_path)
+        return self.find(sha256) if sha256 else None
+
+
+# ---------------------------------------------------------------------------
+# 写
+# ---------------------------------------------------------------------------
+
+class PackWriter:
+    """
+    写一个新的 pack：先写临时文件，close() 时写索引、fsync，再依次 rename pack 和 idx。
+    idx 出现时 pack 一定已经就位，读的一方只看 idx
+    """
+    def __init__(self, root: Path = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.name = f"pack-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._tmp = self.root / f".{self.name}.pack.tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(PACK_MAGIC)
+        self.entries = []
+        self.size = len(PACK_MAGIC)
+
+    def add(self, sha256: str, path) -> bool:
+        """把一个仓库文件追加进来；内容和 sha256 对不上 (文件损坏) 时不写入，返回 False"""
+        offset = self._f.tell()
+        sha = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as src:
+            head = src.read(CHUNK_SIZE)
+            file_size = os.fstat(src.fileno()).st_size
+            compress = (0 < file_size <= COMPRESS_MAX_BYTES
+                        and len(zlib.compress(head, 1)) < len(head) * COMPRESS_MIN_RATIO)
+            comp = zlib.compressobj(6) if compress else None
+            chunk = head
+            while chunk:
+                sha.update(chunk)
+                size += len(chunk)
+                self._f.write(comp.compress(chunk) if comp else chunk)
+                chunk = src.read(CHUNK_SIZE)
+            if comp:
+                self._f.write(comp.flush())
+
+        if sha.hexdigest() != sha256:
+            self._f.seek(offset)
+            self._f.truncate()
+            print(f"⚠️ 文件内容与 sha256 不符，跳过归档: {path}")
+            return False
+        stored = self._f.tell() - offset
+        self.entries.append((bytes.fromhex(sha256), offset, stored, size, FLAG_ZLIB if compress else 0))
+        self.size = offset + stored
+        return True
+
+    def close(self) -> str | None:
+        """落盘并发布，返回 pack 名；一个条目都没有时丢弃，返回 None"""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        if not self.entries:
+            self._tmp.unlink(missing_ok=True)
+            return None
+
+        self.entries.sort()
+        idx_tmp = self.root / f".{self.name}.idx.tmp"
+        with open(idx_tmp, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.entries)))
+            for entry in self.entries:
+                f.write(INDEX_ENTRY.pack(*entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._tmp, self.root / f"{self.name}.pack")
+        os.replace(idx_tmp, self.root / f"{self.name}.idx")
+        return self.name
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _remove_loose(path: Path):
+    """删掉仓库里的散文件，顺带删掉空了的两级分片目录"""
+    path.unlink(missing_ok=True)
+    for parent in (path.parent, path.parent.parent):
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+def archive_blobs(statuses=TERMINAL_STATUSES, min_age_days: float = 14,
+                  pack_max_bytes: int = 1024 * 1024 * 1024, dry_run: bool = False,
+                  root: Path = ARCHIVE_DIR) -> dict:
+    """
+    归档所有关联简历都已处于 statuses、且最后修改在 min_age_days 天之前的文件。
+    同一份文件 (内容寻址去重) 只要还被一份在流程中的简历引用，就留在热数据里。
+    顺序：pack/idx 落盘 -> blob.pack 记录所在 pack (一个事务) -> 删除散文件；
+    中途退出时下次运行会把已记录 pack 但散文件还在的补删掉
+    """
+    from sqlalchemy import bindparam, text
+    from sqlmodel import Session
+    from backend.app.database import Blob, ResumeInit
+
+    engine = ResumeInit().engine
+    cutoff = datetime.now() - timedelta(days=min_age_days)
+    placeholders = ", ".join(f":s{i}" for i in range(len(statuses)))
+    query = text(f"""
+        SELECT b.sha256, b.ext, b.path, b.size, b.pack FROM blob b
+        WHERE EXISTS (SELECT 1 FROM resumeblob rb WHERE rb.sha256 = b.sha256 AND rb.ext = b.ext)
+          AND NOT EXISTS (
+            SELECT 1 FROM resumeblob rb JOIN resume r ON r.uid = rb.resume_uid
+            WHERE rb.sha256 = b.sha256 AND rb.ext = b.ext
+              AND (r.status NOT IN ({placeholders})
+                   OR coalesce(r.updated_at, r.created_at) > :cutoff))
+        ORDER BY b.sha256""")
+    params = {f"s{i}": s for i, s in enumerate(statuses)}
+    params["cutoff"] = cutoff.strftime("%Y-%m-%d %H:%M:%S.%f")
+    with Session(engine) as session:
+        rows = session.connection().execute(query, params).all()
+
+    stats = {"candidates": len(rows), "archived": 0, "bytes": 0, "packed_bytes": 0, "packs": 0, "cleaned": 0}
+    todo = [r for r in rows if r.pack is None and Path(r.path).is_file()]
+    leftovers = [r for r in rows if r.pack is not None and Path(r.path).exists()]
+    if dry_run:
+        stats["archived"] = len(todo)
+        stats["bytes"] = sum(r.size for r in todo)
+        print(f"🔍 可归档 {len(todo)} 个文件，共 {stats['bytes'] / 1024 / 1024:.1f} MB")
+        return stats
+
+    for r in leftovers:
+        _remove_loose(Path(r.path))
+        stats["cleaned"] += 1
+
+    mark = Blob.__table__.update() \
+        .where(Blob.sha256 == bindparam("sha"), Blob.ext == bindparam("blob_ext")) \
+        .values(pack=bindparam("pack_name"))
+    i = 0
+    while i < len(todo):
+        writer = PackWriter(root)
+        packed = []
+        added = set()
+        try:
+            while i < len(todo) and (not packed or writer.size < pack_max_bytes):
+                r = todo[i]
+                i += 1
+                # 同内容不同扩展名的文件 (按 sha256 排序后相邻) 在 pack 里只存一份
+                if r.sha256 in added or writer.add(r.sha256, r.path):
+                    added.add(r.sha256)
+                    packed.append(r)
+            name = writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        if name is None:
+            continue
+
+        with Session(engine) as session:
+            session.connection().execute(mark, [{"sha": r.sha256, "blob_ext": r.ext, "pack_name": name}
+                                                 for r in packed])
+            session.commit()
+        for r in packed:
+            _remove_loose(Path(r.path))
+        stats["archived"] += len(packed)
+        stats["bytes"] += sum(r.size for r in packed)
+        stats["packed_bytes"] += writer.size
+        stats["packs"] += 1
+        print(f"📦 {name}: {len(packed)} 个文件，{sum(r.size for r in packed) / 1024 / 1024:.1f} MB "
+              f"-> {writer.size / 1024 / 1024:.1f} MB")
+
+    print(f"✅ 归档完成：{stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把流程已结束的简历文件打包归档")
+    parser.add_argument("--statuses", default=",".join(TERMINAL_STATUSES), help="可以归档的状态，逗号分隔")
+    parser.add_argument("--min-age-days", type=float, default=14, help="状态最后修改距今至少多少天")
+    parser.add_argument("--pack-mb", type=int, default=1024, help="单个 pack 文件的大小上限 (MB)")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不归档")
+    args = parser.parse_args()
+
+    archive_blobs(statuses=tuple(s.strip() for s in args.statuses.split(",") if s.strip()),
+                  min_age_days=args.min_age_days, pack_max_bytes=args.pack_mb * 1024 * 1024,
+                  dry_run=args.dry_run)
@@ -0,0 +1,35 @@
+'''
+FilePath: /AutoEmail/backend/app/auth.py
+Description: 内部接口 (/api、/metrics、/debug) 的访问控制
+             这些接口只给 Streamlit 进程和监控用，浏览器不直接访问：
+             配置了 AUTOEMAIL_API_TOKEN 时请求必须带 Authorization: Bearer <token>；
+             没有配置时只接受本机 (回环地址) 发来的请求
+'''
+import os
+import hmac
+import ipaddress
+
+from fastapi import HTTPException, Request
+
+
+API_TOKEN = os.getenv("AUTOEMAIL_API_TOKEN", "")
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def require_internal(request: Request):
+    """FastAPI 依赖：不是内部调用时返回 401 / 403"""
+    token = API_TOKEN
+    if token:
+        scheme, _, supplied = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.strip(), token):
+            raise HTTPException(status_code=401, detail="unauthorized", headers={"WWW-Authenticate": "Bearer"})
+        return
+    host = request.client.host if request.client else ""
+    if not _is_loopback(host):
+        raise HTTPException(status_code=403, detail="internal endpoint")
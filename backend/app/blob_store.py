@@ -0,0 +1,214 @@
+'''
+FilePath: /AutoEmail/backend/app/blob_store.py
+Description: 按内容寻址的文件仓库
+             文件名就是内容的 sha256，按前缀分两级目录 (ab/cd/abcd....pdf)，
+             先写临时文件再原子 rename；内容相同的文件只存一份
+'''
+import os
+import re
+import uuid
+import hashlib
+from pathlib import Path
+
+from backend.app.archive import ArchiveStore
+from backend.app.utils import STORAGE_DIR
+
+
+BLOB_DIR = STORAGE_DIR / "blobs"
+
+CHUNK_SIZE = 1024 * 1024
+
+# 扩展名 (不含点) 只允许小写字母和数字：会拼进仓库路径和下载文件名，不能带 / .. 之类
+EXT_RE = re.compile(r'^[0-9a-z]{1,10}$')
+
+
+class InvalidExtension(ValueError):
+    pass
+
+
+def filename_ext(filename: str) -> str:
+    """客户端给的文件名 -> 规范化的扩展名 (".pdf")；没有扩展名返回 ""，不合法时抛 InvalidExtension"""
+    name = filename or ""
+    return BlobStore.normalize_ext(name.rsplit(".", 1)[1] if "." in name else "")
+
+
+class BlobStore:
+    def __init__(self, root: Path = BLOB_DIR, archive: ArchiveStore = None):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        # 已归档的内容散文件已删除；再次入库时在 pack 里找到就不再写回散文件
+        self.archive = ArchiveStore() if archive is None else archive
+
+    @staticmethod
+    def normalize_ext(ext: str) -> str:
+        """"PDF" / ".pdf" -> ".pdf"；含路径分隔符等非法字符时抛 InvalidExtension"""
+        ext = (ext or "").lower()
+        if ext.startswith("."):
+            ext = ext[1:]
+        if not ext:
+            return ""
+        if not EXT_RE.match(ext):
+            raise InvalidExtension(f"不支持的扩展名: {ext!r}")
+        return "." + ext
+
+    def path_for(self, sha256: str, ext: str = "") -> Path:
+        """两级分片目录，单个目录下的文件数量始终很小"""
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{self.normalize_ext(ext)}"
+
+    def exists(self, sha256: str, ext: str = "") -> bool:
+        return self.path_for(sha256, ext).exists()
+
+    def _ref(self, sha256: str, ext: str, size: int, is_new: bool, pack: str = None) -> dict:
+        """pack: 内容已归档时所在的 pack，登记 blob 行时一并写入"""
+        return {"sha256": sha256, "ext": self.normalize_ext(ext), "size": size,
+                "path": str(self.path_for(sha256, ext)), "is_new": is_new, "pack": pack}
+
+    def _existing_ref(self, sha256: str, ext: str, size: int):
+        """仓库里已有这份内容 (散文件，或已归档进 pack) 时返回引用，不用再写；否则返回 None"""
+        if self.exists(sha256, ext):
+            return self._ref(sha256, ext, size, False)
+        archived = self.archive.find(sha256)
+        if archived is not None:
+            return self._ref(sha256, ext, size, False, pack=archived.pack.name)
+        return None
+
+    def _commit_tmp(self, tmp_path: Path, sha256: str, ext: str) -> bool:
+        """把临时文件原子地放到最终位置；已存在同内容文件时直接删掉临时文件"""
+        final = self.path_for(sha256, ext)
+        if final.exists():
+            tmp_path.unlink(missing_ok=True)
+            return False
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, final)
+        return True
+
+    def _new_tmp(self) -> Path:
+        return self.tmp_dir / f"{uuid.uuid4().hex}.tmp"
+
+    def put_bytes(self, data: bytes, ext: str = "") -> dict:
+        """内存里的内容：先算 hash，已存在就一个字节都不写"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        existing = self._existing_ref(sha256, ext, len(data))
+        if existing:
+            return existing
+
+        tmp_path = self._new_tmp()
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._ref(sha256, ext, len(data), self._commit_tmp(tmp_path, sha256, ext))
+
+    def _write_tmp(self, chunks):
+        """把数据流写进临时文件，边写边算 hash，返回 (临时文件, sha256, 大小)"""
+        sha = hashlib.sha256()
+        size = 0
+        tmp_path = self._new_tmp()
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    sha.update(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return tmp_path, sha.hexdigest(), size
+
+    @staticmethod
+    def _hash_seekable(fileobj, chunk_size: int = CHUNK_SIZE):
+        """可 seek 的文件对象先读一遍算 hash，返回 (sha256, 大小) 并倒回开头；不能 seek 时返回 None"""
+        if not (hasattr(fileobj, "seek") and getattr(fileobj, "seekable", lambda: True)()):
+            return None
+        fileobj.seek(0)
+        sha = hashlib.sha256()
+        size = 0
+        for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+            sha.update(chunk)
+            size += len(chunk)
+        fileobj.seek(0)
+        return sha.hexdigest(), size
+
+    def put_stream(self, chunks, ext: str = "") -> dict:
+        """分块写入 (不可回读的数据流)：边写临时文件边算 hash"""
+        tmp_path, sha256, size = self._write_tmp(chunks)
+        existing = self._existing_ref(sha256, ext, size)
+        if existing:
+            tmp_path.unlink(missing_ok=True)
+            return existing
+        return self._ref(sha256, ext, size, self._commit_tmp(tmp_path, sha256, ext))
+
+    def stage_file(self, fileobj, ext: str = "", chunk_size: int = CHUNK_SIZE) -> dict:
+        """
+        两阶段写入的第一步：内容写到临时文件、算好 hash，但还不放进仓库。
+        返回值与 put_* 相同 (path 是最终路径)，另带 tmp_path。
+        可 seek 时先算 hash，仓库里已有同内容就不写临时文件，tmp_path 为 None。
+        之后调用 commit_staged 放进仓库，或 discard_staged 丢弃
+        """
+        hashed = self._hash_seekable(fileobj, chunk_size)
+        existing = hashed and self._existing_ref(hashed[0], ext, hashed[1])
+        if existing:
+            return {**existing, "tmp_path": None}
+        tmp_path, sha256, size = self._write_tmp(iter(lambda: fileobj.read(chunk_size), b""))
+        existing = self._existing_ref(sha256, ext, size)
+        if existing:
+            tmp_path.unlink(missing_ok=True)
+            return {**existing, "tmp_path": None}
+        return {**self._ref(sha256, ext, size, False), "tmp_path": str(tmp_path)}
+
+    def commit_staged(self, staged: dict) -> dict:
+        if not staged["tmp_path"]:
+            # 暂存时仓库里已经有了 (散文件或 pack)，引用原样返回
+            return {k: v for k, v in staged.items() if k != "tmp_path"}
+        is_new = self._commit_tmp(Path(staged["tmp_path"]), staged["sha256"], staged["ext"])
+        return self._ref(staged["sha256"], staged["ext"], staged["size"], is_new)
+
+    def discard_staged(self, staged: dict):
+        """已经 commit 过的 (临时文件已被移走) 再调用也没关系"""
+        if staged.get("tmp_path"):
+            Path(staged["tmp_path"]).unlink(missing_ok=True)
+
+    def put_file(self, fileobj, ext: str = "", chunk_size: int = CHUNK_SIZE) -> dict:
+        """
+        文件对象 (例如 Streamlit 的 UploadedFile)：
+        可 seek 时先读一遍算 hash，重复内容不落盘；否则退化为 put_stream
+        """
+        hashed = self._hash_seekable(fileobj, chunk_size)
+        existing = hashed and self._existing_ref(hashed[0], ext, hashed[1])
+        if existing:
+            return existing
+        return self.put_stream(iter(lambda: fileobj.read(chunk_size), b""), ext)
+
+    def put_path(self, path, ext: str = None, sha256: str = None) -> dict:
+        """
+        已经在磁盘上的文件 (例如云附件下载结果)：移动进仓库，重复内容直接删除。
+        已知 sha256 时可传入，省掉一次读盘
+        """
+        path = Path(path)
+        if ext is None:
+            # 下载下来的文件名是对方给的，后缀不合法时不带后缀存
+            try:
+                ext = self.normalize_ext(path.suffix)
+            except InvalidExtension:
+                ext = ""
+        size = path.stat().st_size
+        if sha256 is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+            sha256 = sha.hexdigest()
+
+        existing = self._existing_ref(sha256, ext, size)
+        if existing:
+            path.unlink(missing_ok=True)
+            return existing
+        final = self.path_for(sha256, ext)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, final)
+        return self._ref(sha256, ext, size, True)
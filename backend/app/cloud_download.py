@@ -0,0 +1,260 @@
+'''
+FilePath: /AutoEmail/backend/app/cloud_download.py
+Description: QQ/网易 超大附件下载器
+             共享连接池 + 线程池并发 + 每个域名并发上限 + Range 断点续传 + 边下边算 sha256
+             失败重试由 cloud_jobs.py 的持久化任务队列负责
+'''
+import os
+import re
+import hashlib
+import threading
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.app.metrics import timed
+
+
+ALLOW_EXT = {'.pdf', '.doc', '.docx', '.zip', '.rar', '.7z'}
+ALLOW_CT_PREFIX = (
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument',
+    'application/octet-stream',
+)
+
+# 邮件正文里的初始链接
+JUMP_LINK_RE = re.compile(r'href=["\'](http[^"\']*(?:download|ftn|qqmail)[^"\']*)["\']', re.IGNORECASE)
+DIRECT_LINK_RE = re.compile(r'https?://[^"\']*(?:download|ftn|qqmail)[^"\']*', re.IGNORECASE)
+# 兼容 downUrl = "..."
+DOWN_URL_RE = re.compile(r'downUrl\s*[:=]\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+def extract_jump_links(html_content_list) -> list:
+    """从邮件 html 正文里找出云附件的跳转链接"""
+    if not html_content_list or not isinstance(html_content_list, list):
+        return []
+    html_text = html_content_list[0] or ""
+    return [u.replace("&amp;", "&") for u in JUMP_LINK_RE.findall(html_text)]
+
+
+def extract_direct_links(page_html: str) -> list:
+    links = DIRECT_LINK_RE.findall(page_html) + DOWN_URL_RE.findall(page_html)
+    return [u.replace("&amp;", "&") for u in links]
+
+
+def pick_filename(url, resp):
+    cd = resp.headers.get("Content-Disposition", "")
+    m = re.search(r'filename="?([^"]+)"?', cd)
+    if m:
+        fname = m.group(1)
+    else:
+        fname = os.path.basename(urlparse(url).path) or "downloaded_file.bin"
+    fname = unquote(fname)
+    fname = fname.replace("/", "_").replace("\\", "_")
+    return fname
+
+
+def is_html(resp):
+    return "text/html" in resp.headers.get("Content-Type", "").lower()
+
+
+def is_allowed(fname, resp):
+    ext = Path(fname).suffix.lower()
+    ct = resp.headers.get("Content-Type", "").lower()
+    return ext in ALLOW_EXT or ct.startswith(ALLOW_CT_PREFIX)
+
+
+class CloudDownloadError(Exception):
+    """
+    一个云附件链接没能下载下来，消息是原因 (登录墙/验证码页、网络错误、类型不允许 ...)。
+    retry=False 表示重试也没有意义 (例如文件类型不在白名单)
+    """
+    def __init__(self, message: str, retry: bool = True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class CloudDownloader:
+    """
+    所有邮件共用一个实例：
+      - 一个 requests.Session (连接池按并发数放大)，复用 TCP/TLS 连接
+      - 线程池并发下载，同一域名同时最多 per_host 个请求，避免被限流
+      - 未下完的文件保存为 .part，下次用 Range 续传
+      - 下载时流式计算 sha256，结果里一并返回
+    """
+    def __init__(self, max_workers: int = 8, per_host: int = 2,
+                 chunk_size: int = 256 * 1024, timeout=(10, 60), cookie_str=None):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.per_host = per_host
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": "Mozilla/5.0"})
+        if cookie_str:
+            self.session.headers.update({"Cookie": cookie_str})
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cloud-dl")
+        self._host_lock = threading.Lock()
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+
+    def _slot(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            return self._host_slots[host]
+
+    def _get(self, url, **kwargs):
+        """调用方需先持有该域名的 slot；stream=True 时也要在 slot 内读完响应"""
+        return self.session.get(url, timeout=self.timeout, allow_redirects=True, **kwargs)
+
+    @staticmethod
+    def _part_path(url, save_dir) -> Path:
+        return Path(save_dir) / f".{hashlib.md5(url.encode()).hexdigest()}.part"
+
+    def _open(self, url, part_path: Path, headers=None):
+        """发起 (可能续传的) 流式请求，返回 (offset, resp)；调用方需先持有该域名的 slot"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        req_headers = dict(headers or {})
+        if offset:
+            req_headers["Range"] = f"bytes={offset}-"
+        return offset, self._get(url, stream=True, headers=req_headers)
+
+    def _save_response(self, url, resp, part_path: Path, offset: int, save_dir):
+        """
+        把已经打开的文件响应写到 save_dir。
+        返回 {"path", "filename", "sha256", "size", "url"}；.part 已失效 (416) 时删掉它并返回 None，由调用方重新请求；
+        是 HTML 或类型不允许时抛 CloudDownloadError
+        """
+        if resp.status_code == 416 and offset:
+            # 服务器不认这个 Range (.part 已失效)，丢掉后重新下载
+            part_path.unlink(missing_ok=True)
+            return None
+        resp.raise_for_status()
+        if is_html(resp):
+            raise CloudDownloadError("直链仍返回 HTML，可能需登录/验证码")
+        fname = pick_filename(url, resp)
+        if not is_allowed(fname, resp):
+            raise CloudDownloadError(
+                f"非允许类型 {fname} ct={resp.headers.get('Content-Type', '')}", retry=False)
+        sha = self._write_part(resp, part_path, offset, fname)
+
+        save_path = Path(save_dir) / fname
+        os.replace(part_path, save_path)
+        print(f"✅ 云附件下载成功: {save_path}")
+        return {"path": str(save_path), "filename": fname, "sha256": sha.hexdigest(),
+                "size": save_path.stat().st_size, "url": url}
+
+    def _save_stream(self, url, save_dir, headers=None):
+        """下载一个直链到 save_dir，支持断点续传；返回值与 _save_response 相同"""
+        part_path = self._part_path(url, save_dir)
+        with self._slot(url):
+            offset, resp = self._open(url, part_path, headers)
+            try:
+                result = self._save_response(url, resp, part_path, offset, save_dir)
+            finally:
+                resp.close()
+        if result is None:
+            return self._save_stream(url, save_dir, headers)
+        return result
+
+    def _write_part(self, resp, part_path: Path, offset: int, fname: str):
+        """把响应体写进 .part 文件，返回 sha256 对象"""
+        sha = hashlib.sha256()
+        if offset and resp.status_code == 206:
+            # 续传：先把已有部分喂给 hash
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    sha.update(chunk)
+            mode = "ab"
+            print(f"⏯️ 从 {offset} 字节处续传: {fname}")
+        else:
+            mode = "wb"
+
+        with open(part_path, mode) as f:
+            for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    sha.update(chunk)
+        return sha
+
+    def download(self, html_content_list, save_dir):
+        """同步下载一封邮件里的云附件 (含跳转页解析)，依次尝试每个链接。返回结果 dict 或 None"""
+        with timed("cloud_download") as t:
+            result = self._download(html_content_list, save_dir)
+            t.bytes = result["size"] if result else 0
+        return result
+
+    def _download(self, html_content_list, save_dir):
+        for url in extract_jump_links(html_content_list):
+            try:
+                return self._download_link(url, save_dir)
+            except CloudDownloadError as exc:
+                print(f"⚠️ {exc}")
+        return None
+
+    def download_link(self, url, save_dir):
+        """下载一个跳转链接对应的文件。返回结果 dict，失败时抛 CloudDownloadError"""
+        with timed("cloud_download") as t:
+            result = self._download_link(url, save_dir)
+            t.bytes = result["size"]
+        return result
+
+    def _download_link(self, url, save_dir):
+        print(f"☁️ 跳转页: {url[:80]}...")
+        part_path = self._part_path(url, save_dir)
+        try:
+            # 跳转链接本身就可能直接返回文件：第一次请求就按文件请求 (带续传)，
+            # 不是 HTML 时直接用这个响应保存，不再请求第二遍
+            with self._slot(url):
+                offset, resp = self._open(url, part_path)
+                try:
+                    if (resp.status_code == 416 and offset) or not is_html(resp):
+                        html = None
+                        result = self._save_response(url, resp, part_path, offset, save_dir)
+                    else:
+                        html = resp.text
+                finally:
+                    resp.close()
+            if html is None:
+                return result if result is not None else self._save_stream(url, save_dir)
+        except (requests.RequestException, OSError) as exc:
+            raise CloudDownloadError(f"跳转失败: {exc}") from exc
+
+        # 跳转页是 HTML，再提取直链
+        direct_links = extract_direct_links(html)
+        if not direct_links:
+            raise CloudDownloadError("跳转页未找到直链，可能需要登录/验证码")
+
+        errors = []
+        for durl in direct_links:
+            print(f"➡️ 直链尝试: {durl[:80]}...")
+            try:
+                return self._save_stream(durl, save_dir)
+            except CloudDownloadError as exc:
+                errors.append(exc)
+            except (requests.RequestException, OSError) as exc:
+                errors.append(CloudDownloadError(f"直链请求失败: {exc}"))
+            print(f"⚠️ {errors[-1]}")
+        # 所有直链都不行：只要有一个值得重试就重试
+        raise CloudDownloadError(str(errors[-1]), retry=any(e.retry for e in errors))
+
+    def submit(self, html_content_list, save_dir):
+        """
+        异步下载：没有云附件链接时返回 None，否则立即返回 Future，
+        future.result() 与 download() 的返回值相同
+        """
+        if not extract_jump_links(html_content_list):
+            return None
+        return self.executor.submit(self.download, html_content_list, save_dir)
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+        self.session.close()
@@ -0,0 +1,182 @@
+'''
+FilePath: /AutoEmail/backend/app/cloud_jobs.py
+Description: 云附件下载的持久化任务队列
+             同步时每个云附件链接写一行 cloud_job，下载线程池按到期时间领取；
+             失败 (超时、登录墙、验证码页) 记下原因，按 base_delay * 2^(n-1) (上限 max_delay) 退避后重试，
+             超过 max_attempts 次标记为 failed；成功后把文件放进仓库并挂到对应简历上。
+             同一域名同时在下载的任务不超过 CloudDownloader.per_host 个
+'''
+import time
+import random
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+from backend.app.cloud_download import CloudDownloadError, extract_jump_links
+
+
+class CloudJobQueue:
+    def __init__(self, resume_init, blob_store, downloader, max_attempts: int = 8,
+                 base_delay: float = 60, max_delay: float = 6 * 3600, lease: float = 30 * 60,
+                 on_complete=None):
+        """
+        :param downloader: CloudDownloader，任务在它的线程池里执行
+        :param lease: 领取后多久没有结果就允许重新领取 (进程被杀掉的情况)，要大于单个文件的最长下载时间
+        :param on_complete: 文件挂到简历上之后调用 on_complete(resume_uid)，在下载线程里执行
+        """
+        self.resume_init = resume_init
+        self.blob_store = blob_store
+        self.downloader = downloader
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.on_complete = on_complete
+
+        # 已经完成的 future 在 add_done_callback 时会直接在当前线程回调，所以用可重入锁
+        self._lock = threading.RLock()
+        self._inflight = {}             # future -> job
+        self._host_inflight = Counter()
+        self._stop = threading.Event()
+        self._wake = threading.Event()   # 有任务结束、空出并发名额时唤醒后台线程
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """后台线程 (start) 是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def enqueue(self, html_by_uid: dict) -> int:
+        """{resume_uid: 邮件 html 正文列表}，正文里的云附件链接加入队列；返回新加入的任务数"""
+        return self.resume_init.enqueue_cloud_jobs(self.links(html_by_uid))
+
+    @staticmethod
+    def links(html_by_uid: dict) -> dict:
+        """{resume_uid: 邮件 html 正文列表} -> {resume_uid: 云附件链接列表}，没有链接的简历不出现"""
+        urls_by_uid = {uid: extract_jump_links(html) for uid, html in html_by_uid.items()}
+        return {uid: urls for uid, urls in urls_by_uid.items() if urls}
+
+    def run_due(self) -> int:
+        """领取到期的任务交给下载线程池 (不等待结果)，返回本次开始的任务数"""
+        with self._lock:
+            capacity = self.downloader.max_workers - len(self._inflight)
+            if capacity <= 0:
+                return 0
+            now = time.time()
+            # 多取一些候选，跳过已经占满并发的域名
+            hosts = Counter(self._host_inflight)
+            chosen = []
+            for job in self.resume_init.due_cloud_jobs(now, limit=capacity * 4):
+                host = urlparse(job.url).netloc
+                if hosts[host] >= self.downloader.per_host:
+                    continue
+                hosts[host] += 1
+                chosen.append(job)
+                if len(chosen) >= capacity:
+                    break
+            if not chosen:
+                return 0
+
+            claimed = self.resume_init.claim_cloud_jobs(chosen, now + self.lease)
+            for job in claimed:
+                self._host_inflight[urlparse(job.url).netloc] += 1
+                future = self.downloader.executor.submit(self._run, job)
+                self._inflight[future] = job
+                future.add_done_callback(self._done)
+            return len(claimed)
+
+    def _done(self, future):
+        with self._lock:
+            job = self._inflight.pop(future)
+            host = urlparse(job.url).netloc
+            self._host_inflight[host] -= 1
+            if self._host_inflight[host] <= 0:
+                del self._host_inflight[host]
+        self._wake.set()
+
+    def _run(self, job):
+        """
+        在下载线程池里执行。线程池里的异常没人看，所以任何一步出错都在这里记下来：
+        文件挂到简历之前出错按失败处理 (退避重试)；之后 on_complete 出错只打印，任务已经完成
+        """
+        completed = False
+        try:
+            # 每封邮件一个临时目录，失败留下的 .part 下次重试时续传
+            save_dir = self.blob_store.tmp_dir / job.resume_uid
+            save_dir.mkdir(parents=True, exist_ok=True)
+            result = self.downloader.download_link(job.url, save_dir)
+            ref = self.blob_store.put_path(result["path"], sha256=result["sha256"])
+            try:
+                save_dir.rmdir()   # 临时目录已空
+            except OSError:
+                pass
+            self.resume_init.complete_cloud_job(
+                job.id, job.resume_uid, {**ref, "role": "attachment", "filename": result["filename"]})
+            completed = True
+            if self.on_complete:
+                self.on_complete(job.resume_uid)
+        except Exception as exc:
+            if completed:
+                print(f"⚠️ 云附件已入库，后续处理失败: {job.resume_uid} {type(exc).__name__}: {exc}")
+                return
+            try:
+                self._fail(job, exc)
+            except Exception as fail_exc:
+                # 连失败都记不下来 (例如数据库不可用)：租约到期后任务会被重新领取
+                print(f"❌ 云附件任务 {job.id} 状态写入失败: {type(fail_exc).__name__}: {fail_exc}")
+
+    def _fail(self, job, exc: Exception):
+        error = str(exc) if isinstance(exc, CloudDownloadError) else f"{type(exc).__name__}: {exc}"
+        if getattr(exc, "retry", True) and job.attempts < self.max_attempts:
+            # 加一点抖动，同一批失败的任务不会同时重试
+            delay = min(self.base_delay * 2 ** (job.attempts - 1), self.max_delay) * random.uniform(0.5, 1.0)
+            self.resume_init.fail_cloud_job(job.id, error, time.time() + delay)
+            print(f"⚠️ 云附件下载失败 (第 {job.attempts} 次，{delay:.0f} 秒后重试): {job.resume_uid} {error}")
+        else:
+            self.resume_init.fail_cloud_job(job.id, error, None)
+            print(f"❌ 云附件下载失败，不再重试 (共 {job.attempts} 次): {job.resume_uid} {error}")
+            self._discard_partial(job)
+
+    def _discard_partial(self, job):
+        """不再重试的任务：续传用的 .part 没用了，删掉；临时目录空了也删掉 (同一封邮件的其他链接可能还在用)"""
+        save_dir = self.blob_store.tmp_dir / job.resume_uid
+        self.downloader._part_path(job.url, save_dir).unlink(missing_ok=True)
+        try:
+            save_dir.rmdir()
+        except OSError:
+            pass
+
+    def drain(self):
+        """单次同步结束时调用：把当前到期的任务全部跑完 (失败的按退避时间留在队列里，下次再试)"""
+        while True:
+            self.run_due()
+            with self._lock:
+                futures = [f for f in self._inflight if not f.done()]
+            if not futures:
+                return
+            print(f"☁️ 等待 {len(futures)} 个云附件下载完成...")
+            wait(futures, return_when=FIRST_COMPLETED)
+
+    def start(self, interval: float = 30) -> "CloudJobQueue":
+        """常驻模式：后台线程每隔 interval 秒领取一次到期的任务"""
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self._wake.clear()
+                try:
+                    self.run_due()
+                except Exception as exc:
+                    print(f"⚠️ 云附件任务队列出错: {exc}")
+                self._wake.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="cloud-jobs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
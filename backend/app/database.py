@@ -6,22 +6,66 @@ LastEditTime: 2025-12-11 20:29:41
 FilePath: /AutoEmail/backend/app/database.py
 Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查看配置 进行设置: https://github.com/OBKoro1/koro1FileHeader/wiki/%E9%85%8D%E7%BD%AE
 '''
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, List
 from datetime import datetime
 from sqlmodel import Field, SQLModel, Session, create_engine, select
+from sqlalchemy import (Float, Index, Integer, and_, column, event, func, inspect, literal, literal_column, or_,
+                        text, tuple_)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from pathlib import Path
 
+from backend.app.metrics import timed
+from backend.app.utils import STORAGE_DIR
 
 
-BASE_DIR = Path(__file__).parent.parent / "storage" / "database"
+
+BASE_DIR = STORAGE_DIR / "database"
 BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 DB_PATH = BASE_DIR / "resume.db"
 SQLITE_URL = f"sqlite:///{DB_PATH}"
+# 后端 API (learn.py) 用的异步驱动
+ASYNC_SQLITE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+
+# 每条新连接都会执行的 PRAGMA
+# WAL: 读写互不阻塞；synchronous=NORMAL 在 WAL 下足够安全且少很多 fsync；
+# busy_timeout: 遇到写锁先等待，而不是立刻报 "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("AUTOEMAIL_DB_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("AUTOEMAIL_DB_MMAP_SIZE", 256 * 1024 * 1024)),
+    "temp_store": "MEMORY",
+}
+# 连接池大小：Streamlit 每个会话一个脚本线程，同时在跑的请求数基本等于在线人数
+DB_POOL_SIZE = int(os.environ.get("AUTOEMAIL_DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.environ.get("AUTOEMAIL_DB_MAX_OVERFLOW", 30))
+
 
 
+# send_time 可能为空：排序和 keyset 比较都用 coalesce(send_time, '')，空值排在最早，不会从分页里漏掉。
+# 索引建在同一个表达式上，看板查询仍然走索引
+SEND_TIME_KEY_SQL = "coalesce(send_time, '')"
+# 换成表达式索引之前的旧索引，_migrate 时删掉
+DROPPED_INDEXES = ["ix_resume_send_time_id", "ix_resume_job_send_time_id", "ix_resume_status_send_time_id",
+                   "ix_resume_revision"]
+# 旧版本给看板快照用的 revision：触发器让每次写 resume 多一条 UPDATE，已经没有地方读它
+DROPPED_TRIGGERS = ["resume_rev_ai", "resume_rev_au"]
+DROPPED_COLUMNS = {"resume": ["revision"]}
+
 
 class Resume(SQLModel, table=True):
+    # 看板的 筛选 + 按时间排序 + keyset 分页 都能走索引
+    __table_args__ = (
+        Index("ix_resume_send_key_id", text(SEND_TIME_KEY_SQL), "id"),
+        Index("ix_resume_job_send_key_id", "job_position", text(SEND_TIME_KEY_SQL), "id"),
+        Index("ix_resume_status_send_key_id", "status", text(SEND_TIME_KEY_SQL), "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     uid: str = Field(unique=True, index=True)
@@ -40,17 +84,458 @@ class Resume(SQLModel, table=True):
     # 状态标记 (用来管理流程)
     # new: 刚存入 -> processed: 已处理
     status: str = Field(default="new")
+    # 行版本：每次改状态 +1，批量改状态时用作乐观锁 (页面上看到的版本已经变了就不覆盖)
+    version: int = Field(default=0)
 
     # 记录入库时间
     created_at: datetime = Field(default_factory=datetime.now)
 
+    # 最后一次改状态的时间 (build_status_update 写入)，归档时据此判断流程结束了多久
+    updated_at: Optional[datetime] = None
+
+
+class SyncState(SQLModel, table=True):
+    """IMAP 增量同步进度：每个邮箱文件夹一行"""
+
+    mailbox: str = Field(primary_key=True)   # 例如 "hr@xx.com:INBOX"
+    uidvalidity: int                          # SELECT 返回的 UIDVALIDITY，变化即说明 UID 全部失效
+    last_uid: int = Field(default=0)          # 已处理的最大 UID (高水位)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+
+class Blob(SQLModel, table=True):
+    """内容寻址仓库里的一个文件 (见 blob_store.py)。
+    仓库按 sha256 + 扩展名存文件，同内容不同扩展名是两个文件，所以主键是 (sha256, ext)"""
+
+    sha256: str = Field(primary_key=True)
+    ext: str = Field(default="", primary_key=True)
+    size: int
+    path: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    # 已归档时所在的 pack (见 archive.py)，此时 path 上的散文件已删除；None 表示在热数据里
+    pack: Optional[str] = None
+
+
+class ResumeBlob(SQLModel, table=True):
+    """简历 <-> 文件 的对应关系，保留原始文件名"""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    resume_uid: str = Field(index=True)
+    sha256: str = Field(index=True)
+    ext: str = ""                   # 与 sha256 一起对应 blob 表的一行
+    role: str                       # attachment / collection / eml
+    filename: Optional[str] = None  # 原始文件名 (仓库里的文件名是 hash)
+
+
+class RateLimitBucket(SQLModel, table=True):
+    """提交限流的令牌桶 (见 rate_limit.py)，多个前端进程共享"""
+    __tablename__ = "rate_limit"
+
+    bucket: str = Field(primary_key=True)   # submit_ip / submit_phone
+    key: str = Field(primary_key=True)      # IP 或手机号
+    tokens: float                           # 上次更新后剩余的令牌
+    updated_at: float = Field(index=True)   # unix 时间戳，清理闲置 key 用
+
+
+class CloudJob(SQLModel, table=True):
+    """云附件下载任务 (见 cloud_jobs.py)：失败后按退避时间重试，成功后把文件挂到简历上"""
+    __tablename__ = "cloud_job"
+    __table_args__ = (
+        # 同一封邮件的同一个链接只排一次队
+        Index("ux_cloud_job_uid_url", "resume_uid", "url", unique=True),
+        Index("ix_cloud_job_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    resume_uid: str
+    url: str                                # 邮件正文里的跳转链接
+    status: str = Field(default="pending")  # pending / done / failed (不再重试)
+    attempts: int = Field(default=0)        # 已经开始过的下载次数
+    next_attempt_at: float = Field(default=0.0)  # unix 时间戳；下载中的任务是租约到期时间
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: Optional[datetime] = None
+
+
+class StatusAudit(SQLModel, table=True):
+    """状态变更记录：与改状态的 UPDATE 在同一个事务里写入，只追加不修改 (见 AUDIT_DDL)"""
+    __tablename__ = "status_audit"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    resume_id: int = Field(index=True)
+    from_status: Optional[str] = None
+    to_status: str
+    version: int                            # 修改后的行版本
+    changed_at: datetime = Field(default_factory=datetime.now)
+
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for key, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {key}={value}")
+    cursor.close()
+
+
+def _migrate(engine):
+    """create_all 不会给已存在的表补列和索引，这里逐个补上 (已存在则跳过)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+                if col.default is not None and col.default.is_scalar:
+                    # 按列类型编译成 SQL 字面量 (字符串转义、布尔值 0/1)，不能用 Python 的 repr
+                    default = literal(col.default.arg, col.type).compile(
+                        dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+                    ddl += f" NOT NULL DEFAULT {default}"
+                conn.exec_driver_sql(ddl)
+    with engine.begin() as conn:
+        # 表达式索引反射不出来 (checkfirst 看不到)，直接按 sqlite_master 里的索引名判断
+        indexes = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+        for name in DROPPED_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        for name in DROPPED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        # DROP COLUMN 需要 SQLite >= 3.35；更老的版本留着这一列，不影响使用
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            for table, columns in DROPPED_COLUMNS.items():
+                existing = {c["name"] for c in inspect(conn).get_columns(table)}
+                for name in columns:
+                    if name in existing:
+                        conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {name}")
+
+
+def _migrate_blob_key(engine):
+    """旧库的 blob 主键只有 sha256：重建成 (sha256, ext)，并给 resumeblob.ext 补上值"""
+    if inspect(engine).get_pk_constraint("blob")["constrained_columns"] != ["sha256"]:
+        return
+    cols = ", ".join(c.name for c in Blob.__table__.columns)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE blob RENAME TO blob_old")
+        Blob.__table__.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO blob ({cols}) SELECT {cols} FROM blob_old")
+        conn.exec_driver_sql("DROP TABLE blob_old")
+        conn.exec_driver_sql(
+            "UPDATE resumeblob SET ext = coalesce("
+            "(SELECT ext FROM blob WHERE blob.sha256 = resumeblob.sha256), '') WHERE ext = ''"
+        )
+
+
+# status_audit 只允许 INSERT，改/删直接报错
+AUDIT_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS status_audit_no_update BEFORE UPDATE ON status_audit BEGIN
+        SELECT RAISE(ABORT, 'status_audit is append-only');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS status_audit_no_delete BEFORE DELETE ON status_audit BEGIN
+        SELECT RAISE(ABORT, 'status_audit is append-only');
+    END""",
+]
+
+
+def _ensure_audit_triggers(engine):
+    with engine.begin() as conn:
+        for ddl in AUDIT_DDL:
+            conn.exec_driver_sql(ddl)
+
+
+# ----------------------------------------------------------------------
+# 全文检索 (SQLite FTS5)：姓名 / 电话 / 岗位 / 简历正文
+# trigram 分词按 3 个字符切片，中文不需要分词词典，任意位置的子串 (含前缀) 都能命中
+# ----------------------------------------------------------------------
+FTS_TOKENIZER = "trigram" if sqlite3.sqlite_version_info >= (3, 34, 0) else "unicode61"
+# bm25 的列权重：name, phone_num, job_position, content
+FTS_WEIGHTS = (10.0, 10.0, 2.0, 1.0)
+# 不足 3 个字的词只在这几列里 LIKE：content 是整份简历正文，逐行 LIKE '%x%' 太慢，两个字也几乎处处命中
+FTS_SHORT_TERM_COLUMNS = ("name", "phone_num", "job_position")
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS resume_fts
+        USING fts5(name, phone_num, job_position, content, tokenize='{FTS_TOKENIZER}')""",
+    # 通过触发器与 resume 表保持同步；content (简历正文) 由文本抽取流程单独写入
+    """CREATE TRIGGER IF NOT EXISTS resume_fts_ai AFTER INSERT ON resume BEGIN
+        INSERT INTO resume_fts(rowid, name, phone_num, job_position, content)
+        VALUES (new.id, new.name, new.phone_num, coalesce(new.job_position, ''), '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS resume_fts_au AFTER UPDATE OF name, phone_num, job_position ON resume BEGIN
+        UPDATE resume_fts SET name = new.name, phone_num = new.phone_num,
+                              job_position = coalesce(new.job_position, '')
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS resume_fts_ad AFTER DELETE ON resume BEGIN
+        DELETE FROM resume_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def _ensure_fts(engine):
+    with engine.begin() as conn:
+        existed = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='resume_fts'"
+        ).first()
+        for ddl in FTS_DDL:
+            conn.exec_driver_sql(ddl)
+        if not existed:
+            # 第一次建索引：把已有简历补进去
+            conn.exec_driver_sql(
+                """INSERT INTO resume_fts(rowid, name, phone_num, job_position, content)
+                   SELECT id, name, phone_num, coalesce(job_position, ''), '' FROM resume"""
+            )
+
+
+def _fts_where(keyword: str):
+    """
+    把搜索词翻译成 resume_fts 上的 WHERE 条件，返回 (sql, params, 是否用到了 MATCH)。
+    多个词之间是 AND；trigram 下不足 3 个字的词 (比如两个字的姓名) 无法 MATCH，
+    改为在姓名/电话/岗位里 LIKE (见 FTS_SHORT_TERM_COLUMNS)
+    """
+    conds, params, match_terms = [], {}, []
+    for i, term in enumerate(keyword.split()):
+        if FTS_TOKENIZER == "trigram" and len(term) < 3:
+            params[f"fts_like_{i}"] = f"%{term}%"
+            conds.append("(" + " OR ".join(f"{col} LIKE :fts_like_{i}"
+                                           for col in FTS_SHORT_TERM_COLUMNS) + ")")
+        else:
+            phrase = '"' + term.replace('"', '""') + '"'
+            # unicode61 分词没有子串匹配，用前缀查询
+            match_terms.append(phrase if FTS_TOKENIZER == "trigram" else phrase + " *")
+    if match_terms:
+        params["fts_match"] = " AND ".join(match_terms)
+        conds.insert(0, "resume_fts MATCH :fts_match")
+    return " AND ".join(conds) or "1", params, bool(match_terms)
+
+
+def fts_match_ids(keyword: str):
+    """命中搜索词的 resume.id 子查询，用于 Resume.id.in_(...)"""
+    where, params, _ = _fts_where(keyword)
+    return text(f"SELECT rowid FROM resume_fts WHERE {where}").bindparams(**params) \
+        .columns(column("rowid", Integer))
+
+
+def build_resume_search_query(keyword: str, jobs=None, statuses=None, limit: int = 50, offset: int = 0):
+    """按相关度 (bm25) 排序的搜索；只有短词时没有相关度可言，退化为按时间倒序"""
+    where, params, has_match = _fts_where(keyword)
+    score = f"bm25(resume_fts, {', '.join(map(str, FTS_WEIGHTS))})" if has_match else "0"
+    ranked = text(f"SELECT rowid AS rid, {score} AS score FROM resume_fts WHERE {where}") \
+        .bindparams(**params).columns(column("rid", Integer), column("score", Float)).subquery("fts")
+    statement = build_resume_query(select(Resume).join(ranked, ranked.c.rid == Resume.id), jobs, statuses)
+    return statement.order_by(ranked.c.score, Resume.send_time.desc(), Resume.id.desc()) \
+        .limit(limit + 1).offset(offset)
+
+
+def build_resume_query(statement, jobs=None, statuses=None, keyword=None):
+    """
+    给查询加上看板的筛选条件，同步 / 异步查询共用
+    :param statement: select(Resume) 或 select(func.count(...)) 等
+    """
+    if jobs:
+        statement = statement.where(Resume.job_position.in_(list(jobs)))
+    if statuses:
+        statement = statement.where(Resume.status.in_(list(statuses)))
+    if keyword:
+        statement = statement.where(Resume.id.in_(fts_match_ids(keyword)))
+    return statement
+
+
+def build_resume_page_query(jobs=None, statuses=None, keyword=None, ascending=False,
+                            cursor=None, limit: int = 50):
+    """
+    keyset 分页：按 (send_time, id) 排序，cursor 是上一页最后一行的 (send_time, id)。
+    send_time 为空的行按最早算 (见 SEND_TIME_KEY_SQL)；多取一行用来判断是否还有下一页
+    """
+    statement = build_resume_query(select(Resume), jobs, statuses, keyword)
+    send_key = func.coalesce(Resume.send_time, literal_column("''"))
+    if cursor:
+        key, after = tuple_(send_key, Resume.id), (cursor[0] or "", cursor[1])
+        statement = statement.where(key > after if ascending else key < after)
+    if ascending:
+        statement = statement.order_by(send_key.asc(), Resume.id.asc())
+    else:
+        statement = statement.order_by(send_key.desc(), Resume.id.desc())
+    return statement.limit(limit + 1)
+
+
+def build_status_update(expected: dict, new_status: str):
+    """
+    批量改状态，返回在同一个事务里依次执行的三条语句 (同步/异步会话通用)：
+      audit:   INSERT INTO status_audit SELECT ... 记下每行原来的状态
+      update:  UPDATE resume SET status, version = version + 1 WHERE id IN (...) AND (id, version) IN (...)
+               RETURNING id
+      current: 没改成的行现在的状态，用来区分 已经是该状态 / 被别人改过 / 不存在
+    audit 是事务里第一条写语句，执行后本连接就持有写锁，update 改到的行与 audit 记下的行完全一致。
+    :param expected: {resume.id: 页面上看到的 version}；version 为 None 时不检查，直接覆盖
+    """
+    checked = [(rid, version) for rid, version in expected.items() if version is not None]
+    unchecked = [rid for rid, version in expected.items() if version is None]
+    conds = []
+    if checked:
+        conds.append(tuple_(Resume.id, Resume.version).in_(checked))
+    if unchecked:
+        conds.append(Resume.id.in_(unchecked))
+    # 已经是目标状态的行不改，版本号也不变
+    where = and_(Resume.id.in_(list(expected)), or_(*conds), Resume.status != new_status)
+    now = datetime.now()
+
+    audit = StatusAudit.__table__.insert().from_select(
+        ["resume_id", "from_status", "to_status", "version", "changed_at"],
+        select(Resume.id, Resume.status, literal(new_status), Resume.version + 1,
+               literal(now)).where(where),
+    )
+    update = (Resume.__table__.update().where(where)
+              .values(status=new_status, version=Resume.version + 1, updated_at=now)
+              .returning(Resume.id))
+
+    def current(ids):
+        return select(Resume.id, Resume.status).where(Resume.id.in_(list(ids)))
+
+    return audit, update, current
+
+
+def status_update_result(expected: dict, new_status: str, updated, current_rows) -> dict:
+    """把 build_status_update 的执行结果整理成 {updated, unchanged, conflicts, missing} (都是 id 列表)"""
+    updated = set(updated)
+    current = dict(current_rows)
+    result = {"updated": [], "unchanged": [], "conflicts": [], "missing": []}
+    for rid in expected:
+        if rid in updated:
+            result["updated"].append(rid)
+        elif rid not in current:
+            result["missing"].append(rid)
+        elif current[rid] == new_status:
+            result["unchanged"].append(rid)
+        else:
+            result["conflicts"].append(rid)
+    return result
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    进程内唯一的 engine：第一次调用时创建并建表，之后直接复用，
+    避免每次 Streamlit 重跑脚本都重新建连接池、检查表结构
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            engine = create_engine(
+                SQLITE_URL,
+                connect_args={"check_same_thread": False},
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+            )
+            event.listen(engine, "connect", _apply_sqlite_pragmas)
+            SQLModel.metadata.create_all(engine)
+            _migrate(engine)
+            _migrate_blob_key(engine)
+            _ensure_fts(engine)
+            _ensure_audit_triggers(engine)
+            print("✅ 数据库表结构已初始化！")
+            _engine = engine
+    return _engine
+
+
+_async_engine = None
+
+
+def get_async_engine():
+    """
+    进程内唯一的异步 engine (aiosqlite)，给 FastAPI 的 async 接口用。
+    建表/迁移仍由 get_engine() 完成，这里只负责连接
+    """
+    global _async_engine
+    if _async_engine is not None:
+        return _async_engine
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    get_engine()
+    with _engine_lock:
+        if _async_engine is None:
+            engine = create_async_engine(ASYNC_SQLITE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+            event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+            _async_engine = engine
+    return _async_engine
+
+
+
+class ResumeText(SQLModel, table=True):
+    """附件抽取出的纯文本，按文件内容 hash 存，同一份文件只抽一次 (见 text_extract.py)"""
+
+    file_hash: str = Field(primary_key=True)
+    status: str                      # ok / error / timeout / unsupported
+    text: Optional[str] = None
+    error: Optional[str] = None
+    duration_ms: Optional[int] = None
+    extracted_at: datetime = Field(default_factory=datetime.now)
+
+
+
+# uid 查重结果的进程内 LRU：uid -> (是否存在, 记录时间)。
+# 简历不会被删除，"存在" 一直有效；"不存在" 可能被别的进程 (收邮件、另一个 worker) 插入，
+# 所以只在 ABSENT_UID_TTL 秒内有效。缓存只用于提前拦截，最终去重由 INSERT ... ON CONFLICT 决定
+KNOWN_UIDS_MAX = 100_000
+ABSENT_UID_TTL = float(os.getenv("AUTOEMAIL_ABSENT_UID_TTL", "60"))
+_known_uids = OrderedDict()
+_known_uids_lock = threading.Lock()
+
+
+def remember_uid(uid: str, exists: bool = True):
+    with _known_uids_lock:
+        _known_uids[uid] = (exists, time.monotonic())
+        _known_uids.move_to_end(uid)
+        if len(_known_uids) > KNOWN_UIDS_MAX:
+            _known_uids.popitem(last=False)
+
+
+def forget_absent_uids(uids):
+    """这些 uid 刚写入过库：清掉它们 "不存在" 的缓存"""
+    with _known_uids_lock:
+        for uid in uids:
+            entry = _known_uids.get(uid)
+            if entry is not None and not entry[0]:
+                del _known_uids[uid]
+
+
+def cached_uid_exists(uid: str) -> Optional[bool]:
+    """命中缓存返回 True / False (已知不存在)，没有记录或 "不存在" 已过期返回 None"""
+    with _known_uids_lock:
+        entry = _known_uids.get(uid)
+        if entry is None:
+            return None
+        exists, at = entry
+        if not exists and time.monotonic() - at > ABSENT_UID_TTL:
+            del _known_uids[uid]
+            return None
+        _known_uids.move_to_end(uid)
+        return exists
+
+
+def split_paths(attachment_path) -> list:
+    """attachment_path 可能是多个路径用 ; 拼起来的 (邮件附件 + 云附件)，拆成列表"""
+    return [p for p in (attachment_path or "").split(";") if p]
+
+
+def blob_rows(refs) -> list:
+    """BlobStore 的引用 -> blob 表的行"""
+    return [{"sha256": r["sha256"], "ext": r["ext"], "size": r["size"],
+             "path": r["path"], "pack": r.get("pack"), "created_at": datetime.now()} for r in refs]
 
 
 class ResumeInit:
     def __init__(self) -> None:
-        self.engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
-
-        self.init_db()
+        self.engine = get_engine()
 
     def init_db(self):
         """初始化数据库：如果没有表，就创建表"""
@@ -81,10 +566,371 @@ class ResumeInit:
             session.add(new_resume)  # 放入暂存区
             session.commit()         # 提交到数据库 (相当于按保存键)
             session.refresh(new_resume) # 刷新一下，拿回自动生成的 id
+            remember_uid(new_resume.uid)
             
             print(f"💾 [入库成功] ID: {new_resume.id} | {new_resume.name}")
             return new_resume
 
+    def uid_exists(self, uid: str) -> bool:
+        """查重：先查进程内缓存 (存在 / 已知不存在)，没命中再走 uid 唯一索引"""
+        cached = cached_uid_exists(uid)
+        if cached is not None:
+            return cached
+        with Session(self.engine) as session:
+            found = session.exec(select(Resume.id).where(Resume.uid == uid)).first() is not None
+        remember_uid(uid, found)
+        return found
+
+    def submit_resume(self, resume_data: dict, commit_files=None):
+        """
+        幂等提交：一个事务里 INSERT ... ON CONFLICT(uid) DO NOTHING，
+        只有插入成功才调用 commit_files() 把暂存的文件放进仓库，并在同一事务里登记文件。
+        并发的重复提交只会有一个插入成功，不会留下孤立文件
+        :param commit_files: 无参函数，返回 BlobStore 引用列表 (带 role / filename)
+        :return: 新简历的 id；uid 已存在时返回 None
+        """
+        uid = resume_data["uid"]
+        data = Resume(**resume_data).model_dump(exclude={"id"})
+        stmt = sqlite_insert(Resume).values(**data).on_conflict_do_nothing(index_elements=["uid"])
+        with timed("db_commit"), Session(self.engine) as session:
+            result = session.connection().execute(stmt)
+            if result.rowcount == 0:
+                session.rollback()
+                remember_uid(uid)
+                print(f"⚠️ 简历已存在 (UID: {uid})，跳过保存。")
+                return None
+            refs = commit_files() if commit_files else []
+            if refs:
+                self._insert_blob_links(session, {uid: refs}, linked=set())
+            session.commit()
+        remember_uid(uid)
+        print(f"💾 [入库成功] ID: {result.lastrowid} | {data['name']}")
+        return result.lastrowid
+
+    def add_attachment(self, uid: str, path: str) -> bool:
+        """给已入库的简历追加一个附件路径 (多个路径用 ; 分隔)"""
+        with Session(self.engine) as session:
+            if not self._append_attachment(session, uid, path):
+                return False
+            session.commit()
+            return True
+
+    @staticmethod
+    def _append_attachment(session, uid: str, path: str) -> bool:
+        resume = session.exec(select(Resume).where(Resume.uid == uid)).first()
+        if resume is None:
+            return False
+        paths = split_paths(resume.attachment_path)
+        if path not in paths:
+            paths.append(path)
+        resume.attachment_path = ";".join(paths)
+        session.add(resume)
+        return True
+
+    def create_resumes_bulk(self, resumes, batch_size: int = 500) -> dict:
+        """
+        批量存入简历：每批一个事务，INSERT ... ON CONFLICT(uid) DO NOTHING，
+        已存在的 uid 直接由数据库跳过，不再逐条 SELECT 查重
+        :param resumes: 可迭代的 resume_data 字典
+        :return: {"inserted": 新插入条数, "skipped": 因 uid 重复跳过的条数}
+        """
+        stats = {"inserted": 0, "skipped": 0}
+
+        def flush(batch):
+            with timed("db_commit"), Session(self.engine) as session:
+                inserted = self._insert_resumes(session, batch)
+                session.commit()
+            forget_absent_uids(data["uid"] for data in batch)
+            stats["inserted"] += inserted
+            stats["skipped"] += len(batch) - inserted
+
+        batch = []
+        for data in resumes:
+            batch.append(data)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        print(f"💾 [批量入库] 新增 {stats['inserted']} 条，跳过 {stats['skipped']} 条")
+        return stats
+
+    @staticmethod
+    def _insert_resumes(session, resumes: list) -> int:
+        """在调用方的事务里插入简历，uid 已存在的由数据库跳过；返回新插入条数"""
+        if not resumes:
+            return 0
+        # 经过模型补齐默认值 (status / created_at)，并丢掉表里没有的字段
+        rows = [Resume(**data).model_dump(exclude={"id"}) for data in resumes]
+        stmt = sqlite_insert(Resume).on_conflict_do_nothing(index_elements=["uid"])
+        return session.connection().execute(stmt, rows).rowcount
+
+    def ingest_batch(self, resumes: list, refs_by_uid: dict, urls_by_uid: dict,
+                     mailbox: str, uidvalidity: int, last_uid: int) -> dict:
+        """
+        邮件同步攒下的一批：简历、文件关联、云附件任务和高水位在同一个连接、同一个事务里写入，
+        中途失败时全部回滚，不会出现高水位已推进但简历没入库 (或反过来) 的情况
+        :return: {"inserted": 新插入简历数, "skipped": uid 重复跳过数, "cloud_jobs": 新加入的下载任务数}
+        """
+        refs_by_uid = {uid: refs for uid, refs in refs_by_uid.items() if refs}
+        with timed("db_commit"), Session(self.engine) as session:
+            inserted = self._insert_resumes(session, resumes)
+            if refs_by_uid:
+                linked = set(session.exec(
+                    select(ResumeBlob.resume_uid, ResumeBlob.sha256, ResumeBlob.ext, ResumeBlob.role)
+                    .where(ResumeBlob.resume_uid.in_(list(refs_by_uid)))
+                ).all())
+                self._insert_blob_links(session, refs_by_uid, linked)
+            cloud_jobs = self._insert_cloud_jobs(session, urls_by_uid)
+            self._put_sync_state(session, mailbox, uidvalidity, last_uid)
+            session.commit()
+        forget_absent_uids(data["uid"] for data in resumes)
+        return {"inserted": inserted, "skipped": len(resumes) - inserted, "cloud_jobs": cloud_jobs}
+
+    def link_blobs(self, resume_uid: str, refs: list):
+        """
+        登记文件并关联到简历，一个事务完成
+        :param refs: BlobStore.put_* 的返回值，额外带上 role / filename
+        """
+        self.link_blobs_many({resume_uid: refs})
+
+    def link_blobs_many(self, refs_by_uid: dict):
+        """link_blobs 的批量版本：{resume_uid: refs}，全部在一个事务里完成"""
+        refs_by_uid = {uid: refs for uid, refs in refs_by_uid.items() if refs}
+        if not refs_by_uid:
+            return
+        with timed("db_commit"), Session(self.engine) as session:
+            linked = set(session.exec(
+                select(ResumeBlob.resume_uid, ResumeBlob.sha256, ResumeBlob.ext, ResumeBlob.role)
+                .where(ResumeBlob.resume_uid.in_(list(refs_by_uid)))
+            ).all())
+            self._insert_blob_links(session, refs_by_uid, linked)
+            session.commit()
+
+    @staticmethod
+    def _insert_blob_links(session, refs_by_uid: dict, linked: set):
+        """在调用方的事务里登记文件和关联；linked 是已存在的 (uid, sha256, ext, role)"""
+        rows = blob_rows(r for refs in refs_by_uid.values() for r in refs)
+        session.connection().execute(sqlite_insert(Blob).on_conflict_do_nothing(), rows)
+        for uid, refs in refs_by_uid.items():
+            for r in refs:
+                key = (uid, r["sha256"], r["ext"], r["role"])
+                if key not in linked:
+                    linked.add(key)
+                    session.add(ResumeBlob(resume_uid=uid, sha256=r["sha256"], ext=r["ext"],
+                                           role=r["role"], filename=r.get("filename")))
+
+    def get_blob_filename(self, sha256: str, ext: Optional[str] = None) -> Optional[str]:
+        """仓库里的文件名是 hash，展示/下载时换回原始文件名"""
+        statement = select(ResumeBlob.filename).where(ResumeBlob.sha256 == sha256)
+        if ext is not None:
+            statement = statement.where(ResumeBlob.ext == ext)
+        with Session(self.engine) as session:
+            return session.exec(statement).first()
+
+    def get_existing_uids(self) -> set:
+        """查询库中已有的全部 uid，用于全量同步时跳过"""
+        with Session(self.engine) as session:
+            results = session.exec(select(Resume.uid)).all()
+            return set(str(uid) for uid in results)
+
+    def get_sync_state(self, mailbox: str) -> Optional[SyncState]:
+        """读取某个邮箱文件夹的同步进度，没有则返回 None"""
+        with Session(self.engine) as session:
+            return session.get(SyncState, mailbox)
+
+    def save_sync_state(self, mailbox: str, uidvalidity: int, last_uid: int):
+        """写入 (覆盖) 同步进度"""
+        with timed("db_commit"), Session(self.engine) as session:
+            self._put_sync_state(session, mailbox, uidvalidity, last_uid)
+            session.commit()
+
+    @staticmethod
+    def _put_sync_state(session, mailbox: str, uidvalidity: int, last_uid: int):
+        state = session.get(SyncState, mailbox)
+        if state is None:
+            state = SyncState(mailbox=mailbox, uidvalidity=uidvalidity)
+        state.uidvalidity = uidvalidity
+        state.last_uid = last_uid
+        state.updated_at = datetime.now()
+        session.add(state)
+
+    def enqueue_cloud_jobs(self, urls_by_uid: dict) -> int:
+        """{resume_uid: [url, ...]} 加入云附件下载队列，已排过队的链接跳过；返回新加入的个数"""
+        if not any(urls_by_uid.values()):
+            return 0
+        with timed("db_commit"), Session(self.engine) as session:
+            count = self._insert_cloud_jobs(session, urls_by_uid)
+            session.commit()
+        return count
+
+    @staticmethod
+    def _insert_cloud_jobs(session, urls_by_uid: dict) -> int:
+        rows = [{"resume_uid": uid, "url": url, "status": "pending", "attempts": 0,
+                 "next_attempt_at": 0.0, "created_at": datetime.now()}
+                for uid, urls in urls_by_uid.items() for url in dict.fromkeys(urls)]
+        if not rows:
+            return 0
+        stmt = sqlite_insert(CloudJob).on_conflict_do_nothing(index_elements=["resume_uid", "url"])
+        return session.connection().execute(stmt, rows).rowcount
+
+    def due_cloud_jobs(self, now: float, limit: int = 50) -> list:
+        """到了重试时间 (或租约已过期) 的任务，按到期先后排序"""
+        with Session(self.engine) as session:
+            return session.exec(
+                select(CloudJob)
+                .where(CloudJob.status == "pending", CloudJob.next_attempt_at <= now)
+                .order_by(CloudJob.next_attempt_at, CloudJob.id)
+                .limit(limit)
+            ).all()
+
+    def claim_cloud_jobs(self, jobs: list, lease_until: float) -> list:
+        """
+        领取任务：attempts + 1，next_attempt_at 设为租约到期时间 (进程中途退出时到期后会被重新领取)。
+        以 attempts 作乐观锁，多个进程同时领取同一个任务时只有一个成功；返回领取成功的任务
+        """
+        claimed = []
+        with timed("db_commit"), Session(self.engine) as session:
+            conn = session.connection()
+            for job in jobs:
+                result = conn.execute(
+                    CloudJob.__table__.update()
+                    .where(CloudJob.id == job.id, CloudJob.status == "pending",
+                           CloudJob.attempts == job.attempts)
+                    .values(attempts=job.attempts + 1, next_attempt_at=lease_until,
+                            updated_at=datetime.now())
+                )
+                if result.rowcount:
+                    job.attempts += 1
+                    claimed.append(job)
+            session.commit()
+        return claimed
+
+    def complete_cloud_job(self, job_id: int, resume_uid: str, ref: dict):
+        """下载成功：一个事务里把文件挂到简历上 (attachment_path + 文件关联)，并把任务标记为完成"""
+        with timed("db_commit"), Session(self.engine) as session:
+            self._append_attachment(session, resume_uid, ref["path"])
+            linked = set(session.exec(
+                select(ResumeBlob.resume_uid, ResumeBlob.sha256, ResumeBlob.ext, ResumeBlob.role)
+                .where(ResumeBlob.resume_uid == resume_uid)
+            ).all())
+            self._insert_blob_links(session, {resume_uid: [ref]}, linked)
+            job = session.get(CloudJob, job_id)
+            job.status, job.last_error, job.updated_at = "done", None, datetime.now()
+            session.add(job)
+            session.commit()
+
+    def fail_cloud_job(self, job_id: int, error: str, next_attempt_at: Optional[float]):
+        """下载失败：记下原因；next_attempt_at 为 None 表示不再重试 (status=failed)"""
+        with timed("db_commit"), Session(self.engine) as session:
+            job = session.get(CloudJob, job_id)
+            job.last_error = error
+            job.updated_at = datetime.now()
+            if next_attempt_at is None:
+                job.status = "failed"
+            else:
+                job.next_attempt_at = next_attempt_at
+            session.add(job)
+            session.commit()
+
+    def update_statuses(self, expected: dict, new_status: str) -> dict:
+        """
+        批量改状态：一条 UPDATE ... WHERE id IN (...)，按 version 做乐观锁，同一事务里写 status_audit
+        :param expected: {resume.id: 页面上看到的 version (None 表示不检查)}
+        :return: {"updated", "unchanged", "conflicts", "missing"}，均为 id 列表
+        """
+        if not expected:
+            return status_update_result({}, new_status, [], [])
+        audit, update, current = build_status_update(expected, new_status)
+        with timed("db_commit"), Session(self.engine) as session:
+            conn = session.connection()
+            conn.execute(audit)
+            updated = conn.execute(update).scalars().all()
+            rest = set(expected) - set(updated)
+            current_rows = conn.execute(current(rest)).all() if rest else []
+            session.commit()
+        return status_update_result(expected, new_status, updated, current_rows)
+
+    def get_status_history(self, resume_id: int) -> list:
+        """某份简历的状态变更记录，按时间先后"""
+        with Session(self.engine) as session:
+            return session.exec(
+                select(StatusAudit).where(StatusAudit.resume_id == resume_id).order_by(StatusAudit.id)
+            ).all()
+
+    def query_resumes(self, jobs=None, statuses=None, keyword=None, ascending=False,
+                      cursor=None, limit: int = 50):
+        """
+        按条件分页查询 (过滤、排序、分页都在 SQL 里完成)
+        :return: (本页简历列表, 下一页的 cursor；没有下一页时为 None)
+        """
+        statement = build_resume_page_query(jobs, statuses, keyword, ascending, cursor, limit)
+        with timed("dashboard_query"), Session(self.engine) as session:
+            rows = session.exec(statement).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].send_time, rows[-1].id)
+        return rows, next_cursor
+
+    def search_resumes(self, keyword: str, jobs=None, statuses=None, limit: int = 50, offset: int = 0):
+        """
+        全文检索 (姓名/电话/岗位/简历正文)，按相关度排序，offset 分页
+        :return: (本页简历列表, 是否还有下一页)
+        """
+        statement = build_resume_search_query(keyword, jobs, statuses, limit, offset)
+        with timed("dashboard_query"), Session(self.engine) as session:
+            rows = session.exec(statement).all()
+        return rows[:limit], len(rows) > limit
+
+    def update_search_content(self, contents: dict):
+        """
+        把抽取出的简历正文写入全文索引
+        :param contents: {resume.id: 正文}
+        """
+        if not contents:
+            return
+        with Session(self.engine) as session:
+            session.connection().execute(
+                text("UPDATE resume_fts SET content = :content WHERE rowid = :rid"),
+                [{"content": content, "rid": rid} for rid, content in contents.items()],
+            )
+            session.commit()
+
+    def save_resume_texts(self, results: list):
+        """写入 (覆盖) 文本抽取结果，results 中每项是 ResumeText 的字段字典"""
+        if not results:
+            return
+        stmt = sqlite_insert(ResumeText)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["file_hash"],
+            set_={c: stmt.excluded[c] for c in ("status", "text", "error", "duration_ms", "extracted_at")},
+        )
+        with Session(self.engine) as session:
+            session.connection().execute(stmt, results)
+            session.commit()
+
+    def get_resume_texts(self, file_hashes) -> dict:
+        """{file_hash: ResumeText}，只返回已抽取过的"""
+        file_hashes = list(set(file_hashes))
+        if not file_hashes:
+            return {}
+        with Session(self.engine) as session:
+            rows = session.exec(select(ResumeText).where(ResumeText.file_hash.in_(file_hashes))).all()
+            return {row.file_hash: row for row in rows}
+
+    def count_resumes(self, jobs=None, statuses=None, keyword=None) -> int:
+        statement = build_resume_query(select(func.count()).select_from(Resume), jobs, statuses, keyword)
+        with timed("dashboard_query"), Session(self.engine) as session:
+            return session.exec(statement).one()
+
+    def get_job_positions(self) -> list:
+        """库里出现过的全部岗位 (走 job_position 索引)"""
+        with Session(self.engine) as session:
+            statement = select(Resume.job_position).distinct().order_by(Resume.job_position)
+            return [job for job in session.exec(statement).all() if job]
+
     def get_all_resumes(self):
         """查询所有简历"""
         with Session(self.engine) as session:
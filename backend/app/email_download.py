@@ -8,24 +8,47 @@ Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查
 '''
 
 
-import os
 import re
-from sqlmodel import select
+import sys
+import time
+import queue
+import random
+import select
+import signal
+import hashlib
+import argparse
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from imbox import Imbox
+from imbox.parser import parse_email, parse_flags
 from pathlib import Path
-from utils import load_config
-from database import init_db, engine, Resume, create_resume, get_all_resumes, Session
 import imaplib
 from imaplib import IMAP4
-import requests
-from urllib.parse import unquote, urlparse
 
-# 定义保存路径
-BASE_DIR = Path(__file__).parent.parent / "storage"
-EMAIL_DIR = BASE_DIR / "emails"       # 存原始 .eml
-ATTACH_DIR = BASE_DIR / "attachments" # 存简历附件
-EMAIL_DIR.mkdir(parents=True, exist_ok=True)
-ATTACH_DIR.mkdir(parents=True, exist_ok=True)
+# 将项目根目录加入 sys.path，保证能找到 backend 包 (与 frontend/app/senddb.py 相同)
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.app.utils import load_config
+from backend.app.database import ResumeInit
+from backend.app.imap_fetch import StructureFetcher, uid_set
+from backend.app.cloud_download import CloudDownloader
+from backend.app.cloud_jobs import CloudJobQueue
+from backend.app.job_classifier import JobClassifier
+from backend.app.blob_store import BlobStore
+from backend.app.text_extract import TextExtractor
+from backend.app.metrics import METRICS_RUN_SUMMARY, REGISTRY, profiled, stage_totals, timed, write_run_summary
+
+# .eml 与附件统一存进按内容寻址的仓库 (storage/blobs)，同内容只存一份
+
+# 从邮件正文里粗略提取手机号
+PHONE_RE = re.compile(r'(?<!\d)1[3-9]\d{9}(?!\d)')
+MESSAGE_ID_RE = re.compile(rb'UID (\d+).*?Message-ID:\s*(<[^>\r\n]*>|\S+)', re.IGNORECASE | re.DOTALL)
+# IDLE 期间服务器推送的新邮件通知：* 23 EXISTS
+EXISTS_RE = re.compile(rb'^\* \d+ EXISTS', re.IGNORECASE)
+
 
 class EmailDownloader:
     def __init__(self, config_path: Path):
@@ -38,31 +61,112 @@ class EmailDownloader:
         # 允许下载的扩展名白名单
         self.allowed_extensions = {'.pdf', '.docx', '.doc', '.jpg', '.png'}
 
+        # 拉取模式：
+        #   full      - 经 Imbox 整封下载 (默认，兼容旧行为)
+        #   structure - 先取 ENVELOPE + BODYSTRUCTURE，只下载白名单内的附件 part
+        #   stream    - 同 structure，但附件和 .eml 分段拉取、边解码边写盘，大附件不进内存
+        self.fetch_mode = self.config.get('fetch_mode', 'full')
+        # stream 模式每次拉取的分段大小 (字节)，也就是单封邮件内存占用的上限量级
+        self.stream_chunk_size = self.config.get('stream_chunk_size', 1024 * 1024)
+        # 是否保存完整的原始 .eml。full 模式本来就整封下载，默认保存；
+        # structure / stream 模式保存 .eml 等于把跳过的大附件又下载一遍，默认不保存，需要时显式打开
+        self.save_raw_eml = self.config.get('save_raw_eml', self.fetch_mode == 'full')
+        self.fetch_batch_size = self.config.get('fetch_batch_size', 50)
+        # 全量同步时批量取 Message-ID：只取一个头，每条命令可以多带一些 UID
+        self.header_batch_size = self.config.get('header_batch_size', 1000)
+        # 并行拉取的连接数，首次导入大邮箱时调大 (注意邮箱服务商的并发连接上限)
+        self.fetch_workers = self.config.get('fetch_workers', 1)
+        # 每攒多少封邮件写一次库 (一个事务)
+        self.db_batch_size = self.config.get('db_batch_size', 200)
+        # 每次同步结束后写一份各阶段耗时汇总 (storage/metrics/runs/)
+        self.metrics_summary = self.config.get('metrics_summary', METRICS_RUN_SUMMARY)
+
+        # 云附件下载器：所有邮件共用连接池，后台并发下载
+        self.cloud_downloader = CloudDownloader(
+            max_workers=self.config.get('cloud_workers', 8),
+            per_host=self.config.get('cloud_per_host', 2),
+            chunk_size=self.config.get('cloud_chunk_size', 256 * 1024),
+            timeout=tuple(self.config.get('cloud_timeout', (10, 60))),
+            cookie_str=self.config.get('cloud_cookie'),
+        )
+
+        self.blob_store = BlobStore()
+
+        # 岗位识别：岗位列表 + 同义词 (可在配置的 job_synonyms 里追加) 预编译成自动机，只建一次
+        self.job_classifier = JobClassifier(self.config.get('job_synonyms'))
+
+        # 云附件下载任务持久化在 cloud_job 表：失败按 cloud_retry_base * 2^(n-1) 秒 (上限 cloud_retry_max) 退避重试，
+        # 最多 cloud_max_attempts 次；watch 模式下由后台线程持续处理。
+        # 单次同步只把到期的任务交给下载线程池，不等它们下载完；cloud_drain: true (或命令行 --drain-cloud) 时才等
+        self.cloud_drain = self.config.get('cloud_drain', False)
+        # 简历正文抽取 (写入全文索引)：每次同步结束后处理新入库的简历，云附件下载完成后处理对应的简历
+        self.extract_text = self.config.get('extract_text', True)
+        self.text_extractor = TextExtractor(
+            workers=self.config.get('extract_workers'),
+            timeout=self.config.get('extract_timeout', 60),
+        )
+
+        self.cloud_queue = CloudJobQueue(
+            ResumeInit(), self.blob_store, self.cloud_downloader,
+            max_attempts=self.config.get('cloud_max_attempts', 8),
+            base_delay=self.config.get('cloud_retry_base', 60),
+            max_delay=self.config.get('cloud_retry_max', 6 * 3600),
+            on_complete=self._extract_resume_text if self.extract_text else None,
+        )
+
+        self.folder = 'INBOX'
+        # 同步进度表的主键：账号 + 文件夹
+        self.mailbox_key = f"{self.config['username']}:{self.folder}"
+        self.uidvalidity = None
+
+        # 常驻模式 (watch)：
+        #   idle_timeout    - 一次 IDLE 最长保持多久 (RFC 2177 要求 29 分钟内重新发起)
+        #   poll_interval   - 服务器不支持 IDLE 时，用 NOOP 轮询的间隔
+        #   reconnect_max_delay - 断线重连的指数退避上限
+        self.idle_timeout = self.config.get('idle_timeout', 25 * 60)
+        self.poll_interval = self.config.get('poll_interval', 30)
+        self.reconnect_max_delay = self.config.get('reconnect_max_delay', 300)
+        self._stop = threading.Event()
+        self._exists = 0
+
+
+    def _open_connection(self) -> Imbox:
+        """建立一条已登录、已发送 ID、只读选中 INBOX 的连接"""
+
+        # 建连 + 登录 + ID + SELECT 整体计时
+        with timed("imap_connect"):
+            imaplib.Commands['ID'] = ('AUTH', 'AUTHENTICATED', 'SELECTED', 'LOGOUT')
+
+            mailbox = Imbox(self.config['imap_server'], 
+                            username=self.config['username'], 
+                            password=self.config['imap_password'], 
+                            ssl=self.config.get('ssl', True),
+                            port=self.config.get('port'))
+
+             # 发送 ID
+            typ, data = mailbox.connection._simple_command(
+                'ID', '("name" "Mozilla Thunderbird" "version" "102.0")'
+            )
+            # print("ID:", typ, data)
+
+            # 只读选择 INBOX
+            typ, data = mailbox.connection.select(self.folder, readonly=True)
+            # print("SELECT:", typ, data)
+            if typ != 'OK':
+                raise IMAP4.error(f"Failed to select INBOX: {typ} {data}")
+
+            return mailbox
 
     def _connect(self):
 
         if self._is_connected:
             return
 
-        
-        imaplib.Commands['ID'] = ('AUTH', 'AUTHENTICATED', 'SELECTED', 'LOGOUT')
+        self.mailbox = self._open_connection()
 
-        self.mailbox = Imbox(self.config['imap_server'], 
-                        username=self.config['username'], 
-                        password=self.config['imap_password'], 
-                        ssl=True)
-
-         # 发送 ID
-        typ, data = self.mailbox.connection._simple_command(
-            'ID', '("name" "Mozilla Thunderbird" "version" "102.0")'
-        )
-        # print("ID:", typ, data)
-
-        # 只读选择 INBOX
-        typ, data = self.mailbox.connection.select('INBOX', readonly=True)
-        # print("SELECT:", typ, data)
-        if typ != 'OK':
-            raise IMAP4.error(f"Failed to select INBOX: {typ} {data}")
+        # SELECT 的 untagged 响应里带有 UIDVALIDITY
+        typ, data = self.mailbox.connection.response('UIDVALIDITY')
+        self.uidvalidity = int(data[0]) if data and data[0] else 0
 
 
         print("✅ Connected to the email server")
@@ -71,7 +175,7 @@ class EmailDownloader:
         self._is_connected = True
 
     def _init_db(self):
-        init_db()
+        self.resume_init = ResumeInit()
 
 
     def _disconnect(self):
@@ -81,44 +185,186 @@ class EmailDownloader:
             self._is_connected = False
  
     
+    def _drop_connection(self):
+        """连接已经断了 (或状态不明)，不走正常 LOGOUT，直接丢掉"""
+        try:
+            self.mailbox.connection.shutdown()
+        except Exception:
+            pass
+        self._is_connected = False
+
     def download_email(self):
         all_inbox_messages = self.mailbox.messages()
 
         return all_inbox_messages
+
+    def _search_uids(self, start_uid: int = 1) -> list:
+        """UID SEARCH UID n:* ，返回 >= start_uid 的 UID 列表 (升序)"""
+        typ, data = self.mailbox.connection.uid('search', None, f'UID {start_uid}:*')
+        if typ != 'OK' or not data or not data[0]:
+            return []
+        # 注意：n 大于当前最大 UID 时，n:* 仍会返回最大的那个 UID，需要再过滤一次
+        uids = sorted(int(u) for u in data[0].split())
+        return [u for u in uids if u >= start_uid]
+
+    def _fetch_message_ids(self, uids: list) -> dict:
+        """
+        批量取 Message-ID 头，返回 {uid: message_id}。
+        全量同步时 uids 是整个邮箱：每 header_batch_size 个 UID 一条命令，连续的 UID 合并成 a:b，
+        不会超过服务器的命令长度限制
+        """
+        result = {}
+        for i in range(0, len(uids), self.header_batch_size):
+            typ, data = self.mailbox.connection.uid(
+                'fetch', uid_set(uids[i:i + self.header_batch_size]), '(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])'
+            )
+            if typ != 'OK':
+                continue
+            for item in data:
+                if not isinstance(item, tuple):
+                    continue
+                m = MESSAGE_ID_RE.search(item[0] + item[1])
+                if m:
+                    result[int(m.group(1))] = m.group(2).decode(errors="ignore").strip()
+        return result
+
+    def _fetch_batch(self, mailbox: Imbox, uids: list):
+        """用指定连接，按 fetch_mode 逐封 yield (uid, msg)，msg 的属性与 imbox.Message 一致"""
+        if self.fetch_mode in ('structure', 'stream'):
+            fetcher = StructureFetcher(mailbox.connection,
+                                       self.allowed_extensions,
+                                       save_raw_eml=self.save_raw_eml,
+                                       batch_size=self.fetch_batch_size,
+                                       blob_store=self.blob_store if self.fetch_mode == 'stream' else None,
+                                       chunk_size=self.stream_chunk_size)
+            yield from fetcher.iter_messages(uids)
+            return
+
+        # 与 imbox.parser.fetch_email_by_uid 相同，只是把 网络拉取 和 MIME 解析 分开计时
+        for uid in uids:
+            with timed("imap_fetch") as t:
+                typ, data = mailbox.connection.uid('fetch', str(uid), '(BODY.PEEK[] FLAGS)')
+                raw_headers, raw_email = data[0]
+                t.bytes = len(raw_email)
+            with timed("mime_parse"):
+                msg = parse_email(raw_email, policy=mailbox.parser_policy)
+                msg.__dict__['flags'] = parse_flags(raw_headers.decode())
+            yield uid, msg
+
+    def _iter_messages(self, uids: list):
+        """
+        单连接时直接在主连接上拉取；
+        fetch_workers > 1 时把 UID 切成批次，分给 N 条只读连接并行拉取，
+        结果仍按 UID 顺序交回给调用方 (调用方是唯一的写盘/写库者)
+        """
+        workers = min(self.fetch_workers, (len(uids) + self.fetch_batch_size - 1) // self.fetch_batch_size)
+        if workers <= 1:
+            yield from self._fetch_batch(self.mailbox, uids)
+            return
+
+        print(f"🚀 并行拉取：{workers} 条连接")
+        pool = queue.Queue()
+        for _ in range(workers):
+            pool.put(self._open_connection())
+
+        def fetch(batch):
+            mailbox = pool.get()
+            try:
+                return list(self._fetch_batch(mailbox, batch))
+            finally:
+                pool.put(mailbox)
+
+        batches = [uids[i:i + self.fetch_batch_size] for i in range(0, len(uids), self.fetch_batch_size)]
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # 在途批次数有上限，避免写入慢时内存里堆满已下载的邮件
+                batch_iter = iter(batches)
+                pending = deque(executor.submit(fetch, b) for b in islice(batch_iter, workers * 2))
+                while pending:
+                    yield from pending.popleft().result()
+                    batch = next(batch_iter, None)
+                    if batch is not None:
+                        pending.append(executor.submit(fetch, batch))
+        finally:
+            while not pool.empty():
+                try:
+                    pool.get_nowait().logout()
+                except Exception:
+                    pass
+
+    def make_resume_uid(self, message_id, uid) -> str:
+        """
+        邮件简历的 uid：优先用 Message-ID 的 md5，UIDVALIDITY 变化后依旧稳定；
+        没有 Message-ID 时退回 UIDVALIDITY + UID
+        """
+        key = message_id or f"{self.uidvalidity}_{uid}"
+        return "mail_" + hashlib.md5(key.encode("utf-8")).hexdigest()
         
     
-    def sync_emalls_to_db(self):
+    def sync_emalls_to_db(self, incremental: bool = True, drain_cloud: bool = None):
+        """
+        同步收件箱到数据库
+        :param incremental: True 时只拉取高水位之后的新邮件；
+                            UIDVALIDITY 变化或没有同步记录时自动退回全量同步
+        :param drain_cloud: 是否等云附件下载完再返回，默认取配置 cloud_drain
+        """
+        run_before = stage_totals()
 
         self._connect()
 
-        
-        with Session(engine) as session:
-            statement = select(Resume.uid)
-            results = session.exec(statement).all()
-            existing_uids = set(str(uid) for uid in results) 
-        
-        print(f"✅ 本地已有 {len(existing_uids)} 封邮件。")
-        
-        
-        
-        
-        all_inbox_messages = self.mailbox.messages()
+        state = self.resume_init.get_sync_state(self.mailbox_key)
+        full_sync = (not incremental or state is None
+                     or state.uidvalidity != self.uidvalidity)
+
+        if full_sync:
+            if state is not None and state.uidvalidity != self.uidvalidity:
+                print(f"⚠️ UIDVALIDITY 已变化 ({state.uidvalidity} -> {self.uidvalidity})，执行全量同步。")
+            last_uid = 0
+            uids = self._search_uids(1)
+        else:
+            last_uid = state.last_uid
+            uids = self._search_uids(last_uid + 1)
+
+        if not uids:
+            # 没有新邮件时直接返回，不碰云附件队列 (留给 watch 的后台线程或下一次有新邮件的同步)
+            print("✅ 没有新邮件。")
+            return 0
+
+        all_uids = uids
+        print(f"📬 待处理 {len(uids)} 封邮件 ({'全量' if full_sync else '增量'})。")
+
+        # 全量同步时，先批量拿 Message-ID，跳过库里已有的邮件，避免重复下载
+        message_ids = {}
+        if full_sync:
+            existing_uids = self.resume_init.get_existing_uids()
+            print(f"✅ 本地已有 {len(existing_uids)} 封邮件。")
+            message_ids = self._fetch_message_ids(uids)
+
+            uids = [uid for uid in uids
+                    if self.make_resume_uid(message_ids.get(uid), uid) not in existing_uids]
 
         new_count = 0
-        for uid, msg in all_inbox_messages:
-            # if str(uid) in existing_uids:
-            #     print(f"⚠️ 邮件已存在 (UID: {uid})，跳过保存。")
-            #     continue
+        pending_rows, pending_blobs, pending_cloud = [], {}, {}
+        for uid, msg in self._iter_messages(uids):
+            message_id = (getattr(msg, "message_id", None) or "").strip() or message_ids.get(uid)
+            resume_uid = self.make_resume_uid(message_id, uid)
             
 
             # 1. 下载原始文件与附件
 
-            eml_path = EMAIL_DIR / f"{msg.subject}.eml" 
+            blob_refs = []
             raw_bytes = msg.raw_email
-            if isinstance(raw_bytes, str):
-                raw_bytes = raw_bytes.encode("utf-8", errors="ignore")
-                
-            eml_path.write_bytes(raw_bytes)
+            if raw_bytes and self.save_raw_eml:
+                if isinstance(raw_bytes, str):
+                    raw_bytes = raw_bytes.encode("utf-8", errors="ignore")
+                    
+                with timed("eml_write") as t:
+                    ref = self.blob_store.put_bytes(raw_bytes, ".eml")
+                    t.bytes = len(raw_bytes)
+                blob_refs.append({**ref, "role": "eml", "filename": f"{msg.subject}.eml"})
+            elif getattr(msg, "raw_ref", None):
+                # stream 模式：已经分段写进仓库
+                blob_refs.append({**msg.raw_ref, "role": "eml", "filename": f"{msg.subject}.eml"})
 
 
             # 2) 保存附件（白名单过滤）
@@ -132,6 +378,11 @@ class EmailDownloader:
                     filename = filename.replace("/", "_").replace("\\", "_")
                     print(filename)
                     ext = Path(filename).suffix.lower()
+                    if "ref" in att:
+                        # stream 模式：拉取时已按白名单过滤并写进仓库
+                        blob_refs.append({**att["ref"], "role": "attachment", "filename": filename})
+                        att_files.append(att["ref"]["path"])
+                        continue
                     if ext and ext not in self.allowed_extensions:
                         # print(f"跳过附件 {filename}，后缀 {ext} 不在白名单。")
                         continue
@@ -139,151 +390,247 @@ class EmailDownloader:
                     content = att.get("content")
 
                     if content:
-                        path = ATTACH_DIR / filename
-                        path.write_bytes(content.getvalue())
-                        att_files.append(str(path))
+                        with timed("attachment_write") as t:
+                            data = content.getvalue()
+                            ref = self.blob_store.put_bytes(data, ext)
+                            t.bytes = len(data)
+                        blob_refs.append({**ref, "role": "attachment", "filename": filename})
+                        att_files.append(ref["path"])
             else:
-                html_list = msg.body.get('html')
-                
-                self.download_cloud_file_safe(html_list, ATTACH_DIR)
+                # 正文里的云附件链接随简历一起写进下载队列，由后台下载，不阻塞同步循环
+                pending_cloud[resume_uid] = msg.body.get('html')
 
                 
                 
 
 
            # 2. 构造数据
+            sender = msg.sent_from[0] if msg.sent_from else {}
+            plain_body = msg.body['plain'][0] if msg.body['plain'] else ""
+            phone = PHONE_RE.search(f"{msg.subject} {plain_body}")
+            send_time = getattr(msg, "parsed_date", None)
+            # 附件名里也常带岗位 (张三_前端工程师_简历.pdf)，和主题一起算作"主题"
+            with timed("job_classify"):
+                job_position = self.job_classifier.classify(
+                    " ".join([msg.subject or "", *(a.get("filename") or "" for a in msg.attachments)]),
+                    plain_body)
             resume_data = {
-                "uid": str(uid),
-                "subject": msg.subject,
-                "sender": msg.sent_from[0]['email'],
-                "send_time": str(msg.date),
-                "email_body": msg.body['plain'][0] if msg.body['plain'] else "",
-                "raw_email_path": str(eml_path),
+                "uid": resume_uid,
+                "name": sender.get("name") or sender.get("email", ""),
+                "phone_num": phone.group(0) if phone else "",
+                # 与网页投递统一格式，保证按时间排序正确
+                "send_time": send_time.strftime("%Y-%m-%d %H:%M:%S") if send_time else str(msg.date),
                 "attachment_path": ";".join(att_files) if att_files else None,
                 "status": "new",
-                # 如果你加了岗位提取功能
-                # "job_position": extract_position_from_subject(msg.subject)
+                "job_position": job_position,
             }
 
-            create_resume(resume_data)
-            new_count += 1
-        
-        print(f"✅ 新邮件处理完成，共 {new_count} 封。")
-
-
+            pending_rows.append(resume_data)
+            pending_blobs[resume_uid] = blob_refs
+            last_uid = uid
 
+            # 攒够一批再写库 (一个事务)，并同时落盘高水位，中途中断也不必从头再来
+            if len(pending_rows) >= self.db_batch_size:
+                new_count += self._flush_rows(pending_rows, pending_blobs, pending_cloud, last_uid)
 
+        new_count += self._flush_rows(pending_rows, pending_blobs, pending_cloud, last_uid)
 
-    def download_cloud_file_safe(self, html_content_list, save_dir, cookie_str=None):
-            """下载 QQ/网易大附件（含跳转页解析）。返回保存路径或 None。"""
-            if not html_content_list or not isinstance(html_content_list, list):
-                return None
-            html_text = html_content_list[0] or ""
-
-            # 邮件正文里的初始链接
-            jump_links = re.findall(r'href=["\'](http[^"\']*(?:download|ftn|qqmail)[^"\']*)["\']',
-                                    html_text, re.IGNORECASE)
-            if not jump_links:
-                return None
-
-            session = requests.Session()
-            session.headers.update({"User-Agent": "Mozilla/5.0"})
-            if cookie_str:
-                session.headers.update({"Cookie": cookie_str})
-
-            allow_ext = {'.pdf', '.doc', '.docx', '.zip', '.rar', '.7z'}
-            allow_ct_prefix = (
-                'application/pdf',
-                'application/msword',
-                'application/vnd.openxmlformats-officedocument',
-                'application/octet-stream',
-            )
+        self._process_cloud_jobs(self.cloud_drain if drain_cloud is None else drain_cloud)
 
-            def pick_filename(url, resp):
-                cd = resp.headers.get("Content-Disposition", "")
-                m = re.search(r'filename="?([^"]+)"?', cd)
-                if m:
-                    fname = m.group(1)
-                else:
-                    fname = os.path.basename(urlparse(url).path) or "downloaded_file.bin"
-                fname = unquote(fname)
-                fname = fname.replace("/", "_").replace("\\", "_")
-                return fname
-
-            def is_html(resp):
-                return "text/html" in resp.headers.get("Content-Type", "").lower()
-
-            def extract_direct_links(page_html):
-                links = re.findall(r'https?://[^"\']*(?:download|ftn|qqmail)[^"\']*', page_html, re.IGNORECASE)
-                # 兼容 downUrl = "..."
-                links += re.findall(r'downUrl\s*[:=]\s*["\']([^"\']+)["\']', page_html, re.IGNORECASE)
-                return links
-
-            for jurl in jump_links:
-                url = jurl.replace("&amp;", "&")
-                print(f"☁️ 跳转页: {url[:80]}...")
-                try:
-                    resp = session.get(url, timeout=20, allow_redirects=True)
-                except Exception as exc:
-                    print(f"⚠️ 跳转失败: {exc}")
-                    continue
-
-                # 如果已经是文件响应，直接尝试保存
-                if not is_html(resp):
-                    fname = pick_filename(url, resp)
-                    ext = Path(fname).suffix.lower()
-                    ct = resp.headers.get("Content-Type", "").lower()
-                    if ext in allow_ext or ct.startswith(allow_ct_prefix):
-                        save_path = os.path.join(save_dir, fname)
-                        with open(save_path, "wb") as f:
-                            for chunk in resp.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                        print(f"✅ 云附件下载成功: {save_path}")
-                        return save_path
+        # 全量同步时被跳过的邮件也算已处理，高水位直接推到本次看到的最大 UID
+        last_uid = max(last_uid, max(all_uids))
+        self.resume_init.save_sync_state(self.mailbox_key, self.uidvalidity, last_uid)
+        if self.extract_text and new_count:
+            self._extract_new_text()
+        print(f"✅ 新邮件处理完成，共 {new_count} 封。")
+        if self.metrics_summary:
+            path = write_run_summary("sync", run_before, {
+                "mailbox": self.mailbox_key, "full_sync": full_sync,
+                "messages": len(uids), "inserted": new_count,
+            })
+            print(f"📊 本次同步的耗时汇总: {path}")
+        return new_count
+
+
+
+
+
+    # ------------------------------------------------------------------
+    # 常驻模式：IMAP IDLE (不支持时 NOOP 轮询) + 断线指数退避重连
+    # ------------------------------------------------------------------
+
+    def _wait_idle(self, timeout: float) -> bool:
+        """
+        发 IDLE，等服务器推送 EXISTS (有新邮件) 或超时，然后 DONE 结束。
+        imaplib (3.10) 没有 idle()，这里直接读写连接；返回是否收到了新邮件通知
+        """
+        conn = self.mailbox.connection
+        tag = conn._new_tag()
+        conn.send(tag + b' IDLE\r\n')
+        line = conn.readline()
+        if not line.startswith(b'+'):
+            raise IMAP4.error(f"IDLE rejected: {line!r}")
+
+        got_new = False
+        deadline = time.monotonic() + timeout
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # 每秒醒一次看看是否要退出；SSL 连接里可能已有解密好的数据，select 看不到
+            pending = getattr(conn.sock, 'pending', lambda: 0)()
+            if not pending and not select.select([conn.sock], [], [], min(remaining, 1.0))[0]:
+                continue
+            line = conn.readline()
+            if not line or line.startswith(b'* BYE'):
+                raise IMAP4.abort(f"connection closed during IDLE: {line!r}")
+            if EXISTS_RE.match(line):
+                got_new = True
+                break
+
+        conn.send(b'DONE\r\n')
+        while True:
+            line = conn.readline()
+            if not line:
+                raise IMAP4.abort("connection closed after IDLE")
+            if line.startswith(tag):
+                break
+        return got_new
+
+    def _wait_noop(self, timeout: float) -> bool:
+        """不支持 IDLE 的服务器：每 poll_interval 秒发一次 NOOP，当作保活并顺带收 EXISTS"""
+        if self._stop.wait(timeout):
+            return False
+        typ, data = self.mailbox.connection.noop()
+        if typ != 'OK':
+            raise IMAP4.abort(f"NOOP failed: {data}")
+        # NOOP 期间收到的 EXISTS 会被 imaplib 记在 untagged_responses 里；
+        # 有的服务器每次 NOOP 都回 EXISTS，所以要和上次的邮件数比较
+        typ, data = self.mailbox.connection.response('EXISTS')
+        if not data or not data[-1]:
+            return False
+        exists, self._exists = self._exists, int(data[-1])
+        return self._exists != exists
+
+    def watch(self):
+        """
+        常驻监听收件箱：保持一条连接，先把错过的邮件补齐 (按高水位增量，不扫全量)，
+        之后每收到新邮件通知就只拉高水位之后的 UID。
+        连接或同步出错时按 1, 2, 4 ... 秒 (上限 reconnect_max_delay) 退避重连，重连后同样先增量补齐
+        """
+        delay = 1
+        self.cloud_queue.start(interval=self.poll_interval)
+        while not self._stop.is_set():
+            try:
+                self._connect()
+                use_idle = 'IDLE' in self.mailbox.connection.capabilities
+                print(f"👀 开始监听 {self.mailbox_key} ({'IDLE' if use_idle else f'NOOP 每 {self.poll_interval}s'})")
+                self.sync_emalls_to_db(incremental=True)
+                # SELECT 时的 EXISTS 还留在 imaplib 的 untagged_responses 里，取出来作为 NOOP 比较的起点
+                typ, data = self.mailbox.connection.response('EXISTS')
+                self._exists = int(data[-1]) if data and data[-1] else 0
+                delay = 1
+
+                while not self._stop.is_set():
+                    if use_idle:
+                        got_new = self._wait_idle(self.idle_timeout)
                     else:
-                        print(f"⚠️ 非允许类型 ext={ext} ct={ct}，跳过")
-                        continue
-
-                # 跳转页是 HTML，再提取直链
-                html = resp.text
-                direct_links = extract_direct_links(html)
-                if not direct_links:
-                    print("⚠️ 跳转页未找到直链，可能需要登录/验证码")
-                    continue
-
-                for durl in direct_links:
-                    durl = durl.replace("&amp;", "&")
-                    print(f"➡️ 直链尝试: {durl[:80]}...")
-                    try:
-                        dresp = session.get(durl, timeout=20, allow_redirects=True, stream=True)
-                    except Exception as exc:
-                        print(f"⚠️ 直链请求失败: {exc}")
-                        continue
-                    if is_html(dresp):
-                        print("⚠️ 直链仍返回 HTML，可能需登录/验证码，跳过")
-                        continue
-                    fname = pick_filename(durl, dresp)
-                    ext = Path(fname).suffix.lower()
-                    ct = dresp.headers.get("Content-Type", "").lower()
-                    if ext not in allow_ext and not ct.startswith(allow_ct_prefix):
-                        print(f"⚠️ 非允许类型 ext={ext} ct={ct}，跳过")
-                        continue
-                    save_path = os.path.join(save_dir, fname)
-                    with open(save_path, "wb") as f:
-                        for chunk in dresp.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                    print(f"✅ 云附件下载成功: {save_path}")
-                    return save_path
+                        got_new = self._wait_noop(self.poll_interval)
+                    if got_new:
+                        self.sync_emalls_to_db(incremental=True)
+            except Exception as exc:
+                # 连接断开之外的错误 (解析、写库……) 也不能让常驻进程退出：记下来，同样退避后重来
+                self._drop_connection()
+                if self._stop.is_set():
+                    break
+                # 加一点抖动，多个实例不会同时重连
+                wait = delay * random.uniform(0.5, 1.0)
+                if isinstance(exc, (IMAP4.abort, IMAP4.error, OSError)):
+                    print(f"⚠️ 连接异常: {exc}，{wait:.1f} 秒后重连")
+                else:
+                    print(f"❌ 同步出错: {type(exc).__name__}: {exc}，{wait:.1f} 秒后重试")
+                self._stop.wait(wait)
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+        self.cloud_queue.stop()
+        try:
+            self._disconnect()
+        except (IMAP4.error, OSError):
+            self._drop_connection()
+        print("👋 已停止监听")
+
+    def stop(self):
+        """结束 watch 循环 (可以从其他线程或信号处理函数里调用)"""
+        self._stop.set()
+
+    def _flush_rows(self, pending_rows: list, pending_blobs: dict, pending_cloud: dict, last_uid: int) -> int:
+        """批量写入攒下的简历、文件关联与云附件下载任务，并推进高水位；返回新插入条数"""
+        if not pending_rows:
+            return 0
+        # 简历、文件关联、云附件任务和高水位一个事务写入：要么全部生效，要么下次从原高水位重来
+        stats = self.resume_init.ingest_batch(
+            pending_rows, pending_blobs, self.cloud_queue.links(pending_cloud),
+            self.mailbox_key, self.uidvalidity, last_uid,
+        )
+        # 任务已和简历行一起落库，下载完成后才挂到简历上
+        if stats["cloud_jobs"]:
+            self.cloud_queue.run_due()
+        pending_rows.clear()
+        pending_blobs.clear()
+        pending_cloud.clear()
+        return stats["inserted"]
+
+    def _extract_new_text(self):
+        """抽取新入库简历的正文；出错不影响同步本身，下次同步从断点继续"""
+        try:
+            self.text_extractor.run_new()
+        except Exception as exc:
+            print(f"⚠️ 文本抽取失败: {type(exc).__name__}: {exc}")
+
+    def _extract_resume_text(self, resume_uid: str):
+        """云附件挂到简历上之后，重新抽取该简历的正文"""
+        self.text_extractor.extract_resumes([resume_uid])
 
-            return None
+    def download_cloud_file_safe(self, html_content_list, save_dir, cookie_str=None):
+        """下载 QQ/网易大附件（含跳转页解析），同步等待。返回保存路径或 None。"""
+        if cookie_str:
+            self.cloud_downloader.session.headers.update({"Cookie": cookie_str})
+        result = self.cloud_downloader.download(html_content_list, save_dir)
+        return result["path"] if result else None
+
+    def _process_cloud_jobs(self, drain: bool = False):
+        """
+        单次同步：把到期的云附件下载任务 (包括之前失败、到了重试时间的) 交给下载线程池就返回；
+        drain=True 时等它们跑完 (失败的留在队列里，下次到期再试)。
+        watch 模式下由后台线程处理，这里什么都不做
+        """
+        if self.cloud_queue.running:
+            return
+        if drain:
+            self.cloud_queue.drain()
+        else:
+            self.cloud_queue.run_due()
 
 
 
 if __name__ == "__main__":
-    email_config_path = Path(__file__).parent.parent / 'config' / 'email.yaml'
-    email_downloader = EmailDownloader(email_config_path)
-    # email_downloader._connect()
-    email_downloader.sync_emalls_to_db()
-    # print(email_downloader.sync_emalls_to_db())
+    parser = argparse.ArgumentParser(description="邮箱简历同步")
+    parser.add_argument("--watch", action="store_true", help="常驻监听 (IMAP IDLE)，新邮件到达后几秒内入库")
+    parser.add_argument("--config", type=Path, default=Path(__file__).parent.parent / 'config' / 'email.yaml')
+    parser.add_argument("--profile", default=None, help="采样 profiler 结果 (collapsed stack) 写到这个文件")
+    parser.add_argument("--drain-cloud", action="store_true", help="单次同步时等云附件下载完再退出")
+    args = parser.parse_args()
+
+    # 统计定期写到 storage/metrics/sync.json，后端 /metrics 一并输出
+    REGISTRY.publish("sync")
+    email_downloader = EmailDownloader(args.config)
+    with profiled(args.profile):
+        if args.watch:
+            signal.signal(signal.SIGTERM, lambda *_: email_downloader.stop())
+            try:
+                email_downloader.watch()
+            except KeyboardInterrupt:
+                print("👋 已停止监听")
+        else:
+            email_downloader.sync_emalls_to_db(drain_cloud=args.drain_cloud or None)
+    REGISTRY.flush()
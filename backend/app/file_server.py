@@ -0,0 +1,107 @@
+'''
+FilePath: /AutoEmail/backend/app/file_server.py
+Description: 简历/作品集文件下载接口
+             按 blob 名 (sha256 + 后缀) 取文件，流式返回；
+             支持 Range (视频拖动、PDF 分段加载) 和 ETag / If-None-Match (304)，
+             看板里直接嵌 URL，文件内容不再经过 Streamlit 进程；
+             已归档 (archive.py) 的文件从 pack 里 mmap 读取，同样支持 Range
+'''
+import re
+import mimetypes
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from backend.app.archive import ArchiveStore
+from backend.app.blob_store import BlobStore
+
+
+# blob 文件名：64 位 sha256 + 可选后缀，不接受任何路径字符
+BLOB_NAME_RE = re.compile(r'^([0-9a-f]{64})(\.[0-9a-z]{1,10})?$')
+# 只支持单个区间 (浏览器播放视频 / PDF.js 都只发单个区间)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+router = APIRouter(prefix="/files", tags=["files"])
+blob_store = BlobStore()
+archive = ArchiveStore()
+
+
+def _content_disposition(disposition_type: str, filename: str) -> str:
+    # 与 FileResponse 的写法一致：非 ASCII 文件名用 RFC 5987 的 filename*
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def _archived_response(entry, request: Request, media_type: str, headers: dict):
+    """已归档文件：按 Range 从 pack 里分块读取 (原样存放的条目直接切 mmap)"""
+    size = entry.size
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    start, end, status = 0, size, 200
+    m = RANGE_RE.match(request.headers.get("range", "").strip())
+    # If-Range 对不上 (客户端缓存的是别的内容) 时忽略 Range，返回整个文件
+    if m and m.group(1) + m.group(2) and request.headers.get("if-range", headers["ETag"]) == headers["ETag"]:
+        first, last = m.group(1), m.group(2)
+        if first:
+            start, end = int(first), min(int(last) + 1, size) if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+        if start >= end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    headers["Content-Length"] = str(end - start)
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(entry.iter_range(start, end), status_code=status,
+                             headers=headers, media_type=media_type)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 允许多个值以及弱校验前缀 W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@router.api_route("/{name}", methods=["GET", "HEAD"])
+def get_file(name: str, request: Request, download: bool = False, filename: str = None):
+    """
+    GET /files/<sha256>.<ext>
+      ?download=1&filename=张三_resume.pdf   作为附件下载并使用原始文件名
+    """
+    m = BLOB_NAME_RE.match(name)
+    if not m:
+        raise HTTPException(status_code=404, detail="file not found")
+    sha256, ext = m.group(1), m.group(2) or ""
+    path = blob_store.path_for(sha256, ext)
+    archived = None
+    if not path.is_file():
+        archived = archive.find(sha256)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="file not found")
+
+    # 内容寻址：sha256 就是强 ETag，同一个 URL 的内容永远不变
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(f"x{ext}")[0] or "application/octet-stream"
+    disposition_type = "attachment" if download else "inline"
+    if archived is not None:
+        headers["Content-Disposition"] = _content_disposition(disposition_type, filename or f"{sha256}{ext}")
+        return _archived_response(archived, request, media_type, headers)
+
+    # FileResponse 分块读盘，并处理 Range / If-Range (206 / 416)
+    return FileResponse(
+        path,
+        media_type=media_type,
+        headers=headers,
+        filename=filename or f"{sha256}{ext}",
+        content_disposition_type=disposition_type,
+    )
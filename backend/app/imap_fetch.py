@@ -0,0 +1,445 @@
+'''
+FilePath: /AutoEmail/backend/app/imap_fetch.py
+Description: BODYSTRUCTURE 优先的按需拉取：先取 ENVELOPE + BODYSTRUCTURE，
+             再只对白名单里的附件 part 发 BODY.PEEK[part]，大视频/压缩包不会被下载。
+             流式模式下附件和原始 .eml 按 BODY.PEEK[part]<offset.len> 分段拉取，
+             base64 / quoted-printable 边收边解码、边写进文件仓库，单封邮件的内存占用只和分段大小有关
+'''
+import re
+import time
+import base64
+import quopri
+import binascii
+import mimetypes
+from io import BytesIO
+from datetime import datetime
+from email.header import decode_header, make_header
+from email.utils import parsedate
+from pathlib import Path
+from urllib.parse import unquote
+
+from backend.app.metrics import timed
+
+
+# 白名单后缀没有命中时，按 MIME 类型兜底判断 (附件没有文件名的情况)
+ALLOWED_MIME_TYPES = {
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'image/jpeg',
+    'image/png',
+}
+
+_LITERAL_RE = re.compile(rb'\{(\d+)\}$')
+
+
+class _Literal(bytes):
+    """IMAP literal ({n}\\r\\n...) 的内容，和普通 quoted string 区分开"""
+
+
+class MailMessage:
+    """
+    与 imbox.Message 保持相同的属性名 (subject / sent_from / body / attachments ...)，
+    这样 EmailDownloader.sync_emalls_to_db 的处理逻辑可以两种拉取模式共用
+    """
+    def __init__(self):
+        self.subject = ""
+        self.sent_from = []
+        self.date = ""
+        self.parsed_date = None
+        self.message_id = ""
+        self.body = {"plain": [], "html": []}
+        self.attachments = []
+        self.raw_email = None    # 只有 save_raw_eml=True 时才会拉整封邮件
+        self.raw_ref = None      # 流式模式：原始邮件已直接写进仓库，这里是 BlobStore 引用
+
+    def __repr__(self):
+        return f"MailMessage(subject={self.subject!r}, attachments={len(self.attachments)})"
+
+
+# ----------------------------------------------------------------------
+# IMAP 响应解析
+# ----------------------------------------------------------------------
+
+def _segments(data):
+    """把 imaplib 返回的 [(prefix, literal), b')', ...] 拍平成 文本/literal 交替的序列"""
+    for item in data:
+        if isinstance(item, tuple):
+            yield item[0]
+            yield _Literal(item[1])
+        elif item is not None:
+            yield item
+
+
+def _tokens(data):
+    """
+    词法切分：'(' ')' 原样返回；atom 返回 str (NIL 返回 None)；
+    quoted string / literal 返回 bytes
+    """
+    for seg in _segments(data):
+        if isinstance(seg, _Literal):
+            yield bytes(seg)
+            continue
+        # {n} 只是 literal 的长度标记，literal 本身在下一个 segment 里
+        seg = _LITERAL_RE.sub(b'', seg.rstrip())
+        i, n = 0, len(seg)
+        while i < n:
+            c = seg[i:i + 1]
+            if c in b' \r\n':
+                i += 1
+            elif c in b'()':
+                yield c.decode()
+                i += 1
+            elif c == b'"':
+                i += 1
+                buf = bytearray()
+                while i < n and seg[i:i + 1] != b'"':
+                    if seg[i:i + 1] == b'\\':
+                        i += 1
+                    buf += seg[i:i + 1]
+                    i += 1
+                i += 1
+                yield bytes(buf)
+            else:
+                # atom，方括号内可以有空格和括号，比如 BODY[HEADER.FIELDS (MESSAGE-ID)]
+                start, depth = i, 0
+                while i < n:
+                    c = seg[i:i + 1]
+                    if c == b'[':
+                        depth += 1
+                    elif c == b']':
+                        depth -= 1
+                    elif depth == 0 and c in b' ()':
+                        break
+                    i += 1
+                atom = seg[start:i].decode(errors="replace")
+                yield None if atom.upper() == "NIL" else atom
+
+
+def _build(tokens):
+    """把 token 流组装成嵌套 list"""
+    out = []
+    for tok in tokens:
+        if tok == '(':
+            out.append(_build(tokens))
+        elif tok == ')':
+            return out
+        else:
+            out.append(tok)
+    return out
+
+
+def uid_set(uids) -> str:
+    """[1, 2, 3, 7, 9, 10] -> "1:3,7,9:10"；连续的 UID 合并成区间，命令长度不随邮件数线性增长"""
+    parts = []
+    run_start = prev = None
+    for uid in sorted(set(uids)):
+        if prev is not None and uid == prev + 1:
+            prev = uid
+            continue
+        if run_start is not None:
+            parts.append(str(run_start) if run_start == prev else f"{run_start}:{prev}")
+        run_start = prev = uid
+    if run_start is not None:
+        parts.append(str(run_start) if run_start == prev else f"{run_start}:{prev}")
+    return ",".join(parts)
+
+
+def parse_fetch_response(data) -> list:
+    """
+    解析 UID FETCH 的返回，每封邮件一个 dict：
+    {'UID': '12', 'BODYSTRUCTURE': [...], 'BODY[1]': b'...'}
+    """
+    items = _build(iter(list(_tokens(data))))
+    result = []
+    # 结构是: seq (k v k v ...) seq (k v ...) ...
+    for i in range(0, len(items) - 1, 2):
+        attrs = items[i + 1]
+        if not isinstance(attrs, list):
+            continue
+        msg = {}
+        for j in range(0, len(attrs) - 1, 2):
+            if not isinstance(attrs[j], str):
+                continue
+            key = attrs[j].upper()
+            # BODY[1]<0> 统一成 BODY[1]，与请求时的 BODY.PEEK[1] 对应
+            key = re.sub(r'<\d+>$', '', key)
+            msg[key] = attrs[j + 1]
+        result.append(msg)
+    return result
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return value
+
+
+def decode_mime_words(value) -> str:
+    """解码 =?utf-8?B?...?= 形式的头部"""
+    value = _text(value)
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+def _params(lst) -> dict:
+    if not isinstance(lst, list):
+        return {}
+    return {_text(lst[i]).lower(): _text(lst[i + 1]) for i in range(0, len(lst) - 1, 2)}
+
+
+def _filename_from_params(params: dict):
+    """支持 filename / filename* (RFC2231) / filename*0* 分段 / RFC2047 编码"""
+    if "filename" in params:
+        return decode_mime_words(params["filename"])
+    pieces = sorted(
+        (int(m.group(1) or 0), k)
+        for k in params
+        for m in [re.match(r'filename\*(\d+)?\*?$', k)] if m
+    )
+    if pieces:
+        raw = "".join(params[k] for _, k in pieces)
+        # RFC2231: charset'language'percent-encoded-value
+        if raw.count("'") >= 2:
+            charset, _, raw = raw.split("'", 2)
+            return unquote(raw, encoding=charset or "utf-8", errors="replace")
+        return unquote(raw)
+    return None
+
+
+def walk_bodystructure(bs, prefix: str = "") -> list:
+    """
+    展开 BODYSTRUCTURE，返回叶子 part 列表：
+    {'part': '2.1', 'mime': 'application/pdf', 'params': {...}, 'encoding': 'base64',
+     'size': 12345, 'disposition': 'attachment', 'filename': '简历.pdf'}
+    """
+    if bs and isinstance(bs[0], list):
+        # multipart: 开头连续的 list 是子 part，之后是 subtype 和扩展字段
+        parts = []
+        for idx, sub in enumerate(bs):
+            if not isinstance(sub, list):
+                break
+            parts += walk_bodystructure(sub, f"{prefix}.{idx + 1}" if prefix else str(idx + 1))
+        return parts
+
+    maintype, subtype = _text(bs[0]).lower(), _text(bs[1]).lower()
+    params = _params(bs[2])
+    encoding = _text(bs[5]).lower() if len(bs) > 5 else "7bit"
+    size = int(bs[6]) if len(bs) > 6 and bs[6] else 0
+
+    # 扩展字段的位置随类型不同：text 多一个行数，message/rfc822 多 envelope/body/行数
+    if maintype == "text":
+        ext_at = 8
+    elif maintype == "message" and subtype == "rfc822":
+        ext_at = 10
+    else:
+        ext_at = 7
+    disposition, disp_params = None, {}
+    if len(bs) > ext_at + 1 and isinstance(bs[ext_at + 1], list):
+        disposition = _text(bs[ext_at + 1][0]).lower()
+        disp_params = _params(bs[ext_at + 1][1] if len(bs[ext_at + 1]) > 1 else None)
+
+    filename = _filename_from_params(disp_params)
+    if not filename and "name" in params:
+        filename = decode_mime_words(params["name"])
+
+    return [{
+        "part": prefix or "1",
+        "mime": f"{maintype}/{subtype}",
+        "params": params,
+        "encoding": encoding,
+        "size": size,
+        "disposition": disposition,
+        "filename": filename,
+    }]
+
+
+def decode_part(data: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(data)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+
+def iter_decoded(chunks, encoding: str):
+    """
+    decode_part 的增量版本：输入是按任意位置切开的编码数据，逐块输出解码结果。
+    base64 只解码 4 的整数倍个字符，余下的留到下一块；
+    quoted-printable 只解码到最后一个换行，软换行 (=\r\n) 和 =XX 不会被切断
+    """
+    tail = b""
+    for chunk in chunks:
+        if encoding == "base64":
+            data = tail + chunk.translate(None, b" \t\r\n")
+            cut = len(data) - len(data) % 4
+            tail = data[cut:]
+            if cut:
+                yield binascii.a2b_base64(data[:cut])
+        elif encoding == "quoted-printable":
+            data = tail + chunk
+            cut = data.rfind(b"\n") + 1
+            tail = data[cut:]
+            if cut:
+                yield binascii.a2b_qp(data[:cut])
+        else:
+            yield chunk
+    if tail:
+        if encoding == "base64":
+            yield binascii.a2b_base64(tail + b"=" * (-len(tail) % 4))
+        else:
+            yield binascii.a2b_qp(tail)
+
+
+def _parse_envelope(env, msg: MailMessage):
+    # ENVELOPE: (date subject from sender reply-to to cc bcc in-reply-to message-id)
+    msg.date = _text(env[0])
+    msg.subject = decode_mime_words(env[1])
+    msg.sent_from = [
+        {"name": decode_mime_words(a[0]), "email": f"{_text(a[2])}@{_text(a[3])}"}
+        for a in (env[2] or []) if isinstance(a, list)
+    ]
+    msg.message_id = _text(env[9]).strip()
+    timetuple = parsedate(msg.date) if msg.date else None
+    if timetuple:
+        msg.parsed_date = datetime.fromtimestamp(time.mktime(timetuple))
+
+
+class StructureFetcher:
+    """
+    两步拉取：
+      1. 一批 UID 一次 UID FETCH (ENVELOPE BODYSTRUCTURE)
+      2. 每封邮件一次 UID FETCH，只带上正文与白名单附件的 BODY.PEEK[part]
+    传入 blob_store 时为流式模式：第 2 步只拉正文，附件与原始 .eml 分段拉取、直接写进仓库，
+    attachments 里的每一项带 "ref" (BlobStore 引用) 而不是 "content"
+    """
+    def __init__(self, connection, allowed_extensions, save_raw_eml: bool = False, batch_size: int = 50,
+                 blob_store=None, chunk_size: int = 1024 * 1024):
+        self.connection = connection
+        self.allowed_extensions = allowed_extensions
+        self.save_raw_eml = save_raw_eml
+        self.batch_size = batch_size
+        self.blob_store = blob_store
+        self.chunk_size = chunk_size
+
+    def is_wanted(self, part: dict) -> bool:
+        """附件是否需要下载：后缀白名单优先，没有文件名时看 MIME 类型"""
+        ext = Path(part["filename"] or "").suffix.lower()
+        if ext:
+            return ext in self.allowed_extensions
+        return part["mime"] in ALLOWED_MIME_TYPES
+
+    def _uid_fetch(self, uid_set: str, items: str) -> list:
+        with timed("imap_fetch") as t:
+            typ, data = self.connection.uid('fetch', uid_set, items)
+            t.bytes = sum(len(item[1]) for item in data if isinstance(item, tuple))
+        if typ != 'OK':
+            raise RuntimeError(f"UID FETCH {uid_set} {items} failed: {data}")
+        with timed("mime_parse"):
+            return parse_fetch_response(data)
+
+    def iter_section(self, uid: int, section: str):
+        """按 BODY.PEEK[section]<offset.chunk_size> 分段拉取，逐段 yield 编码后的原始数据"""
+        offset = 0
+        while True:
+            fetched = self._uid_fetch(str(uid), f"(UID BODY.PEEK[{section}]<{offset}.{self.chunk_size}>)")
+            data = (fetched[0].get(f"BODY[{section}]") if fetched else None) or b""
+            if isinstance(data, str):
+                data = data.encode()
+            if data:
+                yield data
+            if len(data) < self.chunk_size:
+                return
+            offset += len(data)
+
+    def _stream_to_store(self, uid: int, section: str, encoding: str, ext: str, stage: str) -> dict:
+        # 计时包含了其中分段拉取的网络时间 (imap_fetch 也会各自记一次)
+        with timed(stage) as t:
+            ref = self.blob_store.put_stream(iter_decoded(self.iter_section(uid, section), encoding), ext)
+            t.bytes = ref["size"]
+        return ref
+
+    def fetch_structures(self, uids: list) -> dict:
+        """返回 {uid: (envelope, bodystructure)}"""
+        result = {}
+        for item in self._uid_fetch(uid_set(uids), '(UID ENVELOPE BODYSTRUCTURE)'):
+            result[int(item["UID"])] = (item.get("ENVELOPE"), item.get("BODYSTRUCTURE"))
+        return result
+
+    def fetch_message(self, uid: int, envelope, bodystructure) -> MailMessage:
+        msg = MailMessage()
+        if envelope:
+            _parse_envelope(envelope, msg)
+
+        parts = walk_bodystructure(bodystructure) if bodystructure else []
+        texts, atts = [], []
+        for part in parts:
+            if part["mime"] in ("text/plain", "text/html") and part["disposition"] != "attachment" and not part["filename"]:
+                texts.append(part)
+            elif self.is_wanted(part):
+                atts.append(part)
+
+        streaming = self.blob_store is not None
+        items = [f"BODY.PEEK[{p['part']}]" for p in (texts if streaming else texts + atts)]
+        if self.save_raw_eml and not streaming:
+            items.append("BODY.PEEK[]")
+        if streaming:
+            self._stream_parts(uid, atts, msg)
+            atts = []
+        if not items:
+            return msg
+
+        fetched = self._uid_fetch(str(uid), "(UID " + " ".join(items) + ")")
+        data = fetched[0] if fetched else {}
+
+        with timed("mime_parse"):
+            for part in texts:
+                raw = decode_part(data.get(f"BODY[{part['part']}]") or b"", part["encoding"])
+                charset = part["params"].get("charset", "utf-8")
+                try:
+                    text = raw.decode(charset, errors="replace")
+                except LookupError:
+                    text = raw.decode("utf-8", errors="replace")
+                msg.body["plain" if part["mime"] == "text/plain" else "html"].append(text)
+
+            for part in atts:
+                raw = decode_part(data.get(f"BODY[{part['part']}]") or b"", part["encoding"])
+                msg.attachments.append({
+                    "content-type": part["mime"],
+                    "size": len(raw),
+                    "content": BytesIO(raw),
+                    "filename": part["filename"],
+                })
+
+        if self.save_raw_eml and not streaming:
+            msg.raw_email = data.get("BODY[]")
+        return msg
+
+    def _stream_parts(self, uid: int, atts: list, msg: MailMessage):
+        for part in atts:
+            # 没有文件名的附件 (按 MIME 类型命中白名单) 按类型补上后缀
+            ext = Path(part["filename"] or "").suffix.lower() or mimetypes.guess_extension(part["mime"]) or ""
+            ref = self._stream_to_store(uid, part["part"], part["encoding"], ext, "attachment_write")
+            msg.attachments.append({
+                "content-type": part["mime"],
+                "size": ref["size"],
+                "ref": ref,
+                "filename": part["filename"],
+            })
+        if self.save_raw_eml:
+            msg.raw_ref = self._stream_to_store(uid, "", "7bit", ".eml", "eml_write")
+
+    def iter_messages(self, uids: list):
+        """按批次拉取，逐封 yield (uid, MailMessage)"""
+        for i in range(0, len(uids), self.batch_size):
+            batch = uids[i:i + self.batch_size]
+            structures = self.fetch_structures(batch)
+            for uid in batch:
+                if uid not in structures:
+                    continue
+                envelope, bodystructure = structures[uid]
+                yield uid, self.fetch_message(uid, envelope, bodystructure)
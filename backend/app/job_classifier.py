@@ -0,0 +1,259 @@
+'''
+FilePath: /AutoEmail/backend/app/job_classifier.py
+Description: 从邮件主题/正文识别应聘岗位 (job_position)
+             岗位名 + 同义词一次性编译成 Aho-Corasick 自动机 (展开成 DFA，每个字符一次字典查找)，
+             一遍扫描找出全部命中；主题里的命中优先于正文，同一段文字里最长的命中优先
+             (例如 "商业化运营" 优先于 "运营")。纯英文的别名 (PM / iOS ...) 要求两侧不是字母数字
+
+用法 (在项目根目录):
+    python backend/app/job_classifier.py --backfill           # 给 job_position 为空的简历补上岗位
+    python backend/app/job_classifier.py --test "应聘Java开发-张三"
+'''
+import re
+import sys
+import time
+import argparse
+from email import policy
+from email.parser import BytesParser
+from pathlib import Path
+
+# 将项目根目录加入 sys.path，保证能找到 backend 包 (与 frontend/app/senddb.py 相同)
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.app.metrics import timed
+
+
+# 网页投递的岗位下拉框 (candidate.py) 与邮件识别共用这一份岗位列表
+JOB_OPTIONS = [
+    "产品经理", "产品运营", "商业化运营", "BD", "数据分析",
+    "算法工程师", "前端工程师", "后端工程师", "全栈工程师",
+    "移动端工程师", "测试工程师", "设计师", "市场与品牌", "人力与行政",
+]
+
+# 岗位 -> 同义词；可以在 email.yaml 的 job_synonyms 里追加 (key 不在 JOB_OPTIONS 里时视为新岗位)
+DEFAULT_SYNONYMS = {
+    "产品经理": ["产品策划", "PM", "product manager"],
+    "产品运营": ["用户运营", "内容运营", "社区运营", "活动运营"],
+    "商业化运营": ["商业化", "广告运营", "变现运营"],
+    "BD": ["商务拓展", "商务合作", "渠道拓展", "business development"],
+    "数据分析": ["数据分析师", "商业分析", "data analyst"],
+    "算法工程师": ["算法", "机器学习", "深度学习", "推荐算法", "NLP", "大模型"],
+    "前端工程师": ["前端", "web前端", "H5开发", "frontend", "front-end"],
+    "后端工程师": ["后端", "服务端", "后台开发", "Java开发", "Golang", "Go开发", "Python开发", "C++开发",
+                   "backend", "back-end"],
+    "全栈工程师": ["全栈", "full stack", "fullstack"],
+    "移动端工程师": ["移动端", "移动开发", "客户端开发", "iOS", "Android", "安卓", "Flutter"],
+    "测试工程师": ["测试开发", "测开", "软件测试", "自动化测试", "QA"],
+    "设计师": ["UI设计", "UX设计", "交互设计", "视觉设计", "平面设计", "UI/UX"],
+    "市场与品牌": ["市场营销", "市场推广", "品牌策划", "品牌营销", "公关", "marketing"],
+    "人力与行政": ["人力资源", "HRBP", "招聘专员", "人事专员", "行政专员", "行政"],
+}
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class JobClassifier:
+    """
+    构建一次，反复使用 (线程安全，扫描时只读)。
+        clf = JobClassifier(extra_synonyms)
+        clf.classify("应聘前端-张三", "您好 ...")          # -> "前端工程师"
+        clf.classify_many([(subject, body), ...])        # -> ["前端工程师", None, ...]
+    """
+    def __init__(self, synonyms: dict = None, jobs=JOB_OPTIONS, body_limit: int = 2000):
+        """
+        :param synonyms: 追加的 {岗位: [同义词, ...]}，与 DEFAULT_SYNONYMS 合并
+        :param body_limit: 正文只看前多少个字 (岗位一般写在开头，长正文后面多是项目经历，容易误判)
+        """
+        self.body_limit = body_limit
+        patterns = {}
+        merged = {job: [job, *DEFAULT_SYNONYMS.get(job, [])] for job in jobs}
+        for job, words in (synonyms or {}).items():
+            merged.setdefault(job, [job]).extend(words or [])
+        for job, words in merged.items():
+            for word in words:
+                # 同一个词只归一个岗位：先出现的 (岗位名本身、默认同义词) 优先
+                patterns.setdefault(word.strip().lower(), job)
+        patterns.pop("", None)
+        self.patterns = patterns
+        self._compile(patterns)
+
+    def _compile(self, patterns: dict):
+        # trie
+        goto, out = [{}], [[]]
+        for word, job in patterns.items():
+            node = 0
+            for ch in word:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = goto[node][ch] = len(goto)
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            # (长度, 岗位, 左侧要求词边界, 右侧要求词边界)
+            out[node].append((len(word), job, _is_word_char(word[0]), _is_word_char(word[-1])))
+
+        # BFS 求失败指针，同时把 goto 展开成完整的转移表：delta[node][ch] 直接给出下一个状态，
+        # 扫描时不再沿失败指针回退
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = list(goto[0].values())
+        for node in queue:
+            fail_node = fail[node]
+            # 失败指针上的输出 (以当前位置结尾的更短的词) 合并进来，长的在前
+            out[node] = sorted(out[node] + out[fail_node], reverse=True)
+            delta[node] = {**delta[fail_node], **goto[node]}
+            for ch, child in goto[node].items():
+                fail[child] = delta[fail_node].get(ch, 0)
+                queue.append(child)
+        self._delta = delta
+        self._out = [tuple(o) for o in out]
+        # 停在根状态时，用正则 (C 实现) 直接跳到下一个可能是某个词开头的字符，大段无关正文不再逐字走 Python 循环
+        self._start_re = re.compile("[" + "".join(re.escape(ch) for ch in sorted(goto[0])) + "]")
+
+    def _best_match(self, text: str):
+        """返回 (长度, -起始位置, 岗位)；最长的命中优先，一样长时取靠前的"""
+        if not text:
+            return None
+        text = text.lower()
+        delta, out, seek = self._delta, self._out, self._start_re.search
+        n = len(text)
+        node, best, i = 0, None, -1
+        while True:
+            i += 1
+            if node == 0:
+                m = seek(text, i)
+                if m is None:
+                    break
+                i = m.start()
+            elif i >= n:
+                break
+            node = delta[node].get(text[i], 0)
+            if not out[node]:
+                continue
+            for length, job, left, right in out[node]:
+                if best is not None and length <= best[0]:
+                    break
+                start = i - length + 1
+                if left and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if right and i + 1 < n and _is_word_char(text[i + 1]):
+                    continue
+                best = (length, -start, job)
+                break
+        return best
+
+    def classify(self, subject: str, body: str = "") -> str | None:
+        """主题命中就用主题的结果，否则看正文开头；都没有返回 None"""
+        best = self._best_match(subject)
+        if best is None and body:
+            best = self._best_match(body[:self.body_limit])
+        return best[2] if best else None
+
+    def classify_many(self, items) -> list:
+        """批量版本：items 为 (subject, body) 的可迭代对象，返回与之一一对应的岗位列表"""
+        with timed("job_classify"):
+            return [self.classify(subject, body) for subject, body in items]
+
+
+# ---------------------------------------------------------------------------
+# 回填：给 job_position 为空的历史简历补上岗位
+# ---------------------------------------------------------------------------
+
+def _eml_body(path: str) -> str:
+    """.eml 的纯文本正文 (没有时用 html)"""
+    try:
+        with open(path, "rb") as f:
+            msg = BytesParser(policy=policy.default).parse(f)
+        part = msg.get_body(preferencelist=("plain", "html"))
+        return part.get_content() if part else ""
+    except (OSError, LookupError, ValueError):
+        return ""
+
+
+def backfill_job_positions(classifier: JobClassifier, batch_size: int = 2000, read_eml: bool = True) -> dict:
+    """
+    按 id 分批扫描 job_position 为空的简历：
+      主题 = 原始 .eml 的文件名 (入库时就是邮件主题) + 附件文件名；
+      主题里识别不出来时 (read_eml=True) 再读 .eml 的正文。
+    每批识别出来的岗位用一条 executemany UPDATE 写回 (一个事务)
+    """
+    from sqlmodel import Session, select
+    from sqlalchemy import bindparam
+    from backend.app.database import Blob, Resume, ResumeBlob, ResumeInit
+
+    engine = ResumeInit().engine
+    update = (Resume.__table__.update()
+              .where(Resume.id == bindparam("rid"), Resume.job_position.is_(None))
+              .values(job_position=bindparam("job")))
+    stats = {"scanned": 0, "updated": 0, "from_body": 0}
+    last_id = 0
+    start = time.monotonic()
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Resume.id, Resume.uid)
+                .where(Resume.id > last_id, Resume.job_position.is_(None))
+                .order_by(Resume.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            files = session.exec(
+                select(ResumeBlob.resume_uid, ResumeBlob.role, ResumeBlob.filename, Blob.path)
+                .join(Blob, (Blob.sha256 == ResumeBlob.sha256) & (Blob.ext == ResumeBlob.ext))
+                .where(ResumeBlob.resume_uid.in_([r.uid for r in rows]))
+            ).all()
+
+        subjects, eml_paths = {}, {}
+        for f in files:
+            name = f.filename or ""
+            if f.role == "eml":
+                name = name.removesuffix(".eml")
+                eml_paths.setdefault(f.resume_uid, f.path)
+            subjects.setdefault(f.resume_uid, []).append(name)
+
+        jobs = classifier.classify_many((" ".join(subjects.get(r.uid, [])), "") for r in rows)
+        if read_eml:
+            retry = [i for i, job in enumerate(jobs) if job is None and rows[i].uid in eml_paths]
+            bodies = [("", _eml_body(eml_paths[rows[i].uid])) for i in retry]
+            for i, job in zip(retry, classifier.classify_many(bodies)):
+                if job:
+                    jobs[i] = job
+                    stats["from_body"] += 1
+
+        params = [{"rid": r.id, "job": job} for r, job in zip(rows, jobs) if job]
+        if params:
+            with timed("db_commit"), Session(engine) as session:
+                session.connection().execute(update, params)
+                session.commit()
+        stats["scanned"] += len(rows)
+        stats["updated"] += len(params)
+        last_id = rows[-1].id
+        print(f"🏷️ 已处理到 ID {last_id}：识别 {len(params)}/{len(rows)}")
+
+    stats["seconds"] = round(time.monotonic() - start, 2)
+    print(f"✅ 岗位回填完成：{stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    from backend.app.utils import load_config
+
+    parser = argparse.ArgumentParser(description="邮件简历岗位识别")
+    parser.add_argument("--backfill", action="store_true", help="给 job_position 为空的简历补上岗位")
+    parser.add_argument("--no-eml", action="store_true", help="回填时只看主题/文件名，不读 .eml 正文")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--config", type=Path, default=Path(__file__).parent.parent / 'config' / 'email.yaml',
+                        help="读取其中的 job_synonyms")
+    parser.add_argument("--test", default=None, help="识别一段文字并打印结果")
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config.exists() else {}
+    clf = JobClassifier((config or {}).get('job_synonyms'))
+    if args.test is not None:
+        print(clf.classify(args.test))
+    if args.backfill:
+        backfill_job_positions(clf, batch_size=args.batch_size, read_eml=not args.no_eml)
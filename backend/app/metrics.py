@@ -0,0 +1,338 @@
+'''
+FilePath: /AutoEmail/backend/app/metrics.py
+Description: 各阶段耗时/次数/字节数统计 (Prometheus 文本格式) 与采样 profiler
+             IMAP 连接、拉取、MIME 解析、.eml/附件写盘、云附件下载、岗位识别、数据库提交、看板查询、预览渲染
+             都用 timed(stage) 包起来，记到同一组直方图/计数器里。
+
+    with timed("db_commit"):
+        session.commit()
+
+    with timed("imap_fetch") as t:
+        data = ...
+        t.bytes = len(data)
+
+同步脚本、HR 看板和后端是不同的进程：非后端进程调用 publish("sync") 后，
+会定期把自己的统计写到 STORAGE_DIR/metrics/<source>.json，后端的 /metrics 把它们合并输出 (带 source 标签)
+'''
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+from backend.app.utils import STORAGE_DIR
+
+
+METRICS_DIR = STORAGE_DIR / "metrics"
+# 同步结束后是否写一份本次运行的 JSON 汇总 (STORAGE_DIR/metrics/runs/)
+METRICS_RUN_SUMMARY = os.getenv("AUTOEMAIL_METRICS_SUMMARY", "0") == "1"
+
+# 秒；覆盖本地磁盘 (毫秒级) 到云附件下载 (几十秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _fmt(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"type": "counter", "help": self.help, "labelnames": list(self.labelnames),
+                    "samples": [[list(k), v] for k, v in self._values.items()]}
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [各桶计数 (不累计，最后一格是 +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"type": "histogram", "help": self.help, "labelnames": list(self.labelnames),
+                    "buckets": list(self.buckets),
+                    "samples": [[list(k), [list(v[0]), v[1], v[2]]] for k, v in self._values.items()]}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._source = None
+        self._publish_interval = 10.0
+        self._last_publish = 0.0
+        # 多个线程的 timed 可能同时到点：同一时间只有一个线程写文件
+        self._flush_lock = threading.Lock()
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # ---- 跨进程：写文件 / 读文件 ----
+
+    def publish(self, source: str, interval: float = 10.0):
+        """之后每隔 interval 秒 (在 timed 结束时顺带检查) 把统计写到 METRICS_DIR/<source>.json"""
+        self._source = source
+        self._publish_interval = interval
+        self.flush()
+
+    def maybe_flush(self):
+        if not self._source or time.monotonic() - self._last_publish < self._publish_interval:
+            return
+        # 别的线程正在写就不等了，下次到点再写
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._last_publish >= self._publish_interval:
+                self._write()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        """调用方持有 _flush_lock"""
+        if not self._source:
+            return
+        self._last_publish = time.monotonic()
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = METRICS_DIR / f"{self._source}.json"
+        # 临时文件名带上 pid 和线程，两个写入者不会互相覆盖/删掉对方的临时文件
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"pid": os.getpid(), "updated_at": time.time(), "metrics": self.snapshot()}))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load_published() -> dict:
+        """{source: snapshot}，读其他进程写出的统计"""
+        result = {}
+        if not METRICS_DIR.is_dir():
+            return result
+        for path in METRICS_DIR.glob("*.json"):
+            try:
+                result[path.stem] = json.loads(path.read_text())["metrics"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return result
+
+    # ---- Prometheus 文本格式 ----
+
+    def render(self, source: str = "api", include_published: bool = True) -> str:
+        sources = {source: self.snapshot()}
+        if include_published:
+            for name, snap in self.load_published().items():
+                sources.setdefault(name, snap)
+
+        families = {}
+        for src, snap in sources.items():
+            for name, family in snap.items():
+                families.setdefault(name, []).append((src, family))
+
+        lines = []
+        for name in sorted(families):
+            first = families[name][0][1]
+            lines.append(f"# HELP {name} {first['help']}")
+            lines.append(f"# TYPE {name} {first['type']}")
+            for src, family in families[name]:
+                for key, value in family["samples"]:
+                    labels = {"source": src, **dict(zip(family["labelnames"], key))}
+                    if family["type"] == "counter":
+                        lines.append(f"{name}{_labels_text(labels)} {_fmt(value)}")
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, c in zip(list(family["buckets"]) + [float("inf")], counts):
+                        cumulative += c
+                        lines.append(f"{name}_bucket{_labels_text({**labels, 'le': _fmt(bound)})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels_text(labels)} {_fmt(float(total))}")
+                    lines.append(f"{name}_count{_labels_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("autoemail_stage_seconds", "各阶段耗时 (秒)", ["stage"])
+STAGE_TOTAL = REGISTRY.counter("autoemail_stage_total", "各阶段执行次数", ["stage", "result"])
+STAGE_BYTES = REGISTRY.counter("autoemail_stage_bytes_total", "各阶段处理的字节数", ["stage"])
+
+
+class _Timing:
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+@contextmanager
+def timed(stage: str):
+    """记录一次阶段耗时；出异常时记为 result="error" 并继续抛出 (统计本身出错不抛)。可以设置 t.bytes 记录字节数"""
+    timing = _Timing()
+    result = "ok"
+    start = time.perf_counter()
+    try:
+        yield timing
+    except BaseException:
+        result = "error"
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_TOTAL.inc(stage=stage, result=result)
+        if timing.bytes:
+            STAGE_BYTES.inc(timing.bytes, stage=stage)
+        # 统计写不出去 (磁盘满、目录被删……) 不能影响被计时的业务代码，也不能盖掉它抛出的异常
+        try:
+            REGISTRY.maybe_flush()
+        except Exception as exc:
+            print(f"⚠️ 统计写入失败: {type(exc).__name__}: {exc}")
+
+
+def stage_totals() -> dict:
+    """{stage: {"count", "errors", "seconds", "bytes"}}，用于单次运行的汇总 (前后两次相减)"""
+    totals = {}
+    for (stage,), (_, seconds, count) in STAGE_SECONDS.snapshot()["samples"]:
+        totals.setdefault(stage, {"count": 0, "errors": 0, "seconds": 0.0, "bytes": 0})
+        totals[stage]["count"], totals[stage]["seconds"] = count, seconds
+    for (stage, result), value in STAGE_TOTAL.snapshot()["samples"]:
+        if result == "error":
+            totals.setdefault(stage, {"count": 0, "errors": 0, "seconds": 0.0, "bytes": 0})["errors"] = value
+    for (stage,), value in STAGE_BYTES.snapshot()["samples"]:
+        totals.setdefault(stage, {"count": 0, "errors": 0, "seconds": 0.0, "bytes": 0})["bytes"] = value
+    return totals
+
+
+def stage_delta(before: dict) -> dict:
+    """before (stage_totals() 的返回值) 之后各阶段新增的次数/耗时/字节数"""
+    stages = {}
+    for stage, cur in stage_totals().items():
+        prev = before.get(stage, {})
+        count = cur["count"] - prev.get("count", 0)
+        if count <= 0:
+            continue
+        seconds = cur["seconds"] - prev.get("seconds", 0.0)
+        stages[stage] = {
+            "count": count,
+            "errors": cur["errors"] - prev.get("errors", 0),
+            "seconds": round(seconds, 4),
+            "avg_ms": round(seconds / count * 1000, 2),
+            "bytes": cur["bytes"] - prev.get("bytes", 0),
+        }
+    return stages
+
+
+def write_run_summary(name: str, before: dict, extra: dict = None):
+    """把 stage_delta(before) 连同 extra 写成一份 JSON：STORAGE_DIR/metrics/runs/<name>_<时间>.json"""
+    summary = {"run": name, "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"), **(extra or {}),
+               "stages": stage_delta(before)}
+    run_dir = METRICS_DIR / "runs"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    path = run_dir / f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    path.write_text(json.dumps(summary, ensure_ascii=False, indent=2))
+    return path
+
+
+class SamplingProfiler:
+    """
+    采样 profiler：后台线程每 interval 秒抓一次各线程的调用栈，
+    按 "a;b;c 次数" (collapsed stack，可直接喂给 flamegraph.pl / speedscope) 汇总
+    """
+    def __init__(self, interval: float = 0.005, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me or (self.thread_ids and tid not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextmanager
+def profiled(path=None, interval: float = 0.005):
+    """path 为空时什么都不做；否则在 with 结束时把采样结果写到 path"""
+    if not path:
+        yield None
+        return
+    profiler = SamplingProfiler(interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        with open(path, "w") as f:
+            f.write(profiler.collapsed())
+        print(f"🔬 采样 {profiler.samples} 次，结果已写入 {path}")
@@ -0,0 +1,179 @@
+'''
+FilePath: /AutoEmail/backend/app/rate_limit.py
+Description: 候选人提交限流 (令牌桶)
+             按客户端 IP 和手机号分别限流，整个进程共用；
+             可选存到 SQLite，多个 Streamlit 实例共享同一份计数
+
+令牌桶：容量 burst，每秒补充 rate 个，每次提交消耗 1 个。
+补充按时间连续计算，相当于一个平滑的滑动窗口：短时间内最多 burst 次，长期平均不超过 rate。
+每次检查只读写一个 key，O(1)；长时间没有请求的 key 会被清理
+'''
+import os
+import time
+import sqlite3
+import ipaddress
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+
+# "容量,每多少秒补充 1 次"，例如 "5,60"：同一 IP 可以连续提交 5 次，之后每分钟 1 次
+RATE_LIMIT_IP = os.getenv("AUTOEMAIL_RATE_LIMIT_IP", "5,60")
+RATE_LIMIT_PHONE = os.getenv("AUTOEMAIL_RATE_LIMIT_PHONE", "2,600")
+# memory: 进程内；sqlite: 存在数据库里，多进程共享
+RATE_LIMIT_BACKEND = os.getenv("AUTOEMAIL_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = 100_000
+# 反向代理的地址 (逗号分隔，可写网段，例如 "127.0.0.1,10.0.0.0/8")。
+# 只有直接连过来的是这些代理时才看 X-Forwarded-For，否则这个头可以被客户端随便伪造
+TRUSTED_PROXIES = os.getenv("AUTOEMAIL_TRUSTED_PROXIES", "")
+
+
+def parse_networks(spec: str) -> list:
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+def _is_trusted(host: str, networks) -> bool:
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(addr in net for net in networks)
+
+
+_TRUSTED_NETWORKS = parse_networks(TRUSTED_PROXIES)
+
+
+def resolve_client_ip(peer: str, forwarded_for: str = None, trusted_proxies: str = None):
+    """
+    限流用的客户端 IP。peer 是直接连过来的地址；它是可信代理时，
+    从 X-Forwarded-For 右边往左跳过可信代理，取第一个不是代理的地址 (最左边的值客户端能伪造)
+    """
+    networks = _TRUSTED_NETWORKS if trusted_proxies is None else parse_networks(trusted_proxies)
+    if not forwarded_for or not peer or not _is_trusted(peer, networks):
+        return peer
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+
+def parse_rule(rule: str):
+    """'5,60' -> (burst=5, rate=1/60 每秒)"""
+    burst, period = rule.split(",")
+    return float(burst), 1.0 / float(period)
+
+
+class TokenBucket:
+    """
+    进程内令牌桶。key -> (剩余令牌, 上次更新时间)，按最近使用排序 (OrderedDict)：
+      - 检查时把 key 移到末尾，O(1)
+      - 开头的 key 最久没用；闲置到令牌已回满的 key 和普通 key 没有区别，直接删掉
+    """
+    def __init__(self, burst: float, rate: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        # 闲置这么久之后令牌一定是满的，记录可以丢掉
+        self.idle_ttl = burst / rate
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle_ttl and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def acquire(self, key: str, cost: float = 1.0):
+        """
+        :return: (是否放行, 需要等待的秒数)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / self.rate
+
+
+class SqliteTokenBucket:
+    """
+    存在 SQLite 里的令牌桶 (rate_limit 表，见 database.RateLimitBucket)，多个进程共享。
+    一条 INSERT ... ON CONFLICT DO UPDATE ... WHERE ... RETURNING 完成 读-补充-扣减，
+    令牌不够时 WHERE 不成立、不返回行，即拒绝；走主键，O(1)。需要 SQLite >= 3.35
+    """
+    ACQUIRE = text("""
+        INSERT INTO rate_limit (bucket, key, tokens, updated_at) VALUES (:bucket, :key, :burst - :cost, :now)
+        ON CONFLICT (bucket, key) DO UPDATE SET
+            tokens = min(:burst, tokens + (:now - updated_at) * :rate) - :cost,
+            updated_at = :now
+        WHERE min(:burst, tokens + (:now - updated_at) * :rate) >= :cost
+        RETURNING tokens""")
+    PEEK = text("SELECT min(:burst, tokens + (:now - updated_at) * :rate) FROM rate_limit "
+                "WHERE bucket = :bucket AND key = :key")
+    # 每这么多次检查顺带清理一次闲置的 key
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, engine, bucket: str, burst: float, rate: float):
+        self.engine = engine
+        self.bucket = bucket
+        self.burst = burst
+        self.rate = rate
+        self.idle_ttl = burst / rate
+        self._calls = 0
+
+    def acquire(self, key: str, cost: float = 1.0):
+        # 用墙钟时间：多个进程之间要能比较
+        params = {"bucket": self.bucket, "key": key, "burst": self.burst, "rate": self.rate,
+                  "cost": cost, "now": time.time()}
+        self._calls += 1
+        with self.engine.begin() as conn:
+            row = conn.execute(self.ACQUIRE, params).first()
+            if row is not None:
+                allowed, wait = True, 0.0
+            else:
+                tokens = conn.execute(self.PEEK, params).scalar() or 0.0
+                allowed, wait = False, (cost - tokens) / self.rate
+            if self._calls % self.CLEANUP_EVERY == 0:
+                conn.execute(text("DELETE FROM rate_limit WHERE bucket = :bucket AND updated_at < :before"),
+                             {"bucket": self.bucket, "before": params["now"] - self.idle_ttl})
+        return allowed, wait
+
+
+class SubmitRateLimiter:
+    """候选人提交：IP 和手机号各一个令牌桶，两者都放行才算通过"""
+    def __init__(self, ip_rule: str = RATE_LIMIT_IP, phone_rule: str = RATE_LIMIT_PHONE,
+                 backend: str = RATE_LIMIT_BACKEND, engine=None):
+        if backend == "sqlite" and sqlite3.sqlite_version_info < (3, 35, 0):
+            print(f"⚠️ SQLite {sqlite3.sqlite_version} 不支持 RETURNING，限流改用进程内存储")
+            backend = "memory"
+
+        def bucket(name, rule):
+            burst, rate = parse_rule(rule)
+            if backend == "sqlite":
+                from backend.app.database import get_engine
+                return SqliteTokenBucket(engine or get_engine(), name, burst, rate)
+            return TokenBucket(burst, rate)
+
+        self.ip_bucket = bucket("submit_ip", ip_rule)
+        self.phone_bucket = bucket("submit_phone", phone_rule)
+
+    def check(self, ip: str = None, phone: str = None):
+        """
+        :return: 放行时为 None，否则为需要等待的秒数
+        注意：先检查 IP 再检查手机号，被 IP 拒绝的请求不消耗手机号的令牌
+        """
+        for bucket, key in ((self.ip_bucket, ip), (self.phone_bucket, phone)):
+            if not key:
+                continue
+            allowed, wait = bucket.acquire(key)
+            if not allowed:
+                return wait
+        return None
@@ -0,0 +1,278 @@
+'''
+FilePath: /AutoEmail/backend/app/text_extract.py
+Description: 简历附件 (PDF / DOCX) 纯文本抽取
+             常驻进程池 (forkserver / spawn，不从多线程的 Web 进程里 fork) 并行、每个文件单独超时、
+             结果按文件 hash 存进 resumetext 表，
+             并写入全文索引；支持带断点的全量回填
+
+             邮件同步每轮结束时调用 run_new，候选人提交 / 云附件下载完成后调用 extract_resumes
+
+用法 (在项目根目录):
+    python backend/app/text_extract.py              # 处理新入库 (status=new) 的简历
+    python backend/app/text_extract.py --backfill   # 回填所有历史简历，可中断后继续
+'''
+import os
+import re
+import sys
+import json
+import time
+import signal
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from pathlib import Path
+
+import mammoth
+from pypdf import PdfReader
+
+# 将项目根目录加入 sys.path，保证能找到 backend 包 (与 frontend/app/senddb.py 相同)
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.app.database import ResumeInit, Resume, Session, select, split_paths
+from backend.app.utils import STORAGE_DIR
+
+
+CHECKPOINT_PATH = STORAGE_DIR / "database" / "extract_checkpoint.json"
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# uvicorn / Streamlit 进程里有很多线程，直接 fork 可能把别的线程持有的锁一起复制过去；
+# 子进程从 forkserver (没有的平台用 spawn) 启动
+MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class ExtractTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise ExtractTimeout()
+
+
+def extract_file(path: str, timeout: int):
+    """
+    在子进程里执行：抽取单个文件的纯文本。
+    返回 (status, text, error, duration_ms)
+    """
+    start = time.monotonic()
+    ext = Path(path).suffix.lower()
+    # 子进程内用 SIGALRM 做超时，卡死的解析会被打断，进程本身可以继续复用
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(timeout)
+    try:
+        if ext == ".docx":
+            with open(path, "rb") as f:
+                text = mammoth.extract_raw_text(f).value
+        elif ext == ".pdf":
+            reader = PdfReader(path)
+            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        elif ext == ".txt":
+            text = Path(path).read_text(encoding="utf-8", errors="replace")
+        else:
+            return "unsupported", None, f"不支持的格式 {ext}", 0
+        return "ok", text, None, int((time.monotonic() - start) * 1000)
+    except ExtractTimeout:
+        return "timeout", None, f"超过 {timeout}s", int((time.monotonic() - start) * 1000)
+    except Exception as exc:
+        return "error", None, f"{type(exc).__name__}: {exc}", int((time.monotonic() - start) * 1000)
+    finally:
+        signal.alarm(0)
+
+
+def file_hash(path: str) -> str:
+    """仓库 (blob_store) 中的文件名就是 sha256，直接用；其他文件现算"""
+    stem = Path(path).stem
+    if SHA256_RE.match(stem):
+        return stem
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class TextExtractor:
+    def __init__(self, workers: int = None, timeout: int = 60, batch_size: int = 200,
+                 checkpoint_path: Path = CHECKPOINT_PATH):
+        self.workers = workers or os.cpu_count() or 2
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.checkpoint_path = Path(checkpoint_path)
+        self.resume_init = ResumeInit()
+        # 进程池第一次抽取时才创建，之后一直复用 (每次提交都新建进程池太慢)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context(MP_START_METHOD))
+            return self._executor
+
+    def _reset_executor(self):
+        """有子进程卡死 (收不到 SIGALRM) 时整个池子丢掉，下次抽取重新创建"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # ProcessPoolExecutor 没有公开的杀子进程接口 (3.14 才有 terminate_workers)
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """关闭进程池 (命令行跑完时调用；常驻进程退出时由 concurrent.futures 自己回收)"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    # ------------------------------------------------------------------
+    # 断点
+    # ------------------------------------------------------------------
+    def _load_checkpoint(self) -> dict:
+        if self.checkpoint_path.exists():
+            return json.loads(self.checkpoint_path.read_text())
+        return {}
+
+    def _save_checkpoint(self, checkpoint: dict):
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(checkpoint))
+        os.replace(tmp, self.checkpoint_path)
+
+    # ------------------------------------------------------------------
+    # 抽取
+    # ------------------------------------------------------------------
+    def extract_paths(self, paths_by_hash: dict) -> list:
+        """
+        并行抽取 {file_hash: path}，返回可直接写入 resumetext 表的结果列表
+        """
+        if not paths_by_hash:
+            return []
+        executor = self._get_executor()
+        pending = {h: executor.submit(extract_file, p, self.timeout) for h, p in paths_by_hash.items()}
+        # 子进程自己有 SIGALRM 超时；这里再留一道兜底，防止解析卡在 C 扩展里收不到信号
+        deadline = time.monotonic() + self.timeout * (len(pending) / self.workers + 2)
+        results, hung = [], False
+        for h, future in pending.items():
+            try:
+                status, text, error, duration_ms = future.result(timeout=max(1, deadline - time.monotonic()))
+            except FutureTimeout:
+                status, text, error, duration_ms = "timeout", None, "子进程无响应", None
+                hung = True
+            except Exception as exc:
+                # 子进程崩溃 (BrokenProcessPool) 等
+                status, text, error, duration_ms = "error", None, f"{type(exc).__name__}: {exc}", None
+                hung = True
+            results.append({"file_hash": h, "status": status, "text": text, "error": error,
+                            "duration_ms": duration_ms, "extracted_at": datetime.now()})
+        if hung:
+            self._reset_executor()
+        return results
+
+    def _process_rows(self, rows) -> dict:
+        """抽取一批简历的附件，写入结果表与全文索引，返回各状态计数"""
+        hashes_by_resume, paths_by_hash = {}, {}
+        for row in rows:
+            hashes = []
+            for path in split_paths(row.attachment_path):
+                if not os.path.exists(path):
+                    continue
+                h = file_hash(path)
+                hashes.append(h)
+                paths_by_hash.setdefault(h, path)
+            hashes_by_resume[row.id] = hashes
+
+        # 同一份文件只抽一次：已有成功结果的跳过
+        done = self.resume_init.get_resume_texts(paths_by_hash)
+        todo = {h: p for h, p in paths_by_hash.items() if h not in done or done[h].status != "ok"}
+        results = self.extract_paths(todo)
+        self.resume_init.save_resume_texts(results)
+
+        texts = {h: r.text for h, r in done.items() if r.status == "ok"}
+        texts.update({r["file_hash"]: r["text"] for r in results if r["status"] == "ok"})
+        self.resume_init.update_search_content({
+            rid: "\n".join(texts[h] for h in hashes if texts.get(h))
+            for rid, hashes in hashes_by_resume.items()
+            if any(texts.get(h) for h in hashes)
+        })
+
+        stats = {}
+        for r in results:
+            stats[r["status"]] = stats.get(r["status"], 0) + 1
+        return stats
+
+    def _run(self, checkpoint_key: str, only_new: bool) -> dict:
+        checkpoint = self._load_checkpoint()
+        last_id = checkpoint.get(checkpoint_key, 0)
+        total = {}
+        while True:
+            statement = select(Resume).where(Resume.id > last_id, Resume.attachment_path.is_not(None))
+            if only_new:
+                statement = statement.where(Resume.status == "new")
+            statement = statement.order_by(Resume.id).limit(self.batch_size)
+            with Session(self.resume_init.engine) as session:
+                rows = session.exec(statement).all()
+            if not rows:
+                break
+
+            stats = self._process_rows(rows)
+            for k, v in stats.items():
+                total[k] = total.get(k, 0) + v
+            last_id = rows[-1].id
+            # 每批结束记录断点，中断后从这里继续
+            checkpoint[checkpoint_key] = last_id
+            self._save_checkpoint(checkpoint)
+            print(f"📄 已处理到 ID {last_id}：{stats}")
+
+        print(f"✅ 文本抽取完成：{total}")
+        return total
+
+    def extract_resumes(self, uids) -> dict:
+        """
+        只处理指定的简历 (刚提交的、刚挂上云附件的)，已抽取过的文件不会重复抽取。
+        在提交/下载流程之后调用，出错只打印，不影响调用方
+        """
+        try:
+            with Session(self.resume_init.engine) as session:
+                rows = session.exec(select(Resume).where(
+                    Resume.uid.in_(list(uids)), Resume.attachment_path.is_not(None))).all()
+            return self._process_rows(rows) if rows else {}
+        except Exception as exc:
+            print(f"⚠️ 文本抽取失败 {list(uids)}: {type(exc).__name__}: {exc}")
+            return {}
+
+    def run_new(self) -> dict:
+        """处理新入库 (status=new) 的简历"""
+        return self._run("new_last_id", only_new=True)
+
+    def backfill(self, reset: bool = False) -> dict:
+        """回填全部历史简历；reset=True 时从头开始"""
+        if reset:
+            checkpoint = self._load_checkpoint()
+            checkpoint.pop("backfill_last_id", None)
+            self._save_checkpoint(checkpoint)
+        return self._run("backfill_last_id", only_new=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="简历附件文本抽取")
+    parser.add_argument("--backfill", action="store_true", help="回填全部历史简历 (带断点)")
+    parser.add_argument("--reset", action="store_true", help="回填时忽略断点，从头开始")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--timeout", type=int, default=60, help="单个文件超时秒数")
+    args = parser.parse_args()
+
+    extractor = TextExtractor(workers=args.workers, timeout=args.timeout)
+    try:
+        if args.backfill:
+            extractor.backfill(reset=args.reset)
+        else:
+            extractor.run_new()
+    finally:
+        extractor.close()
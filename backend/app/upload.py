@@ -0,0 +1,310 @@
+'''
+FilePath: /AutoEmail/backend/app/upload.py
+Description: 大文件分块上传 (候选人作品集/视频)
+             固定大小分块、每块 sha256 校验、断线后查询已收到的块继续传，
+             服务端边收边写盘，单个请求的内存占用只和块大小有关；
+             全部收齐后移入 blob_store，候选人表单只提交 upload_id。
+             接口不需要登录，所以按客户端 IP 限制：创建频率 (令牌桶)、同时未完成的上传个数和总字节数，
+             全局未完成的上传个数也有上限；长时间没有新块的上传会被清理
+
+协议:
+    POST /uploads                          {"filename", "size", "sha256"?} -> {"upload_id", "chunk_size", "total_chunks"}
+    GET  /uploads/{upload_id}              -> {"received": [块序号...], "complete": bool}
+    PUT  /uploads/{upload_id}/chunks/{i}   请求体为第 i 块原始字节，X-Chunk-Sha256 头为该块 sha256
+    POST /uploads/{upload_id}/complete     -> {"sha256", "ext", "size"}
+'''
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.blob_store import BlobStore
+from backend.app.rate_limit import TokenBucket, parse_rule
+from backend.app.utils import STORAGE_DIR
+
+
+UPLOAD_DIR = STORAGE_DIR / "uploads"
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("AUTOEMAIL_UPLOAD_CHUNK_MB", "4")) * 1024 * 1024
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_ALLOWED_EXT = {'.mp4', '.mov', '.pdf'}
+# 超过这个时间的上传目录会被清理 (已完成的只剩 meta.json)
+UPLOAD_EXPIRE_SEC = 24 * 3600
+# 未完成的上传这么久没有收到新块就清理
+UPLOAD_IDLE_SEC = int(os.getenv("AUTOEMAIL_UPLOAD_IDLE_SEC", "3600"))
+# 同一 IP 同时未完成的上传：个数、总字节数；全部 IP 加起来未完成的上传个数
+UPLOAD_MAX_OPEN_PER_CLIENT = int(os.getenv("AUTOEMAIL_UPLOAD_MAX_OPEN_PER_CLIENT", "3"))
+UPLOAD_MAX_BYTES_PER_CLIENT = int(os.getenv("AUTOEMAIL_UPLOAD_MAX_MB_PER_CLIENT", "400")) * 1024 * 1024
+UPLOAD_MAX_OPEN = int(os.getenv("AUTOEMAIL_UPLOAD_MAX_OPEN", "100"))
+# 同一 IP 创建上传的频率，格式同 rate_limit.py："容量,每多少秒补充 1 次"
+RATE_LIMIT_UPLOAD = os.getenv("AUTOEMAIL_RATE_LIMIT_UPLOAD", "10,60")
+# 写盘时攒够这么多字节再交给线程池写一次
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str, headers: dict = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+class UploadManager:
+    """
+    每个上传一个目录:
+        meta.json      文件名/大小/块大小/期望 sha256，完成后记录 blob 信息
+        data.part      各块按偏移直接写入 (不预分配，只占已收到的块)
+        chunks/<i>     第 i 块校验通过后才写的标记文件 (内容为块 sha256)
+    块之间互不依赖，可以并发、乱序、重复上传
+    """
+    def __init__(self, root: Path = UPLOAD_DIR, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 max_size: int = UPLOAD_MAX_SIZE, allowed_ext=UPLOAD_ALLOWED_EXT,
+                 max_open_per_client: int = UPLOAD_MAX_OPEN_PER_CLIENT,
+                 max_bytes_per_client: int = UPLOAD_MAX_BYTES_PER_CLIENT,
+                 max_open: int = UPLOAD_MAX_OPEN, rate_rule: str = RATE_LIMIT_UPLOAD):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.allowed_ext = allowed_ext
+        self.max_open_per_client = max_open_per_client
+        self.max_bytes_per_client = max_bytes_per_client
+        self.max_open = max_open
+        self.rate_limiter = TokenBucket(*parse_rule(rate_rule))
+        # 检查配额和创建目录要一起完成，否则并发的创建请求都能通过检查
+        self._create_lock = threading.Lock()
+        self.blob_store = BlobStore()
+
+    def _dir(self, upload_id: str) -> Path:
+        if not UPLOAD_ID_RE.match(upload_id or ""):
+            raise UploadError(404, "upload not found")
+        path = self.root / upload_id
+        if not (path / "meta.json").exists():
+            raise UploadError(404, "upload not found")
+        return path
+
+    def _meta(self, upload_dir: Path) -> dict:
+        return json.loads((upload_dir / "meta.json").read_text())
+
+    def _save_meta(self, upload_dir: Path, meta: dict):
+        tmp = upload_dir / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, ensure_ascii=False))
+        os.replace(tmp, upload_dir / "meta.json")
+
+    @staticmethod
+    def _total_chunks(meta: dict) -> int:
+        return max(1, -(-meta["size"] // meta["chunk_size"]))
+
+    def _chunk_len(self, meta: dict, index: int) -> int:
+        return min(meta["chunk_size"], meta["size"] - index * meta["chunk_size"])
+
+    def create(self, filename: str, size: int, sha256: str = None, client: str = None) -> dict:
+        """
+        :param client: 客户端 IP，按它计算配额；None 时只受全局上限约束
+        """
+        ext = Path(filename or "").suffix.lower()
+        if ext not in self.allowed_ext:
+            raise UploadError(400, f"不支持的文件类型 {ext}")
+        if size <= 0 or size > self.max_size:
+            raise UploadError(413, f"文件大小需在 0 ~ {self.max_size // 1024 // 1024}MB 之间")
+        if client:
+            allowed, wait = self.rate_limiter.acquire(client)
+            if not allowed:
+                raise UploadError(429, "创建上传过于频繁", {"Retry-After": str(int(wait) + 1)})
+
+        with self._create_lock:
+            open_uploads = self.cleanup()
+            if len(open_uploads) >= self.max_open:
+                raise UploadError(503, "同时进行的上传过多，请稍后再试", {"Retry-After": "60"})
+            if client:
+                mine = [meta for meta in open_uploads if meta.get("client") == client]
+                if len(mine) >= self.max_open_per_client:
+                    raise UploadError(429, f"同时最多进行 {self.max_open_per_client} 个上传")
+                if sum(meta["size"] for meta in mine) + size > self.max_bytes_per_client:
+                    raise UploadError(429, "未完成的上传总大小超过限制")
+
+            upload_id = uuid.uuid4().hex
+            upload_dir = self.root / upload_id
+            (upload_dir / "chunks").mkdir(parents=True)
+            (upload_dir / "data.part").touch()
+            meta = {"filename": filename, "ext": ext, "size": size, "chunk_size": self.chunk_size,
+                    "sha256": sha256, "client": client, "created": time.time(), "blob": None}
+            self._save_meta(upload_dir, meta)
+        return {"upload_id": upload_id, "chunk_size": self.chunk_size,
+                "total_chunks": self._total_chunks(meta)}
+
+    def status(self, upload_id: str) -> dict:
+        upload_dir = self._dir(upload_id)
+        meta = self._meta(upload_dir)
+        received = sorted(int(p.name) for p in (upload_dir / "chunks").iterdir()) if meta["blob"] is None else []
+        return {"upload_id": upload_id, "filename": meta["filename"], "size": meta["size"],
+                "chunk_size": meta["chunk_size"], "total_chunks": self._total_chunks(meta),
+                "received": received, "complete": meta["blob"] is not None}
+
+    def _open_chunk(self, upload_id: str, index: int):
+        """write_chunk 的阻塞部分 (读 meta、打开文件)：返回 (上传目录, meta, 文件)，已完成时文件为 None"""
+        upload_dir = self._dir(upload_id)
+        meta = self._meta(upload_dir)
+        if meta["blob"] is not None:
+            return upload_dir, meta, None
+        if not 0 <= index < self._total_chunks(meta):
+            raise UploadError(400, f"块序号越界: {index}")
+        f = open(upload_dir / "data.part", "r+b")
+        f.seek(index * meta["chunk_size"])
+        return upload_dir, meta, f
+
+    async def write_chunk(self, upload_id: str, index: int, pieces, chunk_sha256: str = None) -> dict:
+        """
+        :param pieces: 该块内容的异步迭代器 (网络上陆续到达的小片段)，边收边写盘边算 hash；
+                       写盘在线程池里进行，攒够 WRITE_BUFFER_SIZE 写一次，不阻塞事件循环
+        """
+        upload_dir, meta, f = await run_in_threadpool(self._open_chunk, upload_id, index)
+        if f is None:
+            return {"index": index, "complete": True}
+
+        expected = self._chunk_len(meta, index)
+        sha = hashlib.sha256()
+        written = 0
+        buffer = bytearray()
+        try:
+            async for piece in pieces:
+                written += len(piece)
+                if written > expected:
+                    raise UploadError(400, f"第 {index} 块超过 {expected} 字节")
+                buffer += piece
+                sha.update(piece)
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await run_in_threadpool(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(f.write, bytes(buffer))
+        finally:
+            await run_in_threadpool(f.close)
+        if written != expected:
+            raise UploadError(400, f"第 {index} 块应为 {expected} 字节，收到 {written}")
+        digest = sha.hexdigest()
+        if chunk_sha256 and chunk_sha256.lower() != digest:
+            raise UploadError(422, f"第 {index} 块校验失败")
+
+        await run_in_threadpool((upload_dir / "chunks" / str(index)).write_text, digest)
+        return {"index": index, "sha256": digest}
+
+    def complete(self, upload_id: str) -> dict:
+        """所有块到齐后移入 blob_store；重复调用返回同一结果"""
+        upload_dir = self._dir(upload_id)
+        meta = self._meta(upload_dir)
+        if meta["blob"] is not None:
+            return meta["blob"]
+
+        received = {p.name for p in (upload_dir / "chunks").iterdir()}
+        missing = [i for i in range(self._total_chunks(meta)) if str(i) not in received]
+        if missing:
+            raise UploadError(409, f"还缺 {len(missing)} 个块: {missing[:10]}")
+
+        sha = hashlib.sha256()
+        with open(upload_dir / "data.part", "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        sha256 = sha.hexdigest()
+        if meta["sha256"] and meta["sha256"].lower() != sha256:
+            raise UploadError(422, "整体 sha256 不一致")
+
+        ref = self.blob_store.put_path(upload_dir / "data.part", meta["ext"], sha256=sha256)
+        meta["blob"] = {"sha256": ref["sha256"], "ext": ref["ext"], "size": ref["size"], "pack": ref["pack"]}
+        self._save_meta(upload_dir, meta)
+        shutil.rmtree(upload_dir / "chunks", ignore_errors=True)
+        return meta["blob"]
+
+    def get_completed(self, upload_id: str):
+        """
+        给表单提交用：返回 blob_store 的引用 (与 BlobStore.put_* 相同格式，另带 filename)；
+        上传不存在或未完成时返回 None
+        """
+        try:
+            meta = self._meta(self._dir(upload_id))
+        except UploadError:
+            return None
+        blob = meta["blob"]
+        if blob is None:
+            return None
+        return {**blob, "path": str(self.blob_store.path_for(blob["sha256"], blob["ext"])),
+                "is_new": False, "filename": meta["filename"]}
+
+    def cleanup(self, max_age: int = UPLOAD_EXPIRE_SEC, idle: int = UPLOAD_IDLE_SEC) -> list:
+        """
+        删掉过期的上传目录 (包括已完成的：文件已经在 blob_store 里)，
+        以及 idle 秒没有收到新块的未完成上传；返回剩下的未完成上传的 meta
+        """
+        now = time.time()
+        open_uploads = []
+        for upload_dir in self.root.iterdir():
+            try:
+                meta = self._meta(upload_dir)
+                last_write = (upload_dir / "data.part").stat().st_mtime if meta["blob"] is None else None
+            except (OSError, ValueError):
+                continue
+            if now - meta["created"] > max_age or (
+                    last_write is not None and now - max(last_write, meta["created"]) > idle):
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            elif meta["blob"] is None:
+                open_uploads.append(meta)
+        return open_uploads
+
+
+# ----------------------------------------------------------------------
+# HTTP 接口
+# ----------------------------------------------------------------------
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+upload_manager = UploadManager()
+
+
+class CreateUpload(BaseModel):
+    filename: str
+    size: int
+    sha256: str | None = None
+
+
+def _call(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail, headers=exc.headers)
+
+
+@router.post("")
+def create_upload(body: CreateUpload, request: Request):
+    client = request.client.host if request.client else None
+    return _call(upload_manager.create, body.filename, body.size, body.sha256, client)
+
+
+@router.get("/{upload_id}")
+def get_upload(upload_id: str):
+    return _call(upload_manager.status, upload_id)
+
+
+@router.put("/{upload_id}/chunks/{index}")
+async def put_chunk(upload_id: str, index: int, request: Request):
+    """请求体按网络到达的片段逐段写盘，不会整块读进内存"""
+    try:
+        return await upload_manager.write_chunk(upload_id, index, request.stream(),
+                                                request.headers.get("x-chunk-sha256"))
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail, headers=exc.headers)
+
+
+@router.post("/{upload_id}/complete")
+def complete_upload(upload_id: str):
+    return _call(upload_manager.complete, upload_id)
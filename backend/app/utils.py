@@ -6,11 +6,15 @@ LastEditTime: 2025-12-10 16:16:35
 FilePath: /AutoEmail/backend/app/utils.py
 Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查看配置 进行设置: https://github.com/OBKoro1/koro1FileHeader/wiki/%E9%85%8D%E7%BD%AE
 '''
+import os
 import yaml
 from pathlib import Path
 
 config_path = Path(__file__).parent.parent / 'config' / 'email.yaml'
 
+# 数据库、文件仓库、上传临时文件等都放在这个目录下；压测/调试时可以用环境变量指到别处
+STORAGE_DIR = Path(os.getenv("AUTOEMAIL_STORAGE_DIR") or Path(__file__).parent.parent / "storage")
+
 
 
 def load_config(config_path):
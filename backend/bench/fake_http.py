@@ -0,0 +1,82 @@
+'''
+FilePath: /AutoEmail/backend/bench/fake_http.py
+Description: 本地的云附件服务器替身 (压测/调试用)
+             模拟 QQ/网易 超大附件：/ftn/jump?f=<id> 返回带下载链接的跳转页，
+             /ftn/download?f=<id> 返回文件内容 (支持 Range)；每个 id 内容不同，不会被仓库去重；
+             /ftn/login?f=<id> 模拟登录墙 (没有下载链接的 HTML)。requests 里记下每个请求的 (路径, Range)
+'''
+import re
+import threading
+import http.server
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: dict):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes(len(body))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        file_id = parse_qs(url.query).get("f", ["0"])[0]
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        if url.path == "/ftn/jump":
+            body = f'<html><a href="{self.server.base_url}/ftn/download?f={file_id}">下载</a></html>'.encode()
+            self._send(200, body, {"Content-Type": "text/html; charset=utf-8"})
+            return
+        if url.path == "/ftn/download":
+            data = self.server.file_bytes(file_id)
+            status, headers, start = 200, {}, 0
+            m = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            if m and int(m.group(1)) < len(data):
+                start, status = int(m.group(1)), 206
+                headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+            headers["Content-Type"] = "application/pdf"
+            headers["Content-Disposition"] = f'attachment; filename="cloud_resume_{file_id}.pdf"'
+            self._send(status, data[start:], headers)
+            return
+        if url.path == "/ftn/login":
+            self._send(200, "<html>请先登录</html>".encode(), {"Content-Type": "text/html; charset=utf-8"})
+            return
+        self._send(404, b"not found", {"Content-Type": "text/plain"})
+
+
+class FakeCloudServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, file_size: int = 1024 * 1024):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.file_size = file_size
+        self.bytes_sent = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._block = bytes(range(256)) * 256
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def link(self, file_id) -> str:
+        """写进邮件正文的跳转链接"""
+        return f"{self.base_url}/ftn/jump?f={file_id}"
+
+    def file_bytes(self, file_id: str) -> bytes:
+        head = f"%PDF-1.4 cloud {file_id}\n".encode()
+        body = self._block * (self.file_size // len(self._block) + 1)
+        return (head + body)[:max(self.file_size, len(head))]
+
+    def count_bytes(self, n: int):
+        with self._lock:
+            self.bytes_sent += n
+
+    def start(self) -> "FakeCloudServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
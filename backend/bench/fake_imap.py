@@ -0,0 +1,225 @@
+'''
+FilePath: /AutoEmail/backend/bench/fake_imap.py
+Description: 进程内的 IMAP 服务器替身 (压测/调试用)
+             只实现 EmailDownloader 用到的命令：LOGIN / ID / SELECT(EXAMINE) / UID SEARCH /
+             UID FETCH (ENVELOPE / BODYSTRUCTURE / BODY.PEEK[part]<off.len>) / NOOP / IDLE / LOGOUT，
+             不支持 SSL；统计发出的字节数，用来算吞吐
+'''
+import re
+import select
+import threading
+import socketserver
+from email.message import EmailMessage
+
+
+def _q(value) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def bodystructure(part: EmailMessage) -> str:
+    if part.is_multipart():
+        subs = "".join(bodystructure(p) for p in part.iter_parts())
+        return f'({subs} {_q(part.get_content_subtype())})'
+    maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+    params = []
+    for k, v in (part.get_params() or [])[1:]:
+        params += [_q(k), _q(v)]
+    ptxt = "(" + " ".join(params) + ")" if params else "NIL"
+    enc = part.get("Content-Transfer-Encoding", "7bit")
+    payload = part.get_payload()
+    size = len(payload.encode()) if isinstance(payload, str) else 0
+    disp = "NIL"
+    if part.get_content_disposition():
+        fn = part.get_filename()
+        disp = f'({_q(part.get_content_disposition())} ' + (f'("filename" {_q(fn)})' if fn else "NIL") + ")"
+    base = f'({_q(maintype)} {_q(subtype)} {ptxt} NIL NIL {_q(enc)} {size}'
+    if maintype == "text":
+        base += f" {payload.count(chr(10)) if isinstance(payload, str) else 0}"
+    return base + f" NIL {disp} NIL)"
+
+
+def envelope(msg: EmailMessage) -> str:
+    name, _, addr = str(msg["From"]).rpartition(" <")
+    user, _, host = addr.rstrip(">").partition("@")
+    sender = f'(({_q(name or None)} NIL {_q(user)} {_q(host)}))'
+    return (f'({_q(msg["Date"])} {_q(msg["Subject"])} {sender} NIL NIL NIL NIL NIL NIL '
+            f'{_q(msg["Message-ID"])})')
+
+
+class StoredMessage:
+    """一封邮件：解析后的 EmailMessage + 原始字节 (只序列化一次)"""
+    def __init__(self, msg: EmailMessage):
+        self.msg = msg
+        self.raw = msg.as_bytes()
+        self.structure = bodystructure(msg).encode()
+        self.envelope = envelope(msg).encode()
+        # 分段拉取 (BODY.PEEK[2]<off.len>) 会反复请求同一个 part，序列化结果缓存起来
+        self._sections = {}
+
+    def section(self, spec: str) -> bytes:
+        if spec not in self._sections:
+            self._sections[spec] = self._section(spec)
+        return self._sections[spec]
+
+    def _section(self, spec: str) -> bytes:
+        if not spec:
+            return self.raw
+        if spec == "HEADER":
+            return self.raw.split(b"\n\n", 1)[0] + b"\n\n"
+        if spec.startswith("HEADER.FIELDS"):
+            return b"Message-ID: " + str(self.msg["Message-ID"]).encode() + b"\r\n\r\n"
+        part = self.msg
+        for n in spec.split("."):
+            part = list(part.iter_parts())[int(n) - 1]
+        data = part.as_bytes()
+        return data.split(b"\n\n", 1)[1] if b"\n\n" in data else data
+
+
+SECTION_RE = re.compile(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.wfile.write(data)
+        self.server.count_bytes(len(data))
+
+    def handle(self):
+        srv = self.server
+        self.send("* OK fake imap ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+            cmd, _, args = rest.partition(" ")
+            cmd = cmd.upper()
+            srv.log.append(rest)
+            if cmd == "CAPABILITY":
+                caps = "IMAP4rev1 ID" + (" IDLE" if srv.idle else "")
+                self.send(f"* CAPABILITY {caps}\r\n{tag} OK done\r\n")
+            elif cmd == "LOGIN":
+                self.send(f"{tag} OK LOGIN\r\n")
+            elif cmd in ("SELECT", "EXAMINE"):
+                mode = "READ-ONLY" if cmd == "EXAMINE" else "READ-WRITE"
+                self.send(f"* {len(srv.msgs)} EXISTS\r\n* OK [UIDVALIDITY {srv.uidvalidity}]\r\n{tag} OK [{mode}] done\r\n")
+            elif cmd == "NOOP":
+                srv.deliver()
+                self.send(f"* {len(srv.msgs)} EXISTS\r\n{tag} OK done\r\n")
+            elif cmd in ("ID", "CLOSE"):
+                self.send(f"{tag} OK done\r\n")
+            elif cmd == "LOGOUT":
+                self.send(f"* BYE\r\n{tag} OK done\r\n")
+                return
+            elif cmd == "UID":
+                self._uid(tag, args)
+            elif cmd == "IDLE":
+                self._idle(tag)
+            else:
+                self.send(f"{tag} BAD unknown command\r\n")
+
+    def _uid(self, tag, args):
+        srv = self.server
+        sub, _, a = args.partition(" ")
+        if sub.upper() == "SEARCH":
+            uids = sorted(srv.msgs)
+            m = re.search(r"UID (\d+):\*", a)
+            if m:
+                # 与真实服务器一致：n 大于最大 UID 时仍返回最大的那个
+                uids = [u for u in uids if u >= int(m.group(1))] or uids[-1:]
+            self.send("* SEARCH " + " ".join(map(str, uids)) + f"\r\n{tag} OK done\r\n")
+            return
+        if sub.upper() != "FETCH":
+            self.send(f"{tag} BAD\r\n")
+            return
+
+        uid_set, _, items = a.partition(" ")
+        wanted = set()
+        for r in uid_set.split(","):
+            if ":" in r:
+                lo, hi = r.split(":")
+                hi = max(srv.msgs, default=0) if hi == "*" else int(hi)
+                wanted.update(u for u in srv.msgs if int(lo) <= u <= hi)
+            elif int(r) in srv.msgs:
+                wanted.add(int(r))
+        for u in sorted(wanted):
+            stored = srv.msgs[u]
+            out = [f"UID {u}".encode()]
+            if "FLAGS" in items:
+                out.append(b"FLAGS ()")
+            if "BODYSTRUCTURE" in items:
+                out.append(b"BODYSTRUCTURE " + stored.structure)
+            if "ENVELOPE" in items:
+                out.append(b"ENVELOPE " + stored.envelope)
+            for m in SECTION_RE.finditer(items):
+                data = stored.section(m.group(1))
+                key = f"BODY[{m.group(1)}]"
+                if m.group(2):
+                    offset, length = int(m.group(2)), int(m.group(3))
+                    data = data[offset:offset + length]
+                    key += f"<{offset}>"
+                out.append(key.encode() + b" {" + str(len(data)).encode() + b"}\r\n" + data)
+            self.send(f"* {u} FETCH (".encode() + b" ".join(out) + b")\r\n")
+        self.send(f"{tag} OK done\r\n")
+
+    def _idle(self, tag):
+        srv = self.server
+        self.send("+ idling\r\n")
+        while True:
+            if srv.new_mail.wait(0.1) and srv.deliver():
+                self.send(f"* {len(srv.msgs)} EXISTS\r\n")
+            if select.select([self.connection], [], [], 0)[0]:
+                self.rfile.readline()   # DONE
+                break
+        self.send(f"{tag} OK IDLE done\r\n")
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """
+    msgs: {uid: EmailMessage}。add_message() 投递新邮件并通知正在 IDLE 的连接；
+    bytes_sent 为所有连接发出的总字节数
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, msgs: dict = None, uidvalidity: int = 1, idle: bool = True):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.msgs = {uid: StoredMessage(m) for uid, m in (msgs or {}).items()}
+        self.uidvalidity = uidvalidity
+        self.idle = idle
+        self.log = []
+        self.bytes_sent = 0
+        self.new_mail = threading.Event()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def count_bytes(self, n: int):
+        with self._lock:
+            self.bytes_sent += n
+
+    def add_message(self, msg: EmailMessage) -> int:
+        with self._lock:
+            uid = max([*self.msgs, *(u for u, _ in self._pending)], default=0) + 1
+            self._pending.append((uid, StoredMessage(msg)))
+        self.new_mail.set()
+        return uid
+
+    def deliver(self) -> bool:
+        """把 add_message 投递的邮件放进邮箱，返回是否有新邮件"""
+        with self._lock:
+            self.new_mail.clear()
+            pending, self._pending = self._pending, []
+            for uid, stored in pending:
+                self.msgs[uid] = stored
+        return bool(pending)
+
+    def start(self) -> "FakeImapServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,265 @@
+'''
+FilePath: /AutoEmail/backend/bench/ingest_bench.py
+Description: 邮件入库端到端压测 (离线，不需要真实邮箱)
+             生成模拟邮箱 -> 进程内 IMAP 替身 + 本地云附件服务器 -> EmailDownloader.sync_emalls_to_db，
+             测量 同步吞吐 (封/s、MB/s)、批量入库速度、峰值内存、看板分页查询冷/热耗时，
+             结果输出为 JSON；可以和上一次的结果对比，性能回退超过阈值时退出码为 1
+
+    python backend/bench/ingest_bench.py --messages 500 --output bench.json
+    python backend/bench/ingest_bench.py --messages 500 --compare bench.json --tolerance 0.2
+
+所有数据写在临时目录 (AUTOEMAIL_STORAGE_DIR)，不会碰到 backend/storage
+
+看板指标原来是 fetch_all_resumes_as_df 的 dataframe.cold_s / warm_s；全量 DataFrame 快照删掉后
+看板改为分页查询，指标换成 dashboard.cold_s / warm_s / next_page_s。旧结果里没有这些指标，对比时跳过
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import contextlib
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+from pathlib import Path
+
+import yaml
+
+# 将项目根目录加入 sys.path，保证能找到 backend 包 (与 frontend/app/senddb.py 相同)
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "frontend" / "app"))
+
+from backend.bench.fake_http import FakeCloudServer
+from backend.bench.fake_imap import FakeImapServer
+from backend.bench.synth_mail import DEFAULT_MIX, make_mailbox
+
+
+# 对比时检查的指标：(路径, 越大越好?)
+REGRESSION_METRICS = [
+    ("sync.messages_per_s", True),
+    ("sync.mb_per_s", True),
+    ("db_insert.rows_per_s", True),
+    ("dashboard.cold_s", False),
+    ("dashboard.warm_s", False),
+    ("dashboard.next_page_s", False),
+    ("peak_rss_mb", False),
+]
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_sync(args, storage: Path) -> dict:
+    """整个邮箱同步一遍 (全量)，再空跑一次增量"""
+    from backend.app.email_download import EmailDownloader
+    from backend.app.metrics import stage_delta, stage_totals
+
+    cloud = FakeCloudServer(file_size=args.cloud_kb * 1024).start()
+    msgs = make_mailbox(args.messages, mix=args.mix, attachment_kb=args.attachment_kb,
+                        cloud_ratio=args.cloud_ratio, cloud_link=cloud.link, seed=args.seed,
+                        chinese_filenames=not args.ascii_filenames)
+    imap = FakeImapServer(msgs).start()
+    mailbox_mb = sum(len(m.raw) for m in imap.msgs.values()) / 1024 / 1024
+
+    config_path = storage / "email.yaml"
+    config = {
+        "imap_server": "127.0.0.1", "port": imap.port, "ssl": False,
+        "username": "hr@example.com", "imap_password": "bench",
+        "fetch_mode": args.fetch_mode, "fetch_workers": args.fetch_workers,
+        # 吞吐要算上云附件：全量同步等下载完再返回
+        "cloud_drain": True,
+    }
+    # 不指定时沿用 EmailDownloader 的默认值 (full 模式保存 .eml，structure / stream 模式不保存)
+    if args.save_eml or args.no_eml:
+        config["save_raw_eml"] = args.save_eml
+    config_path.write_text(yaml.safe_dump(config))
+
+    downloader = EmailDownloader(config_path)
+    before = stage_totals()
+    try:
+        inserted, seconds = _timed(downloader.sync_emalls_to_db)
+        stages = stage_delta(before)
+        _, incremental_s = _timed(downloader.sync_emalls_to_db)
+    finally:
+        downloader._disconnect()
+        downloader.cloud_downloader.shutdown()
+        imap.shutdown()
+        cloud.shutdown()
+
+    transferred_mb = (imap.bytes_sent + cloud.bytes_sent) / 1024 / 1024
+    return {
+        "messages": args.messages,
+        "inserted": inserted,
+        "mailbox_mb": round(mailbox_mb, 2),
+        "transferred_mb": round(transferred_mb, 2),
+        "seconds": round(seconds, 3),
+        "messages_per_s": round(args.messages / seconds, 1),
+        "mb_per_s": round(transferred_mb / seconds, 2),
+        "incremental_noop_s": round(incremental_s, 4),
+        # 各阶段 (imap_fetch / mime_parse / eml_write / db_commit ...) 的次数与耗时
+        "stages": stages,
+    }
+
+
+def bench_db_insert(args) -> dict:
+    """直接调 create_resumes_bulk 批量写入合成数据，只看数据库这一段"""
+    import random
+    from backend.app.database import ResumeInit
+    from backend.bench.synth_mail import JOBS, SURNAMES, GIVEN_NAMES
+
+    rng = random.Random(args.seed)
+    rows = [{
+        "uid": f"bench_{i}",
+        "name": rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES),
+        "phone_num": f"1{rng.choice('3456789')}{rng.randrange(10 ** 9):09d}",
+        "job_position": rng.choice(JOBS),
+        "send_time": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00",
+        "status": rng.choice(["new", "new", "new", "interview", "rejected"]),
+    } for i in range(args.db_rows)]
+
+    resume_init = ResumeInit()
+    stats, seconds = _timed(resume_init.create_resumes_bulk, rows, batch_size=args.db_batch_size)
+    return {
+        "rows": args.db_rows,
+        "inserted": stats["inserted"],
+        "batch_size": args.db_batch_size,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(args.db_rows / seconds, 1),
+    }
+
+
+def bench_dashboard(page_size: int = 50) -> dict:
+    """
+    看板的分页查询：cold 是新建 engine 之后的第一次取第一页 (新连接、pragma、语句缓存都是空的)，
+    warm 是同一查询再来一次；另外测按 cursor 翻到下一页、改一行状态之后再取第一页、总数
+    """
+    from backend.app import database
+    from senddb import ResumeDataManager
+
+    # 同步阶段已经建好了 engine，丢掉它，冷查询从新 engine 开始 (建表/迁移不计时)
+    with database._engine_lock:
+        if database._engine is not None:
+            database._engine.dispose()
+            database._engine = None
+    manager = ResumeDataManager()
+    (df, cursor), cold = _timed(manager.query_resumes_page, page_size=page_size)
+    _, warm = _timed(manager.query_resumes_page, page_size=page_size)
+    next_page = None
+    if cursor is not None:
+        _, next_page = _timed(manager.query_resumes_page, cursor=cursor, page_size=page_size)
+    after_update = None
+    if len(df):
+        manager.update_resume_status(int(df["id"].iloc[0]), "interview")
+        _, after_update = _timed(manager.query_resumes_page, page_size=page_size)
+    count, count_s = _timed(manager.count_resumes)
+    return {
+        "rows": count,
+        "cold_s": round(cold, 4),
+        "warm_s": round(warm, 4),
+        "next_page_s": round(next_page, 4) if next_page is not None else None,
+        "after_update_s": round(after_update, 4) if after_update is not None else None,
+        "count_s": round(count_s, 4),
+    }
+
+
+def _lookup(result: dict, path: str):
+    for key in path.split("."):
+        result = (result or {}).get(key)
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """返回回退超过 tolerance 的指标列表"""
+    regressions = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        new, old = _lookup(result, path), _lookup(baseline, path)
+        # 缺少的指标不比较；当前值为 0 (例如吞吐掉到 0) 也算回退，不能跳过
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+            regressions.append({"metric": path, "baseline": old, "current": new, "change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件入库端到端压测")
+    parser.add_argument("--messages", type=int, default=200, help="模拟邮件数量")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"附件类型比例，默认 {DEFAULT_MIX}")
+    parser.add_argument("--attachment-kb", type=int, default=200, help="附件平均大小 (KB)")
+    parser.add_argument("--cloud-ratio", type=float, default=0.1, help="使用超大附件链接的邮件比例")
+    parser.add_argument("--cloud-kb", type=int, default=1024, help="超大附件大小 (KB)")
+    parser.add_argument("--fetch-mode", choices=["full", "structure", "stream"], default="structure")
+    parser.add_argument("--fetch-workers", type=int, default=1)
+    eml = parser.add_mutually_exclusive_group()
+    eml.add_argument("--save-eml", action="store_true", help="保存原始 .eml (structure / stream 模式默认不保存)")
+    eml.add_argument("--no-eml", action="store_true", help="不保存原始 .eml (full 模式默认保存)")
+    # imbox 解析不了 RFC 2231 编码的中文附件名 (filename*=utf-8''...)，full 模式压测时需要加上
+    parser.add_argument("--ascii-filenames", action="store_true", help="附件名只用英文")
+    parser.add_argument("--db-rows", type=int, default=20000, help="批量入库测试的行数")
+    parser.add_argument("--db-batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--storage-dir", type=Path, default=None, help="数据目录，默认临时目录 (结束后删除)")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 写到文件，默认打印")
+    parser.add_argument("--compare", type=Path, default=None, help="与之前的结果 JSON 对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的性能回退比例")
+    args = parser.parse_args()
+
+    storage = args.storage_dir or Path(tempfile.mkdtemp(prefix="autoemail_bench_"))
+    storage.mkdir(parents=True, exist_ok=True)
+    # 必须在导入 backend.app.database 之前设置
+    os.environ["AUTOEMAIL_STORAGE_DIR"] = str(storage)
+
+    result = {
+        "params": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "env": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    try:
+        # 同步过程的日志打到 stderr，stdout 只留 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            result["sync"] = bench_sync(args, storage)
+            result["db_insert"] = bench_db_insert(args)
+            result["dashboard"] = bench_dashboard()
+            result["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        if args.storage_dir is None:
+            shutil.rmtree(storage, ignore_errors=True)
+
+    exit_code = 0
+    if args.compare:
+        regressions = compare(result, json.loads(args.compare.read_text()), args.tolerance)
+        result["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text)
+        print(f"📊 结果已写入 {args.output}")
+    else:
+        print(text)
+    for item in result.get("regressions", []):
+        print(f"❌ 性能回退: {item['metric']} {item['baseline']} -> {item['current']} ({item['change']:+.0%})")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
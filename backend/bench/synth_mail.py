@@ -0,0 +1,91 @@
+'''
+FilePath: /AutoEmail/backend/bench/synth_mail.py
+Description: 生成模拟的招聘邮箱：中文主题/发件人、正文里带手机号，
+             附件类型按比例混合 (pdf/docx/jpg/mp4/无附件)，一部分邮件用超大附件链接代替附件
+'''
+import random
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta
+
+
+JOBS = [
+    "产品经理", "产品运营", "商业化运营", "BD", "数据分析",
+    "算法工程师", "前端工程师", "后端工程师", "全栈工程师",
+    "移动端工程师", "测试工程师", "设计师", "市场与品牌", "人力与行政",
+]
+SURNAMES = "张王李赵刘陈杨黄周吴徐孙马朱胡郭何林罗高"
+GIVEN_NAMES = ["伟", "芳", "娜", "敏", "静", "磊", "洋", "婷", "强", "杰", "子涵", "欣怡", "浩然", "雨桐"]
+SUBJECT_TEMPLATES = [
+    "应聘{job}-{name}-{phone}",
+    "【简历】{name} 应聘 {job}",
+    "{job}岗位申请_{name}_{phone}",
+    "投递：{job} / {name}",
+]
+
+# 附件类型 -> (文件后缀, MIME)；mp4 不在下载白名单里，用来模拟应当被跳过的大附件
+ATTACHMENT_TYPES = {
+    "pdf": (".pdf", "application", "pdf"),
+    "docx": (".docx", "application", "vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "jpg": (".jpg", "image", "jpeg"),
+    "mp4": (".mp4", "video", "mp4"),
+}
+DEFAULT_MIX = "pdf=6,docx=2,jpg=1,mp4=1,none=1"
+
+
+def parse_mix(mix: str) -> dict:
+    """'pdf=6,docx=2,none=1' -> {'pdf': 6.0, 'docx': 2.0, 'none': 1.0}"""
+    result = {}
+    for item in mix.split(","):
+        kind, _, weight = item.strip().partition("=")
+        if kind != "none" and kind not in ATTACHMENT_TYPES:
+            raise ValueError(f"未知的附件类型: {kind}")
+        result[kind] = float(weight or 1)
+    return result
+
+
+def make_message(i: int, rng: random.Random, kind: str = "pdf", attachment_kb: int = 200,
+                 cloud_link: str = None, chinese_filenames: bool = True) -> EmailMessage:
+    name = rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES)
+    phone = f"1{rng.choice('3456789')}{rng.randrange(10 ** 9):09d}"
+    job = rng.choice(JOBS)
+
+    msg = EmailMessage()
+    msg["Subject"] = rng.choice(SUBJECT_TEMPLATES).format(job=job, name=name, phone=phone)
+    msg["From"] = f"{name} <candidate{i}@example.com>"
+    msg["To"] = "hr@example.com"
+    msg["Date"] = format_datetime(datetime(2025, 12, 1, 9) + timedelta(minutes=7 * i))
+    msg["Message-ID"] = f"<bench-{i}@example.com>"
+    msg.set_content(f"您好，我是{name}，应聘{job}岗位，联系电话 {phone}。\n附件是我的简历，请查收。\n")
+
+    html = f"<p>您好，我是{name}，应聘{job}岗位，联系电话 {phone}。</p>"
+    if cloud_link:
+        html += f'<p>简历较大，使用超大附件发送：<a href="{cloud_link}">下载</a></p>'
+    msg.add_alternative(html, subtype="html")
+
+    if not cloud_link and kind in ATTACHMENT_TYPES:
+        ext, maintype, subtype = ATTACHMENT_TYPES[kind]
+        # 随机内容，每封邮件的附件都不一样，不会被仓库去重
+        size = max(1, int(attachment_kb * 1024 * rng.uniform(0.5, 1.5)))
+        filename = f"{name}_{job}_简历{ext}" if chinese_filenames else f"resume_{i}{ext}"
+        msg.add_attachment(rng.randbytes(size), maintype=maintype, subtype=subtype, filename=filename)
+    return msg
+
+
+def make_mailbox(count: int, mix: str = DEFAULT_MIX, attachment_kb: int = 200,
+                 cloud_ratio: float = 0.0, cloud_link=None, seed: int = 0,
+                 chinese_filenames: bool = True) -> dict:
+    """
+    :param cloud_ratio: 用超大附件链接代替附件的邮件比例
+    :param cloud_link: file_id -> 链接 (见 FakeCloudServer.link)
+    :param chinese_filenames: 附件名用中文 (按 RFC 2231 编码，即 filename*=utf-8''...)
+    :return: {uid: EmailMessage}，uid 从 1 开始
+    """
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    kinds, probs = list(weights), list(weights.values())
+    mailbox = {}
+    for i in range(1, count + 1):
+        link = cloud_link(i) if cloud_link and rng.random() < cloud_ratio else None
+        mailbox[i] = make_message(i, rng, rng.choices(kinds, probs)[0], attachment_kb, link, chinese_filenames)
+    return mailbox
@@ -4,17 +4,104 @@ Date: 2025-12-10 15:16:05
 LastEditors: suntututut wuyaosantu@qq.com
 LastEditTime: 2025-12-10 15:26:19
 FilePath: /AutoEmail/backend/learn.py
-Description: 
+Description: 后端 HTTP 服务
+             /files/<sha256>.<ext>  简历/作品集文件 (Range + ETag)
+             /uploads               作品集大文件分块上传 (见 app/upload.py)，候选人页面的浏览器跨域调用
+             /api                   简历库读写接口 (见 app/api.py)
+             /metrics               各阶段耗时统计，Prometheus 文本格式 (见 app/metrics.py)
+             /debug/profile         采样若干秒的调用栈 (需设置 AUTOEMAIL_PROFILE_ENDPOINT=1)
+             /api、/metrics、/debug 是内部接口：需要 AUTOEMAIL_API_TOKEN，未配置时只允许本机访问 (见 app/auth.py)
+
+启动 (在项目根目录):
+    uvicorn backend.learn:app --host 0.0.0.0 --port 8000
+HR 看板设置 AUTOEMAIL_BACKEND_URL=http://<本机地址>:8000 后，预览与下载都走这里
 '''
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+# 将项目根目录加入 sys.path，保证能找到 backend 包
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from backend.app.file_server import router as file_router
+from backend.app.upload import router as upload_router
+from backend.app.api import router as api_router
+from backend.app.auth import require_internal
+from backend.app.metrics import REGISTRY, SamplingProfiler
+
+
+# 采样 profiler 会暴露代码结构，默认关闭
+PROFILE_ENDPOINT = os.getenv("AUTOEMAIL_PROFILE_ENDPOINT", "0") == "1"
+# 允许跨域调用 /uploads 的页面 (候选人页面的地址)，逗号分隔
+CORS_ORIGINS = os.getenv("AUTOEMAIL_CORS_ORIGINS", "http://localhost:8501").split(",")
+
 
+class ApiGZipMiddleware(GZipMiddleware):
+    """
+    只压缩 /api 的 JSON 响应：列表一页几十条，压缩后能小一个数量级。
+    /files 不压缩：PDF/视频本身已压缩，而且 Range (206) 响应被压缩后 Content-Range 就对不上了
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api"):
+            await super().__call__(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+class UploadCORSMiddleware(CORSMiddleware):
+    """
+    只给 /uploads 加跨域头：候选人页面 (Streamlit) 里的上传组件直接从浏览器调用它。
+    其他接口不允许跨域，浏览器里别的页面拿不到它们的响应
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/uploads"):
+            await super().__call__(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
 
-from fastapi import FastAPI
 
 app = FastAPI()
+app.add_middleware(
+    UploadCORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_methods=["GET", "POST", "PUT"],
+    allow_headers=["Content-Type", "X-Chunk-Sha256"],
+)
+app.add_middleware(ApiGZipMiddleware, minimum_size=1024)
+app.include_router(file_router)
+app.include_router(upload_router)
+app.include_router(api_router)
 
 @app.get("/")
 def read_root():
     return {"message": "Hello, World!"}
 
-# if __name__ == "__main__":
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_internal)])
+def metrics():
+    """本进程 + 同步脚本/看板进程写出的统计 (source 标签区分)"""
+    return PlainTextResponse(REGISTRY.render("api"), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse, dependencies=[Depends(require_internal)])
+async def profile(seconds: float = Query(default=10, gt=0, le=120), interval: float = Query(default=0.005, gt=0)):
+    """对后端进程采样 seconds 秒，返回 collapsed stack (flamegraph.pl / speedscope 可直接打开)"""
+    if not PROFILE_ENDPOINT:
+        raise HTTPException(status_code=404, detail="Not Found")
+    profiler = SamplingProfiler(interval).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return profiler.collapsed()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,128 @@
+'''
+FilePath: /AutoEmail/frontend/app/api_client.py
+Description: 后端简历接口 (backend/app/api.py) 的 HTTP 客户端
+             方法名和返回值与 ResumeDataManager 保持一致，页面代码不用区分；
+             配置了后端地址时页面只走 HTTP，不再直接打开 SQLite
+'''
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Streamlit 进程访问后端用的地址；不配置时沿用 AUTOEMAIL_BACKEND_URL (浏览器访问的地址)
+API_URL = (os.getenv("AUTOEMAIL_API_URL") or os.getenv("AUTOEMAIL_BACKEND_URL", "")).rstrip("/")
+API_TIMEOUT = (5, 60)
+# 与后端相同的 AUTOEMAIL_API_TOKEN (见 backend/app/auth.py)；后端和页面在同一台机器上时可以不配
+API_TOKEN = os.getenv("AUTOEMAIL_API_TOKEN", "")
+
+
+class ResumeApiClient:
+    def __init__(self, base_url: str = API_URL, token: str = API_TOKEN):
+        self.base_url = base_url.rstrip("/")
+        # 所有会话共用一个连接池
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        return self.session.request(method, f"{self.base_url}{path}", timeout=API_TIMEOUT, **kwargs)
+
+    def _get(self, path: str, **params) -> dict:
+        resp = self._request("GET", path, params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    @staticmethod
+    def _filters(jobs=None, statuses=None, keyword=None) -> dict:
+        params = {"jobs": list(jobs or []), "statuses": list(statuses or [])}
+        if keyword:
+            params["keyword"] = keyword
+        return params
+
+    @staticmethod
+    def _to_df(items) -> pd.DataFrame:
+        if not items:
+            return pd.DataFrame()
+        df = pd.DataFrame(items)
+        df["send_time"] = pd.to_datetime(df["send_time"])
+        return df
+
+    def is_uid_exists(self, uid: str) -> bool:
+        return self._get("/api/resumes/exists", uid=uid)["exists"]
+
+    def save(self, resume: dict, resume_file, portfolio_file, portfolio_upload_id: str = None) -> str:
+        """返回值与 ResumeDataManager.save 相同：ok / duplicate / upload_incomplete / invalid_file，另外后端限流时为 rate_limited"""
+        files = {"resume_file": (resume_file.name, resume_file)}
+        if portfolio_file:
+            files["portfolio_file"] = (portfolio_file.name, portfolio_file)
+        data = {k: resume[k] for k in ("uid", "name", "phone_num", "job_position") if resume.get(k)}
+        if portfolio_upload_id:
+            data["portfolio_upload_id"] = portfolio_upload_id
+        resp = self._request("POST", "/api/resumes", data=data, files=files)
+        if resp.status_code == 409:
+            return "duplicate"
+        if resp.status_code == 400:
+            # 400 有两种：扩展名不合法，或分块上传的作品集还没完成
+            return "invalid_file" if resp.json().get("detail") == "不支持的文件类型" else "upload_incomplete"
+        if resp.status_code == 429:
+            return "rate_limited"
+        resp.raise_for_status()
+        return "ok"
+
+    def original_filename(self, file_path):
+        if not file_path:
+            return None
+        path = Path(file_path)
+        return self._blob_filename(path.stem, path.suffix) or path.name
+
+    @lru_cache(maxsize=4096)
+    def _blob_filename(self, sha256: str, ext: str = ""):
+        resp = self._request("GET", f"/api/blobs/{sha256}", params={"ext": ext})
+        return resp.json().get("filename") if resp.ok else None
+
+    def query_resumes_page(self, jobs=None, statuses=None, keyword=None, ascending=False,
+                           cursor=None, page_size: int = 50):
+        params = self._filters(jobs, statuses, keyword)
+        params.update({"ascending": ascending, "limit": page_size})
+        if cursor:
+            params["cursor_time"], params["cursor_id"] = cursor
+        result = self._get("/api/resumes", **params)
+        next_cursor = tuple(result["next_cursor"]) if result["next_cursor"] else None
+        return self._to_df(result["items"]), next_cursor
+
+    def search_resumes_page(self, keyword, jobs=None, statuses=None, offset: int = 0, page_size: int = 50):
+        params = self._filters(jobs, statuses, keyword)
+        params.update({"offset": offset, "limit": page_size})
+        result = self._get("/api/resumes/search", **params)
+        return self._to_df(result["items"]), result["next_offset"]
+
+    def count_resumes(self, jobs=None, statuses=None, keyword=None) -> int:
+        return self._get("/api/resumes/count", **self._filters(jobs, statuses, keyword))["count"]
+
+    def get_job_positions(self) -> list:
+        return self._get("/api/jobs")["jobs"]
+
+    def update_resume_status(self, resume_id: int, new_status: str, version: int = None) -> bool:
+        resp = self._request("PATCH", f"/api/resumes/{resume_id}/status",
+                             json={"status": new_status, "version": None if version is None else int(version)})
+        if resp.status_code in (404, 409):
+            return False
+        resp.raise_for_status()
+        return True
+
+    def update_resume_statuses(self, expected: dict, new_status: str) -> dict:
+        items = [{"id": int(rid), "version": None if version is None else int(version)}
+                 for rid, version in expected.items()]
+        resp = self._request("PATCH", "/api/resumes/status", json={"status": new_status, "items": items})
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_status_history(self, resume_id: int) -> list:
+        return self._get(f"/api/resumes/{resume_id}/history")["history"]
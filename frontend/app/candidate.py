@@ -4,7 +4,10 @@ import sys
 from datetime import datetime
 from sqlmodel import Session, select
 from pathlib import Path
-from senddb import ResumeDataManager
+from api_client import API_URL, ResumeApiClient
+from chunk_upload import chunk_uploader
+from backend.app.rate_limit import SubmitRateLimiter, resolve_client_ip
+from backend.app.job_classifier import JOB_OPTIONS
 import hashlib
 
 
@@ -12,13 +15,19 @@ import hashlib
 LIMIT_10MB = 10 * 1024 * 1024
 LIMIT_200MB = 200 * 1024 * 1024
 
+# 后端地址 (浏览器能访问到的地址)。配置后作品集走分块上传直接传到后端，
+# 不配置时仍用 st.file_uploader (整个文件会先缓存在 Streamlit 进程内存里)
+BACKEND_URL = os.getenv("AUTOEMAIL_BACKEND_URL", "").rstrip("/")
+
 
 class CandidatePage:
     """
     页面展示类：负责 UI 渲染、状态管理和输入校验
     """
-    def __init__(self, data_manager: ResumeDataManager):
+    def __init__(self, data_manager, rate_limiter: SubmitRateLimiter):
+        # data_manager: ResumeDataManager (直连数据库) 或 ResumeApiClient，接口相同
         self.manager = data_manager
+        self.rate_limiter = rate_limiter
         
         # 1. 初始化页面配置
         st.set_page_config(
@@ -55,6 +64,21 @@ class CandidatePage:
             
         return None
 
+    @staticmethod
+    def client_ip() -> str | None:
+        """客户端 IP：直接连过来的是可信代理 (AUTOEMAIL_TRUSTED_PROXIES) 时才看 X-Forwarded-For"""
+        return resolve_client_ip(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+
+    def check_rate_limit(self, phone: str) -> str | None:
+        """
+        进程内共享的令牌桶，按 IP 和手机号限流 (刷新页面、换会话都绕不过去)。
+        走后端接口时手机号由后端限流 (返回 429)，这里只按 IP
+        """
+        wait = self.rate_limiter.check(ip=self.client_ip(), phone=None if API_URL else phone)
+        if wait is None:
+            return None
+        return f"提交过于频繁，请 {max(1, round(wait / 60))} 分钟后再试。"
+
     def render(self):
         """渲染主界面"""
         st.title("加入我们")
@@ -69,19 +93,19 @@ class CandidatePage:
             with col2:
                 contact = st.text_input("联系方式 (手机) *")
 
-            job_options = [
-                "产品经理", "产品运营", "商业化运营", "BD", "数据分析",
-                "算法工程师", "前端工程师", "后端工程师", "全栈工程师",
-                "移动端工程师", "测试工程师", "设计师", "市场与品牌", "人力与行政"
-            ]
-            position = st.selectbox("申请岗位 *", options=["请选择"] + job_options)
+            # 与邮件投递的岗位识别共用一份列表 (backend/app/job_classifier.py)
+            position = st.selectbox("申请岗位 *", options=["请选择"] + JOB_OPTIONS)
             
             st.subheader("2. 附件上传")
             st.markdown("**📄 个人简历 (必填)**")
             resume_file = st.file_uploader("支持 PDF, Word (最大 10MB)", type=['pdf', 'docx', 'doc'])
             
             st.markdown("**🎬 作品集/视频 (选填)**")
-            portfolio_file = st.file_uploader("支持视频 MP4, MOV (最大 200MB)", type=['mp4', 'mov', 'pdf'])
+            if BACKEND_URL:
+                # 返回 {"upload_id", "filename", "size"}，断线后重新选择同一文件可续传
+                portfolio_file = chunk_uploader(BACKEND_URL, ".mp4,.mov,.pdf", LIMIT_200MB, key="portfolio_upload")
+            else:
+                portfolio_file = st.file_uploader("支持视频 MP4, MOV (最大 200MB)", type=['mp4', 'mov', 'pdf'])
             st.caption("提示：上传大文件时请耐心等待，直到文件名下方显示文件大小为止。")
 
             # --- 提交逻辑 ---
@@ -131,7 +155,7 @@ class CandidatePage:
             return
 
         # 2. 频率校验
-        freq_msg = self.check_frequency_limit()
+        freq_msg = self.check_frequency_limit() or self.check_rate_limit(contact)
         if freq_msg:
             st.error(f"❌ {freq_msg}")
             return
@@ -140,18 +164,20 @@ class CandidatePage:
         if resume_file.size > LIMIT_10MB:
             st.error(f"❌ 简历文件过大 ({resume_file.size/1024/1024:.2f} MB)！请压缩到 10MB 以内。")
             return
-        if portfolio_file and portfolio_file.size > LIMIT_200MB:
-            st.error(f"❌ 作品集文件过大 ({portfolio_file.size/1024/1024:.2f} MB)！请压缩到 200MB 以内。")
+        # 分块上传时 portfolio_file 是 dict，大小已由上传组件和后端校验
+        portfolio_size = portfolio_file["size"] if isinstance(portfolio_file, dict) else getattr(portfolio_file, "size", 0)
+        if portfolio_file and portfolio_size > LIMIT_200MB:
+            st.error(f"❌ 作品集文件过大 ({portfolio_size/1024/1024:.2f} MB)！请压缩到 200MB 以内。")
             return
 
         # 4. 业务逻辑校验 (查重)
-        # 调用 Manager 层
-        if self.manager.is_user_exits(name, contact):
+        # 调用 Manager 层：按 uid 走唯一索引 (并有进程内缓存)；
+        # 这里只是提前拦截，真正的去重在 save 的 insert-or-conflict 里，并发提交也不会重复
+        uid = self.generate_hash_uid(name=name, phone = contact)
+        if self.manager.is_uid_exists(uid):
             st.error("❌ 已提交过申请，请勿重复提交。")
             return
 
-
-        uid = self.generate_hash_uid(name=name, phone = contact)
         with st.spinner("Up loading..."):
             resume = {
                     "uid":uid,
@@ -164,10 +190,25 @@ class CandidatePage:
             
 
             # print(resume)
-            success = self.manager.save(resume, resume_file, portfolio_file)
-        # success = True
+            if isinstance(portfolio_file, dict):
+                result = self.manager.save(resume, resume_file, None, portfolio_upload_id=portfolio_file["upload_id"])
+            else:
+                result = self.manager.save(resume, resume_file, portfolio_file)
+        # 5. 处理失败状态
+        if result == "duplicate":
+            st.error("❌ 已提交过申请，请勿重复提交。")
+            return
+        if result == "rate_limited":
+            st.error("❌ 提交过于频繁，请稍后再试。")
+            return
+        if result == "invalid_file":
+            st.error("❌ 文件扩展名不合法，请重命名后重新上传。")
+            return
+        if result == "upload_incomplete":
+            st.error("❌ 作品集尚未上传完成，请等待上传结束后再提交。")
+            return
         # 6. 处理成功状态
-        if success:
+        if result == "ok":
             st.success("✅ 提交成功！我们已收到您的申请，HR 将尽快与您联系。")
             st.balloons() # 撒花特效
             
@@ -181,12 +222,27 @@ class CandidatePage:
 
 
 
+@st.cache_resource
+def get_data_manager():
+    """
+    所有候选人会话共用同一个 manager。
+    配置了后端地址时申请通过 HTTP 提交给后端，否则直接写数据库
+    """
+    if API_URL:
+        return ResumeApiClient(API_URL)
+    # 只有直连数据库时才导入：senddb 会带上数据库、上传管理、正文抽取 (mammoth / pypdf)
+    from senddb import ResumeDataManager
+    return ResumeDataManager()
+
+
+@st.cache_resource
+def get_rate_limiter():
+    """所有会话共用；AUTOEMAIL_RATE_LIMIT_BACKEND=sqlite 时多个页面进程也共用"""
+    return SubmitRateLimiter()
+
+
 if __name__ == "__main__":
-    # 使用 session_state 缓存 ResumeDataManager 实例
-    if "data_manager" not in st.session_state:
-        st.session_state.data_manager = ResumeDataManager()
-    
     if "ui" not in st.session_state:
-        st.session_state.ui = CandidatePage(st.session_state.data_manager)
+        st.session_state.ui = CandidatePage(get_data_manager(), get_rate_limiter())
     
     st.session_state.ui.render()
\ No newline at end of file
@@ -0,0 +1,23 @@
+'''
+FilePath: /AutoEmail/frontend/app/chunk_upload.py
+Description: 作品集分块上传组件
+             浏览器直接把文件分块传给后端 /uploads (见 backend/app/upload.py)，
+             文件内容不经过 Streamlit 进程，Python 这边只拿到 upload_id
+'''
+from pathlib import Path
+
+import streamlit.components.v1 as components
+
+
+_component = components.declare_component(
+    "chunk_upload", path=str(Path(__file__).parent / "components" / "chunk_upload")
+)
+
+
+def chunk_uploader(backend_url: str, accept: str, max_size: int, key: str = None):
+    """
+    :param backend_url: 浏览器能访问到的后端地址
+    :param accept: 文件选择框的类型过滤，如 ".mp4,.mov,.pdf"
+    :return: 上传完成后为 {"upload_id", "filename", "size"}，否则 None
+    """
+    return _component(backend_url=backend_url, accept=accept, max_size=max_size, key=key, default=None)
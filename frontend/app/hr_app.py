@@ -1,52 +1,136 @@
 import streamlit as st
 import pandas as pd
 import os
+import re
 import sys
 import base64
 import mammoth
 import mimetypes
-from senddb import ResumeDataManager
+from urllib.parse import urlencode
+from api_client import API_URL, ResumeApiClient
+from preview_cache import PreviewCache
+from backend.app.metrics import REGISTRY, timed
+from backend.app.archive import ArchiveStore
+from backend.app.database import split_paths
+
+# 招聘流程的所有状态
+STATUS_OPTIONS = ["new", "pending", "interview", "offer", "rejected", "finished"]
+# 看板每页显示的候选人数
+PAGE_SIZE = 50
+# 后端文件服务地址 (浏览器能访问到的地址，例如 http://192.168.1.10:8000)。
+# 配置后 PDF/视频/图片/下载都直接走后端 URL；不配置时仍由 Streamlit 读文件
+BACKEND_URL = os.getenv("AUTOEMAIL_BACKEND_URL", "").rstrip("/")
+# 仓库 (blob_store) 里的文件名：sha256 + 后缀，只有这类文件能通过后端访问
+BLOB_NAME_RE = re.compile(r'^[0-9a-f]{64}(\.[0-9a-z]{1,10})?$')
+
+@st.cache_resource
+def get_preview_cache() -> PreviewCache:
+    """预览缓存整个进程共用，内存层在不同会话之间也能命中"""
+    return PreviewCache()
+
+
+@st.cache_resource
+def get_archive() -> ArchiveStore:
+    """已归档文件的读取入口 (pack 文件 mmap)，整个进程共用"""
+    return ArchiveStore()
+
+
+def _open_file(file_path):
+    """本机的文件直接打开；已归档 (散文件已删除) 的从 pack 里读"""
+    if os.path.exists(file_path):
+        return open(file_path, "rb")
+    archived = get_archive().find_path(file_path)
+    if archived is None:
+        raise FileNotFoundError(file_path)
+    return archived.open()
+
+
+def _pdf_to_b64(file_path):
+    with _open_file(file_path) as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def _docx_to_html(file_path):
+    with _open_file(file_path) as docx_file:
+        return mammoth.convert_to_html(docx_file).value
+
 
 # --- 预览工具类 ---
 class FilePreviewer:
+    @staticmethod
+    def file_url(file_path, file_name=None, download=False):
+        """后端文件 URL；没配置 BACKEND_URL 或不是仓库里的文件时返回 None"""
+        name = os.path.basename(file_path)
+        if not BACKEND_URL or not BLOB_NAME_RE.match(name):
+            return None
+        url = f"{BACKEND_URL}/files/{name}"
+        if download:
+            url += "?" + urlencode({"download": 1, "filename": file_name or name})
+        return url
+
+    @staticmethod
+    def exists(file_path) -> bool:
+        return os.path.exists(file_path) or get_archive().find_path(file_path) is not None
+
+    @staticmethod
+    def local_source(file_path):
+        """给 st.video / st.image：本机文件用路径，已归档的给内容"""
+        if os.path.exists(file_path):
+            return file_path
+        with _open_file(file_path) as f:
+            return f.read()
+
     @staticmethod
     def show_pdf(file_path):
-        with open(file_path, "rb") as f:
-            base64_pdf = base64.b64encode(f.read()).decode('utf-8')
+        url = FilePreviewer.file_url(file_path)
+        if url:
+            # 浏览器按 Range 分段向后端取，不经过 Streamlit
+            st.markdown(f'<embed src="{url}" width="100%" height="800" type="application/pdf">', unsafe_allow_html=True)
+            return
+        base64_pdf = get_preview_cache().get(file_path, "pdf_b64", _pdf_to_b64)
         st.markdown(f'<embed src="data:application/pdf;base64,{base64_pdf}" width="100%" height="800" type="application/pdf">', unsafe_allow_html=True)
 
     @staticmethod
     def show_docx(file_path):
+        if not FilePreviewer.exists(file_path):
+            st.info("Word 文件不在本机，请下载查看。")
+            return
         try:
-            with open(file_path, "rb") as docx_file:
-                result = mammoth.convert_to_html(docx_file)
-                st.markdown(f'<div style="background:white;color:black;padding:20px;">{result.value}</div>', unsafe_allow_html=True)
+            html = get_preview_cache().get(file_path, "docx_html", _docx_to_html)
+            st.markdown(f'<div style="background:white;color:black;padding:20px;">{html}</div>', unsafe_allow_html=True)
         except Exception as e:
             st.error(f"Word 解析失败: {e}")
 
     @staticmethod
-    def render(file_path):
-        if not file_path or not os.path.exists(file_path):
+    def render(file_path, file_name=None):
+        # 走后端接口时文件可能不在本机，只要后端能提供 URL 即可
+        if not file_path or not (FilePreviewer.file_url(file_path) or FilePreviewer.exists(file_path)):
             st.warning("⚠️ 文件不存在")
             return
             
-        file_name = os.path.basename(file_path)
+        file_name = file_name or os.path.basename(file_path)
         ext = os.path.splitext(file_path)[1].lower()
         
-        with open(file_path, "rb") as f:
-            st.download_button(f"📥 下载 ({file_name})", f, file_name=file_name)
+        url = FilePreviewer.file_url(file_path)
+        if url:
+            st.link_button(f"📥 下载 ({file_name})", FilePreviewer.file_url(file_path, file_name, download=True))
+        else:
+            with _open_file(file_path) as f:
+                st.download_button(f"📥 下载 ({file_name})", f, file_name=file_name)
         
         st.divider()
-        if ext == ".pdf":
-            FilePreviewer.show_pdf(file_path)
-        elif ext == ".docx":
-            FilePreviewer.show_docx(file_path)
-        elif ext in [".mp4", ".mov", ".webm"]:
-            st.video(file_path)
-        elif ext in [".jpg", ".png"]:
-            st.image(file_path)
-        else:
-            st.info("暂不支持预览此格式，请下载查看。")
+        with timed("preview_render"):
+            if ext == ".pdf":
+                FilePreviewer.show_pdf(file_path)
+            elif ext == ".docx":
+                FilePreviewer.show_docx(file_path)
+            elif ext in [".mp4", ".mov", ".webm"]:
+                # 有 URL 时由浏览器直接按 Range 拖动播放，视频不进 Streamlit 内存
+                st.video(url or FilePreviewer.local_source(file_path))
+            elif ext in [".jpg", ".png"]:
+                st.image(url or FilePreviewer.local_source(file_path))
+            else:
+                st.info("暂不支持预览此格式，请下载查看。")
 
 \
 
@@ -54,45 +138,99 @@ class FilePreviewer:
 class HRDashboard:
     def __init__(self, manager):
         self.manager = manager
+        self.seen_versions = {}
         st.set_page_config(page_title="HR 工作台", page_icon="💼", layout="wide")
 
-    def update_status(self, resume_id, new_status):
+    def update_status(self, resume_id, new_status, version=None):
         """
-        调用 Manager 更新状态并刷新页面
+        调用 Manager 更新状态并刷新页面；version 是页面上看到的行版本，记录已被别人改过时不覆盖
         """
-        # 调用 Manager 中新写的 update_resume_status 方法
-        success = self.manager.update_resume_status(resume_id, new_status)
-        
+        success = self.manager.update_resume_status(resume_id, new_status, version)
+
         if success:
-            st.success(f"✅ 状态已更新为: {new_status}")
+            st.session_state.status_flash = ("success", f"✅ 状态已更新为: {new_status}")
             st.rerun() # 立即刷新页面显示最新状态
         else:
-            st.error("❌ 更新失败，未找到该候选人记录")
+            st.error("❌ 更新失败：未找到该候选人记录，或已被他人修改，请刷新后重试")
+
+    def update_statuses(self, rows, new_status):
+        """
+        批量改状态：选中的行一次提交 (一条 UPDATE)，然后只刷新一次页面
+        :param rows: 选中行的 DataFrame，需要 id / version 两列
+        """
+        expected = {int(rid): self._seen_version(rid, version) for rid, version in zip(rows["id"], rows["version"])}
+        result = self.manager.update_resume_statuses(expected, new_status)
+
+        parts = [f"{len(result['updated'])} 人已改为 {new_status}"]
+        if result["unchanged"]:
+            parts.append(f"{len(result['unchanged'])} 人原本就是该状态")
+        skipped = len(result["conflicts"]) + len(result["missing"])
+        if skipped:
+            parts.append(f"{skipped} 人已被他人修改，未覆盖")
+            st.session_state.status_flash = ("warning", "⚠️ " + "，".join(parts))
+        else:
+            st.session_state.status_flash = ("success", "✅ " + "，".join(parts))
+        # 换一个表格 key，清空已选中的行
+        st.session_state.table_version = st.session_state.get("table_version", 0) + 1
+        st.rerun()
+
+    def _seen_version(self, resume_id, version) -> int:
+        """HR 操作时看到的行版本：上一次页面显示时记下的，没有记录时用本次查到的"""
+        return int(self.seen_versions.get(int(resume_id), version))
+
+    def _page_cursor(self, signature):
+        """
+        分页状态放在 session_state 里：page_cursors 是每一页起点 cursor 组成的栈，
+        筛选条件 (signature) 变化时回到第一页
+        """
+        if st.session_state.get("page_signature") != signature:
+            st.session_state.page_signature = signature
+            st.session_state.page_cursors = [None]
+        return st.session_state.page_cursors[-1]
 
     def render(self):
         st.title("💼 候选人管理看板")
-        df = self.manager.fetch_all_resumes_as_df()
-        
-        if df.empty:
-            st.info("暂无简历")
-            return
+
+        # 上一次改状态的结果 (改完会立即 rerun，消息放在 session_state 里留到这一次显示)
+        flash = st.session_state.pop("status_flash", None)
+        if flash:
+            getattr(st, flash[0])(flash[1])
 
         with st.sidebar:
             st.header("🔍 筛选")
-            jobs = list(df["job_position"].unique())
-            sel_jobs = st.multiselect("岗位", jobs, default=jobs)
-            kw = st.text_input("搜索姓名/电话")
-            sort_opt = st.radio("排序", ["最新在前", "最早在前"])
-
-        # 过滤
-        if sel_jobs: df = df[df["job_position"].isin(sel_jobs)]
-        if kw: df = df[df["name"].str.contains(kw) | df["phone_num"].str.contains(kw)]
-        
-        # 排序
-        df = df.sort_values(by="send_time", ascending=(sort_opt == "最早在前"))
+            sel_jobs = st.multiselect("岗位", self.manager.get_job_positions(), placeholder="全部岗位")
+            sel_status = st.multiselect("状态", STATUS_OPTIONS, placeholder="全部状态")
+            kw = st.text_input("搜索姓名/电话/简历内容").strip()
+            sort_opt = st.radio("排序", ["最新在前", "最早在前", "相关度"])
+
+        # 过滤、排序、分页全部在数据库里完成，每次只取一页
+        filters = {"jobs": sel_jobs, "statuses": sel_status, "keyword": kw or None}
+        ascending = (sort_opt == "最早在前")
+        cursor = self._page_cursor((tuple(sel_jobs), tuple(sel_status), kw, sort_opt))
+
+        if sort_opt == "相关度" and kw:
+            # 按全文检索相关度排序，此时 cursor 是 offset
+            df, next_cursor = self.manager.search_resumes_page(
+                kw, jobs=sel_jobs, statuses=sel_status, offset=cursor or 0, page_size=PAGE_SIZE
+            )
+        else:
+            df, next_cursor = self.manager.query_resumes_page(
+                **filters, ascending=ascending, cursor=cursor, page_size=PAGE_SIZE
+            )
+        total = self.manager.count_resumes(**filters)
+
+        if df.empty:
+            st.info("暂无简历" if total == 0 and not any(filters.values()) else "没有符合条件的简历")
+            return
+
+        # 按钮/下拉框的操作在下一次重跑时才执行，那时页面已经重新查过了；
+        # 乐观锁要用 HR 点击前看到的版本，所以记下每次显示的 version，下一次重跑时使用
+        self.seen_versions = st.session_state.get("page_versions", {})
+        st.session_state.page_versions = dict(zip(df["id"].astype(int), df["version"].astype(int)))
 
         # 表格显示
-        st.subheader(f"📋 列表 ({len(df)}人)")
+        page_no = len(st.session_state.page_cursors)
+        st.subheader(f"📋 列表 ({total}人，第 {page_no} 页)")
         
         # 定义显示的列 (注意：虽然这里不显示 ID，但 df 里必须有 id 列)
         display_cols = ["name", "phone_num", "job_position", "send_time", "status", "attachment_path", "collection_path"]
@@ -114,15 +252,36 @@ class HRDashboard:
             column_config=column_config,
             hide_index=True,
             on_select="rerun",
-            selection_mode="single-row"
+            selection_mode="multi-row",
+            key=f"resume_table_{st.session_state.get('table_version', 0)}",
         )
 
-        if event.selection.rows:
-            idx = event.selection.rows[0]
+        c_prev, c_next = st.columns(2)
+        if c_prev.button("⬅️ 上一页", disabled=page_no == 1, use_container_width=True):
+            st.session_state.page_cursors.pop()
+            st.rerun()
+        if c_next.button("下一页 ➡️", disabled=next_cursor is None, use_container_width=True):
+            st.session_state.page_cursors.append(next_cursor)
+            st.rerun()
+
+        selected = df.iloc[event.selection.rows]
+        self._render_bulk_actions(df, selected)
+
+        if len(selected) == 1:
             # 获取完整的一行数据 (包含 id)
-            row = df.iloc[idx]
+            row = selected.iloc[0]
             self._render_detail(row)
 
+    def _render_bulk_actions(self, df, selected):
+        """批量改状态：表格里多选，或直接对本页全部候选人操作"""
+        with st.container(border=True):
+            c1, c2, c3 = st.columns([2, 2, 1], vertical_alignment="bottom")
+            whole_page = c1.checkbox(f"对本页全部 {len(df)} 人操作", key="bulk_whole_page")
+            target = df if whole_page else selected
+            new_status = c2.selectbox("批量改为", STATUS_OPTIONS, key="bulk_status")
+            if c3.button(f"修改 {len(target)} 人", disabled=target.empty, use_container_width=True):
+                self.update_statuses(target, new_status)
+
     def _render_detail(self, row):
         st.markdown("---")
         st.subheader(f"👤 {row['name']} 详情")
@@ -135,7 +294,7 @@ class HRDashboard:
         # --- 核心修改：状态修改区域 ---
         with c4:
             # 定义招聘流程的所有状态
-            status_options = ["new", "pending", "interview", "offer", "rejected", "finished"]
+            status_options = list(STATUS_OPTIONS)
             current_status = row['status']
             
             # 防止旧数据的状态不在选项列表中
@@ -155,21 +314,56 @@ class HRDashboard:
             if new_status != current_status:
                 # 传入 ID 和 新状态
                 # 注意：row['id'] 需要确保 int 类型
-                self.update_status(int(row['id']), new_status)
+                self.update_status(int(row['id']), new_status, self._seen_version(row['id'], row['version']))
+
+            history = self.manager.get_status_history(int(row['id']))
+            if history:
+                with st.popover("变更记录"):
+                    for item in history:
+                        changed_at = pd.to_datetime(item["changed_at"]).strftime("%m-%d %H:%M")
+                        st.caption(f"{changed_at}　{item['from_status']} → {item['to_status']}")
 
         col1, col2 = st.columns(2)
         with col1:
             st.info("📄 简历")
-            # 使用 FilePreviewer (假设类已定义)
-            FilePreviewer.render(row.get("attachment_path"))
+            # attachment_path 可能是 ; 拼接的多个文件 (邮件附件 + 云附件)，逐个预览
+            paths = split_paths(row.get("attachment_path"))
+            if len(paths) > 1:
+                names = [self.manager.original_filename(p) for p in paths]
+                for tab, path, name in zip(st.tabs(names), paths, names):
+                    with tab:
+                        FilePreviewer.render(path, name)
+            else:
+                path = paths[0] if paths else None
+                FilePreviewer.render(path, self.manager.original_filename(path))
         with col2:
             st.success("🎬 作品集")
             if row.get("collection_path"):
-                FilePreviewer.render(row.get("collection_path"))
+                FilePreviewer.render(row.get("collection_path"), self.manager.original_filename(row.get("collection_path")))
             else:
                 st.caption("无作品集")
 
+@st.cache_resource
+def get_data_manager():
+    """
+    整个进程共用一个 manager，不随每次重跑重建。
+    配置了后端地址时只通过 HTTP 接口读写，否则直接连数据库
+    """
+    if API_URL:
+        return ResumeApiClient(API_URL)
+    # 只有直连数据库时才导入：senddb 会带上数据库、上传管理、正文抽取 (mammoth / pypdf)
+    from senddb import ResumeDataManager
+    return ResumeDataManager()
+
+
+@st.cache_resource
+def publish_metrics():
+    """看板进程的耗时统计定期写到 storage/metrics/dashboard.json，由后端 /metrics 一并输出"""
+    REGISTRY.publish("dashboard")
+
+
 if __name__ == "__main__":
-    manager = ResumeDataManager()
+    publish_metrics()
+    manager = get_data_manager()
     app = HRDashboard(manager)
     app.render()
\ No newline at end of file
@@ -0,0 +1,158 @@
+'''
+FilePath: /AutoEmail/frontend/app/preview_cache.py
+Description: 附件预览缓存
+             DOCX 转出的 HTML、PDF 的 base64 这类预览产物按 (文件内容 hash, mtime) 缓存，
+             磁盘上按总大小做 LRU 淘汰，内存里再留一小层热数据；
+             再次打开同一个候选人时不再做任何转换
+'''
+import os
+import re
+import sys
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.app.utils import STORAGE_DIR
+
+
+PREVIEW_CACHE_DIR = STORAGE_DIR / "preview_cache"
+
+# 磁盘层、内存层各自的总大小上限；PDF 的 base64 一份就可能几十 MB，所以内存层也按字节数而不是条目数限制
+PREVIEW_CACHE_MAX_MB = int(os.getenv("AUTOEMAIL_PREVIEW_CACHE_MB", "512"))
+PREVIEW_MEMORY_MB = int(os.getenv("AUTOEMAIL_PREVIEW_MEMORY_MB", "64"))
+# 非仓库文件的内容 hash 最多记多少个
+PREVIEW_HASH_ITEMS = 4096
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class PreviewCache:
+    """
+    get(file_path, kind, build) 先查内存，再查磁盘，都没有时调用 build(file_path) 生成并写入两层。
+      - 磁盘层：每个产物一个文件，命中时更新 mtime，总大小超限时按 mtime 从旧到新删除
+      - 内存层：OrderedDict 实现的 LRU，总大小超过 memory_bytes 时从最久没用的开始丢；
+        单个产物比 memory_bytes 还大时只放磁盘
+    """
+    def __init__(self, root: Path = PREVIEW_CACHE_DIR, max_bytes: int = PREVIEW_CACHE_MAX_MB * 1024 * 1024,
+                 memory_bytes: int = PREVIEW_MEMORY_MB * 1024 * 1024, hash_items: int = PREVIEW_HASH_ITEMS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.hash_items = hash_items
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        # 非仓库文件的内容 hash：(path, size, mtime) -> sha256，避免每次重跑都读一遍文件；同样是 LRU
+        self._hashes = OrderedDict()
+        self._disk_bytes = sum(p.stat().st_size for p in self.root.glob("*/*") if p.is_file())
+
+    def _content_hash(self, path: Path, stat) -> str:
+        # 仓库 (blob_store) 里的文件名就是内容 sha256
+        if SHA256_RE.match(path.stem):
+            return path.stem
+        sig = (str(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if sig in self._hashes:
+                self._hashes.move_to_end(sig)
+                return self._hashes[sig]
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        with self._lock:
+            self._hashes[sig] = sha.hexdigest()
+            while len(self._hashes) > self.hash_items:
+                self._hashes.popitem(last=False)
+        return sha.hexdigest()
+
+    def key_for(self, file_path, kind: str) -> str:
+        path = Path(file_path)
+        if SHA256_RE.match(path.stem) and not path.exists():
+            # 已归档的仓库文件 (散文件已删除)：内容就是 sha256，不会再变
+            return f"{kind}/{path.stem}_archived"
+        stat = path.stat()
+        return f"{kind}/{self._content_hash(path, stat)}_{stat.st_mtime_ns}"
+
+    def _remember(self, key: str, value: str):
+        size = sys.getsizeof(value)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= sys.getsizeof(old)
+            self._memory[key] = value
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= sys.getsizeof(evicted)
+
+    def _read_disk(self, key: str):
+        path = self.root / key
+        try:
+            value = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        # 命中即刷新 mtime，淘汰时按 mtime 判断新旧
+        os.utime(path)
+        return value
+
+    def _write_disk(self, key: str, value: str):
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{uuid.uuid4().hex}.tmp"
+        tmp.write_text(value, encoding="utf-8")
+        size = tmp.stat().st_size
+        # 覆盖已有的 key 时换掉的是旧文件，总大小只加差值
+        try:
+            old = path.stat().st_size
+        except FileNotFoundError:
+            old = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_bytes += size - old
+            over = self._disk_bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除，直到回到上限的 90%"""
+        with self._lock:
+            files = []
+            for p in self.root.glob("*/*"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            target = self.max_bytes * 0.9
+            for _, size, p in files:
+                if total <= target:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+            self._disk_bytes = total
+
+    def get(self, file_path, kind: str, build) -> str:
+        """
+        :param kind: 产物类型 (docx_html / pdf_b64 ...)，同一文件不同产物分开缓存
+        :param build: 未命中时调用 build(file_path) 生成，返回 str
+        """
+        key = self.key_for(file_path, kind)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        if value is None:
+            value = build(file_path)
+            self._write_disk(key, value)
+        self._remember(key, value)
+        return value
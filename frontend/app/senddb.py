@@ -9,6 +9,7 @@ Description: 这是默认设置,请设置`customMade`, 打开koroFileHeader查
 from pathlib import Path
 import os
 import sys
+import threading
 import pandas as pd
 
 
@@ -20,11 +21,13 @@ sys.path.append(str(project_root))
 
 # 导入入库逻辑
 from backend.app.database import ResumeInit, Session, select, Resume
+from backend.app.blob_store import BlobStore, InvalidExtension, filename_ext
+from backend.app.upload import UploadManager
+from backend.app.text_extract import TextExtractor
+from backend.app.utils import STORAGE_DIR
 
 
-storage_base_path = Path(__file__).parent.parent.parent / "backend" / "storage"
-attachments_path = storage_base_path / "attachments"
-collection_path = storage_base_path / "collection"
+storage_base_path = STORAGE_DIR
 database_path = storage_base_path / "database"
 
 
@@ -39,92 +42,145 @@ class ResumeDataManager:
     def __init__(self) -> None:
         self.Resume_init = ResumeInit()
         self.engine = self.Resume_init.engine
-
-    def is_user_exits(self, name, phone) -> bool:
-        ''' 查重 '''
-
-        with Session(self.engine) as session:
-            statement = select(Resume).where((Resume.name == name) & (Resume.phone_num == phone))
-            res = session.exec(statement).first()
-
-            return res is not None
-
-
-    def save(self, resume: dict, resume_file, portfolio_file):
-
+        # 简历/作品集按内容 hash 存储，同一份文件重复上传不会再占磁盘
+        self.blob_store = BlobStore()
+        # 作品集分块上传 (后端 /uploads) 完成后的文件，按 upload_id 取回
+        self.upload_manager = UploadManager()
+        # 提交成功后在后台抽取简历正文 (写入全文索引)，不让候选人等
+        self.text_extractor = TextExtractor(workers=1)
+
+    def is_uid_exists(self, uid: str) -> bool:
+        ''' 查重：uid = md5(姓名_电话)，进程内缓存 + uid 唯一索引，一次索引查询 '''
+        return self.Resume_init.uid_exists(uid)
+
+    def save(self, resume: dict, resume_file, portfolio_file, portfolio_upload_id: str = None) -> str:
+        '''
+        幂等提交 (以 resume["uid"] 为键)：文件先暂存，数据库插入成功才放进仓库。
+        portfolio_upload_id: 作品集走分块上传时传入，文件已经在仓库里，这里只登记
+        :return: "ok" / "duplicate" (已提交过) / "upload_incomplete" (分块上传未完成) / "invalid_file" (扩展名不合法)
+        '''
         data = resume
         name = data.get("name")
 
+        # 扩展名来自上传的文件名，与后端接口共用同一个校验
+        try:
+            res_ext = filename_ext(resume_file.name)
+            port_ext = filename_ext(portfolio_file.name) if portfolio_file else None
+        except InvalidExtension:
+            return "invalid_file"
+
+        port_ref = None
+        if portfolio_upload_id:
+            port_ref = self.upload_manager.get_completed(portfolio_upload_id)
+            if port_ref is None:
+                return "upload_incomplete"
+
+        staged = []
+        try:
+            res_stage = self.blob_store.stage_file(resume_file, res_ext)
+            staged.append(res_stage)
+            data["attachment_path"] = res_stage["path"]
+            files = [(res_stage, "attachment", f"{name}_resume{res_ext}")]
+
+            if portfolio_file:
+                port_ref = self.blob_store.stage_file(portfolio_file, port_ext)
+                staged.append(port_ref)
+            if port_ref:
+                port_ext = port_ref["ext"].lstrip(".")
+                files.append((port_ref, "collection", f"{name}_portfolio.{port_ext}"))
+                data["collection_path"] = port_ref["path"]
+            else: data["collection_path"] = None
+
+            def commit_files():
+                # 在插入成功的事务里执行：暂存文件原子 rename 进仓库
+                return [{**(self.blob_store.commit_staged(ref) if "tmp_path" in ref else ref),
+                         "role": role, "filename": filename}
+                        for ref, role, filename in files]
+
+            resume_id = self.Resume_init.submit_resume(data, commit_files)
+        finally:
+            # 插入失败 (重复) 或出错时，清掉还没放进仓库的临时文件
+            for ref in staged:
+                self.blob_store.discard_staged(ref)
+
+        if not resume_id:
+            return "duplicate"
+        threading.Thread(target=self.text_extractor.extract_resumes, args=([data["uid"]],), daemon=True).start()
+        return "ok"
+
+    def original_filename(self, file_path):
+        """仓库中的文件以 hash 命名，查回上传/邮件里的原始文件名；查不到就用路径本身的文件名"""
+        if not file_path:
+            return None
+        path = Path(file_path)
+        return self.Resume_init.get_blob_filename(path.stem, path.suffix) or path.name
+
+    @staticmethod
+    def _to_df(results) -> pd.DataFrame:
+        # 将 SQLModel 对象列表转换为字典列表
+        data = [resume.model_dump() for resume in results]
+        
+        if not data:
+            return pd.DataFrame() # 返回空表防止报错
+
+        df = pd.DataFrame(data)
+        
+        # 确保时间列是 datetime 类型，方便排序
+        df["send_time"] = pd.to_datetime(df["send_time"])
+        return df
+
+    def query_resumes_page(self, jobs=None, statuses=None, keyword=None, ascending=False,
+                           cursor=None, page_size: int = 50):
+        """
+        看板分页查询：筛选、排序、分页都交给 SQL，只把一页数据转成 DataFrame
+        :return: (df, next_cursor)，next_cursor 为 None 表示已是最后一页
+        """
+        rows, next_cursor = self.Resume_init.query_resumes(
+            jobs=jobs, statuses=statuses, keyword=keyword,
+            ascending=ascending, cursor=cursor, limit=page_size,
+        )
+        return self._to_df(rows), next_cursor
 
-        res_ext = resume_file.name.split('.')[-1]
-        res_filename = f"{name}_resume.{res_ext}"
-        res_path = os.path.join(attachments_path, res_filename)
-        with open(res_path, "wb") as f:
-            f.write(resume_file.getbuffer())
-        data["attachment_path"] = res_path
-
-
-        if portfolio_file:
-            port_ext = portfolio_file.name.split('.')[-1]
-            port_filename = f"{name}_portfolio.{port_ext}"
-            port_path = os.path.join(collection_path, port_filename)
-            with open(port_path, "wb") as f:
-                f.write(portfolio_file.getbuffer())
-
+    def search_resumes_page(self, keyword, jobs=None, statuses=None, offset: int = 0, page_size: int = 50):
+        """
+        全文检索 (姓名/电话/岗位/简历正文)，按相关度排序
+        :return: (df, next_offset)，next_offset 为 None 表示已是最后一页
+        """
+        rows, has_more = self.Resume_init.search_resumes(
+            keyword, jobs=jobs, statuses=statuses, limit=page_size, offset=offset
+        )
+        return self._to_df(rows), (offset + page_size if has_more else None)
 
-            data["collection_path"] = port_path
-        else: data["collection_path"] = None
+    def count_resumes(self, jobs=None, statuses=None, keyword=None) -> int:
+        return self.Resume_init.count_resumes(jobs=jobs, statuses=statuses, keyword=keyword)
 
-        self.Resume_init.create_resume(data)
+    def get_job_positions(self) -> list:
+        return self.Resume_init.get_job_positions()
 
-        return True
 
-    def fetch_all_resumes_as_df(self):
+    def update_resume_status(self, resume_id: int, new_status: str, version: int = None) -> bool:
         """
-        获取所有简历数据，并直接转换为 Pandas DataFrame，方便前端排序和筛选
+        根据 ID 更新简历状态；传了 version 时，记录已被别人改过则不覆盖 (返回 False)
         """
-        with Session(self.engine) as session:
-            statement = select(Resume)
-            results = session.exec(statement).all()
-            
-            # 将 SQLModel 对象列表转换为字典列表
-            data = [resume.model_dump() for resume in results]
-            
-            if not data:
-                return pd.DataFrame() # 返回空表防止报错
-
-            df = pd.DataFrame(data)
-            
-            # 确保时间列是 datetime 类型，方便排序
-            df["send_time"] = pd.to_datetime(df["send_time"])
-            return df
-
-
-    def update_resume_status(self, resume_id: int, new_status: str) -> bool:
+        result = self.update_resume_statuses({resume_id: version}, new_status)
+        return resume_id in result["updated"] or resume_id in result["unchanged"]
+
+    def update_resume_statuses(self, expected: dict, new_status: str) -> dict:
         """
-        根据 ID 更新简历状态
+        批量改状态：一条 UPDATE + 状态变更记录，一个事务
+        :param expected: {resume_id: 页面上看到的 version (None 表示不检查)}
+        :return: {"updated", "unchanged", "conflicts", "missing"}，均为 id 列表
         """
-        with Session(self.engine) as session:
-            # 1. 根据 ID 查找记录
-            statement = select(Resume).where(Resume.id == resume_id)
-            resume = session.exec(statement).first()
-            
-            if resume:
-                # 2. 修改状态
-                resume.status = new_status
-                # 3. 提交更改
-                session.add(resume)
-                session.commit()
-                session.refresh(resume)
-                return True
-            else:
-                return False
-
-
-                
+        return self.Resume_init.update_statuses(expected, new_status)
+
+    def get_status_history(self, resume_id: int) -> list:
+        """[{from_status, to_status, version, changed_at}, ...]，按时间先后"""
+        return [row.model_dump(exclude={"id", "resume_id"})
+                for row in self.Resume_init.get_status_history(resume_id)]
+
 
 if __name__ == "__main__":
     rdm = ResumeDataManager()
     
-    print(rdm.is_user_exits(name='无要', phone='124241241'))
+    print(rdm.is_uid_exists('a1b2c3d4'))
 
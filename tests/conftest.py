@@ -0,0 +1,111 @@
+'''
+FilePath: /AutoEmail/tests/conftest.py
+Description: 测试公共配置
+             数据库、文件仓库的路径在导入 backend 时就确定了，所以必须在导入任何 backend 模块之前
+             把 AUTOEMAIL_STORAGE_DIR 指到临时目录，测试永远不会碰到 backend/storage。
+             整个测试进程共用一个库：各用例用 unique 生成的前缀区分自己的数据 (uid / Message-ID / 邮箱账号)
+'''
+import os
+import sys
+import uuid
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+import yaml
+
+STORAGE = Path(tempfile.mkdtemp(prefix="autoemail_test_"))
+os.environ["AUTOEMAIL_STORAGE_DIR"] = str(STORAGE)
+os.environ.pop("AUTOEMAIL_API_URL", None)
+os.environ.pop("AUTOEMAIL_BACKEND_URL", None)
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "frontend" / "app"))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(STORAGE, ignore_errors=True)
+
+
+@pytest.fixture
+def unique():
+    """本用例专用的前缀"""
+    return uuid.uuid4().hex[:12]
+
+
+@pytest.fixture
+def mailbox_factory(unique):
+    """synth_mail.make_mailbox 生成的邮件，Message-ID 换成本用例独有的"""
+    from backend.bench.synth_mail import make_mailbox
+
+    def make(count: int, **kwargs):
+        kwargs.setdefault("chinese_filenames", False)
+        msgs = make_mailbox(count, **kwargs)
+        for uid, msg in msgs.items():
+            msg.replace_header("Message-ID", f"<{unique}-{uid}@example.com>")
+        return msgs
+    return make
+
+
+@pytest.fixture
+def imap_server():
+    """启动 FakeImapServer：imap_server(msgs, uidvalidity=...)，用例结束时关闭"""
+    from backend.bench.fake_imap import FakeImapServer
+
+    servers = []
+
+    def start(msgs, **kwargs):
+        server = FakeImapServer(msgs, **kwargs).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def downloader_factory(tmp_path, unique):
+    """连到 FakeImapServer 的 EmailDownloader；邮箱账号按用例区分，同步进度互不影响"""
+    from backend.app.email_download import EmailDownloader
+
+    downloaders = []
+
+    def make(imap, **config):
+        path = tmp_path / f"email_{len(downloaders)}.yaml"
+        path.write_text(yaml.safe_dump({
+            "imap_server": "127.0.0.1", "port": imap.port, "ssl": False,
+            "username": f"{unique}@example.com", "imap_password": "test",
+            **config,
+        }))
+        downloader = EmailDownloader(path)
+        downloaders.append(downloader)
+        return downloader
+    yield make
+    for downloader in downloaders:
+        downloader._disconnect()
+        downloader.cloud_downloader.shutdown()
+        downloader.text_extractor.close()
+
+
+def make_pdf(text: str) -> bytes:
+    """只有一页、一行文字的最小 PDF (ASCII 文本)，pypdf 可以抽出 text"""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,73 @@
+'''
+FilePath: /AutoEmail/tests/test_api.py
+Description: /api 接口：候选人重复提交由 insert-or-conflict 判定；批量/单条改状态的乐观锁与返回分类
+'''
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from conftest import make_pdf
+
+
+@pytest.fixture
+def client():
+    from backend.app.api import router
+
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app, client=("127.0.0.1", 50000)) as c:
+        yield c
+
+
+def _form(unique, i):
+    return {"uid": f"{unique}-{i}", "name": "赵六", "phone_num": f"137{int(unique[:6], 16) % 10**8:08d}",
+            "job_position": f"岗位-{unique}"}
+
+
+def test_duplicate_submission_conflicts(client, unique, monkeypatch):
+    from backend.app import api
+
+    pdf = make_pdf(f"resume {unique}")
+    files = lambda: {"resume_file": ("resume.pdf", io.BytesIO(pdf), "application/pdf")}
+    assert client.post("/api/resumes", data=_form(unique, 1), files=files()).status_code == 201
+
+    # 提交前不再单独查重：直接插入，由 ON CONFLICT 的 rowcount 判定重复
+    async def no_lookup(session, uid):
+        raise AssertionError("提交时不应先查重")
+    monkeypatch.setattr(api, "_resume_exists", no_lookup)
+    resp = client.post("/api/resumes", data=_form(unique, 1), files=files())
+    assert resp.status_code == 409
+    monkeypatch.undo()
+    assert client.get("/api/resumes/exists", params={"uid": f"{unique}-1"}).json()["exists"] is True
+
+
+def test_status_endpoints(client, unique):
+    from sqlmodel import Session, select
+    from backend.app.database import Resume, ResumeInit
+
+    init = ResumeInit()
+    init.create_resumes_bulk([{"uid": f"{unique}-{i}", "name": "x", "phone_num": "1"} for i in range(2)])
+    with Session(init.engine) as session:
+        (a, va), (b, vb) = session.exec(select(Resume.id, Resume.version)
+                                        .where(Resume.uid.startswith(unique)).order_by(Resume.id)).all()
+
+    resp = client.patch("/api/resumes/status", json={"status": "interview", "items": [
+        {"id": a, "version": va}, {"id": b}, {"id": 10**9}]})
+    assert resp.json() == {"updated": [a, b], "unchanged": [], "conflicts": [], "missing": [10**9]}
+
+    # 单条：版本过期 409，不存在 404，带着新版本号则成功
+    assert client.patch(f"/api/resumes/{a}/status", json={"status": "finished", "version": va}).status_code == 409
+    assert client.patch(f"/api/resumes/{10**9}/status", json={"status": "finished"}).status_code == 404
+    resp = client.patch(f"/api/resumes/{a}/status", json={"status": "finished", "version": va + 1})
+    assert resp.json() == {"id": a, "status": "finished"}
+    assert [h.to_status for h in init.get_status_history(a)] == ["interview", "finished"]
+    assert client.patch("/api/resumes/status", json={"status": "x", "items": []}).json()["updated"] == []
+
+
+def test_rejects_unsafe_extension(client, unique):
+    files = {"resume_file": ("x./../../evil", io.BytesIO(b"data"), "application/pdf")}
+    resp = client.post("/api/resumes", data=_form(unique, 1), files=files)
+    assert resp.status_code == 400
+    assert client.get("/api/resumes/exists", params={"uid": f"{unique}-1"}).json()["exists"] is False
@@ -0,0 +1,207 @@
+'''
+FilePath: /AutoEmail/tests/test_archive.py
+Description: 冷数据归档：pack/idx 读写 (压缩与原样存放、按范围读、损坏文件跳过)，
+             同内容不同扩展名的文件只存一份且都能读回
+'''
+import os
+import hashlib
+
+import pytest
+
+from backend.app.archive import ArchiveStore, PackReader, PackWriter, archive_blobs, sha_from_path
+
+
+def _file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest(), path
+
+
+@pytest.fixture
+def files(tmp_path, unique):
+    return {
+        "text": (b"Subject: resume\r\n" + unique.encode() * 2000),       # 压缩
+        "binary": os.urandom(300 * 1024),                               # 压不动，原样存放
+        "empty": b"",
+    }
+
+
+def test_pack_roundtrip(tmp_path, files):
+    writer = PackWriter(tmp_path / "archive")
+    shas = {}
+    for name, data in files.items():
+        sha, path = _file(tmp_path, name, data)
+        assert writer.add(sha, path)
+        shas[name] = sha
+    name = writer.close()
+    assert sorted(p.name for p in (tmp_path / "archive").iterdir()) == [f"{name}.idx", f"{name}.pack"]
+
+    reader = PackReader(tmp_path / "archive" / f"{name}.idx")
+    assert reader.count == 3
+    for key, data in files.items():
+        entry = reader.find(shas[key])
+        assert entry.size == len(data) and entry.read() == data
+        assert entry.open().read() == data
+    assert reader.find(shas["text"]).compressed
+    assert not reader.find(shas["binary"]).compressed
+    assert reader.find("0" * 64) is None and reader.find("f" * 64) is None
+
+
+@pytest.mark.parametrize("key", ["text", "binary"])
+def test_iter_range(tmp_path, files, key):
+    data = files[key]
+    sha, path = _file(tmp_path, key, data)
+    writer = PackWriter(tmp_path / "archive")
+    writer.add(sha, path)
+    entry = PackReader(tmp_path / "archive" / f"{writer.close()}.idx").find(sha)
+
+    assert b"".join(entry.iter_range(chunk_size=4096)) == data
+    assert b"".join(entry.iter_range(100, 9000, chunk_size=1000)) == data[100:9000]
+    assert b"".join(entry.iter_range(len(data) - 1)) == data[-1:]
+
+
+def test_compressed_range_read_stops_at_end(tmp_path, monkeypatch):
+    import zlib
+    from backend.app import archive
+
+    data = b"Subject: resume\r\n" * 200000                     # 约 3.4MB，压缩后很小
+    sha, path = _file(tmp_path, "big.eml", data)
+    writer = PackWriter(tmp_path / "archive")
+    writer.add(sha, path)
+    entry = PackReader(tmp_path / "archive" / f"{writer.close()}.idx").find(sha)
+    assert entry.compressed
+
+    # 不能整体解压：只解到范围末尾，每次最多一块
+    monkeypatch.setattr(archive.zlib, "decompress", None)
+    inflated = []
+    real = zlib.decompressobj
+
+    class Inflater:
+        def __init__(self):
+            self._obj = real()
+
+        def decompress(self, data, max_length):
+            out = self._obj.decompress(data, max_length)
+            inflated.append(len(out))
+            return out
+
+        @property
+        def unconsumed_tail(self):
+            return self._obj.unconsumed_tail
+
+    monkeypatch.setattr(archive.zlib, "decompressobj", Inflater)
+    assert b"".join(entry.iter_range(1000, 5000, chunk_size=1024)) == data[1000:5000]
+    assert max(inflated) <= 1024 and sum(inflated) < 6 * 1024
+
+
+def test_large_files_are_stored_raw(tmp_path, monkeypatch):
+    from backend.app import archive
+
+    monkeypatch.setattr(archive, "COMPRESS_MAX_BYTES", 4096)
+    sha, path = _file(tmp_path, "big.eml", b"a" * 8192)
+    writer = PackWriter(tmp_path / "archive")
+    writer.add(sha, path)
+    assert not PackReader(tmp_path / "archive" / f"{writer.close()}.idx").find(sha).compressed
+
+
+def test_corrupt_file_is_skipped(tmp_path, files):
+    writer = PackWriter(tmp_path / "archive")
+    bad_sha, _ = _file(tmp_path, "orig", files["text"])
+    _, bad_path = _file(tmp_path, "bad", files["text"] + b"x")
+    good_sha, good_path = _file(tmp_path, "good", files["binary"])
+
+    assert writer.add(bad_sha, bad_path) is False
+    assert writer.add(good_sha, good_path)
+    reader = PackReader(tmp_path / "archive" / f"{writer.close()}.idx")
+    # 跳过的内容被截掉，后面的条目偏移正确
+    assert reader.find(bad_sha) is None
+    assert reader.find(good_sha).read() == files["binary"]
+
+
+def test_empty_or_aborted_writer_leaves_nothing(tmp_path, files):
+    root = tmp_path / "archive"
+    assert PackWriter(root).close() is None
+    writer = PackWriter(root)
+    writer.add(*_file(tmp_path, "a", files["text"]))
+    writer.abort()
+    assert list(root.iterdir()) == []
+
+
+def test_store_sees_packs_written_later(tmp_path, files):
+    store = ArchiveStore(tmp_path / "archive")
+    sha, path = _file(tmp_path, "a", files["text"])
+    assert store.find(sha) is None
+
+    writer = PackWriter(tmp_path / "archive")
+    writer.add(sha, path)
+    writer.close()
+    assert store.find(sha).read() == files["text"]
+    assert store.find_path(f"/blobs/ab/cd/{sha}.eml").sha256 == sha
+    assert store.find_path("/x/not-a-hash.pdf") is None
+    assert sha_from_path(f"{sha}.tar.gz") == sha
+
+
+def test_archive_blobs_same_content_two_extensions(tmp_path, unique):
+    from sqlmodel import Session, select
+    from backend.app.blob_store import BlobStore
+    from backend.app.database import Blob, ResumeInit
+
+    store = BlobStore(tmp_path / "blobs")
+    data = os.urandom(4096) + unique.encode()
+    pdf = {**store.put_bytes(data, "pdf"), "role": "attachment", "filename": "简历.pdf"}
+    doc = {**store.put_bytes(data, "doc"), "role": "attachment", "filename": "简历.doc"}
+    init = ResumeInit()
+    uid = f"{unique}-archived"
+    init.create_resumes_bulk([{"uid": uid, "name": "x", "phone_num": "1", "status": "rejected"}])
+    init.link_blobs(uid, [pdf, doc])
+
+    root = tmp_path / "archive"
+    stats = archive_blobs(min_age_days=0, root=root)
+    assert stats["archived"] >= 2
+
+    with Session(init.engine) as session:
+        blobs = session.exec(select(Blob).where(Blob.sha256 == pdf["sha256"])).all()
+    assert {b.ext for b in blobs} == {".pdf", ".doc"}
+    assert len({b.pack for b in blobs}) == 1 and blobs[0].pack
+    # 散文件已删，pack 里只存了一份，两个路径都能读回
+    assert not os.path.exists(pdf["path"]) and not os.path.exists(doc["path"])
+    reader = PackReader(root / f"{blobs[0].pack}.idx")
+    key = bytes.fromhex(pdf["sha256"])
+    assert sum(reader._key(i) == key for i in range(reader.count)) == 1
+    archive = ArchiveStore(root)
+    assert archive.find_path(pdf["path"]).read() == archive.find_path(doc["path"]).read() == data
+
+
+def test_reingest_archived_content_writes_no_loose_file(tmp_path, unique):
+    import io
+    from sqlmodel import Session, select
+    from backend.app.blob_store import BlobStore
+    from backend.app.database import Blob, ResumeInit
+
+    root = tmp_path / "archive"
+    store = BlobStore(tmp_path / "blobs", archive=ArchiveStore(root))
+    data = os.urandom(4096) + unique.encode()
+    ref = {**store.put_bytes(data, "pdf"), "role": "attachment", "filename": "简历.pdf"}
+    init = ResumeInit()
+    init.create_resumes_bulk([{"uid": f"{unique}-old", "name": "x", "phone_num": "1", "status": "rejected"}])
+    init.link_blobs(f"{unique}-old", [ref])
+    archive_blobs(min_age_days=0, root=root)
+    assert not os.path.exists(ref["path"])
+
+    # 同一份内容再次入库 (各种写入方式、换个扩展名)：只登记 pack，不写散文件
+    src = tmp_path / "again.pdf"
+    src.write_bytes(data)
+    staged = store.stage_file(io.BytesIO(data), "pdf")
+    refs = [store.put_bytes(data, "pdf"), store.put_file(io.BytesIO(data), "pdf"),
+            store.put_stream(iter([data]), "pdf"), store.put_path(src),
+            store.commit_staged(staged), store.put_bytes(data, "docx")]
+    assert staged["tmp_path"] is None and not src.exists()
+    pack = refs[0]["pack"]
+    assert pack and all(r["pack"] == pack and not r["is_new"] for r in refs)
+    assert not any(os.path.exists(r["path"]) for r in refs)
+    assert not list(store.tmp_dir.iterdir())
+
+    init.create_resumes_bulk([{"uid": f"{unique}-new", "name": "x", "phone_num": "1"}])
+    init.link_blobs(f"{unique}-new", [{**refs[-1], "role": "attachment", "filename": "简历.docx"}])
+    with Session(init.engine) as session:
+        assert session.exec(select(Blob.pack).where(Blob.sha256 == ref["sha256"], Blob.ext == ".docx")).one() == pack
@@ -0,0 +1,117 @@
+'''
+FilePath: /AutoEmail/tests/test_blob_store.py
+Description: 内容寻址仓库与 blob 表：同内容不同扩展名各有一个文件、一行记录
+'''
+import io
+
+import pytest
+
+from sqlalchemy import create_engine, inspect
+from sqlmodel import Session, select
+
+from backend.app.blob_store import BlobStore, InvalidExtension, filename_ext
+from backend.app.database import Blob, ResumeBlob, ResumeInit, _migrate_blob_key, split_paths
+
+
+def test_same_bytes_two_extensions_are_two_files(tmp_path, unique):
+    store = BlobStore(tmp_path)
+    data = f"same content {unique}".encode()
+    pdf = store.put_bytes(data, "pdf")
+    docx = store.put_bytes(data, ".DOCX")
+
+    assert pdf["sha256"] == docx["sha256"]
+    assert (pdf["ext"], docx["ext"]) == (".pdf", ".docx")
+    assert pdf["path"] != docx["path"]
+    assert pdf["is_new"] and docx["is_new"]
+    # 同扩展名再放一次：不写文件
+    assert store.put_bytes(data, "pdf")["is_new"] is False
+
+
+def test_stage_commit_and_duplicate(tmp_path, unique):
+    store = BlobStore(tmp_path)
+    data = f"staged {unique}".encode()
+    staged = store.stage_file(io.BytesIO(data), "pdf")
+    assert staged["tmp_path"] and not store.exists(staged["sha256"], "pdf")
+    ref = store.commit_staged(staged)
+    assert ref["is_new"] and open(ref["path"], "rb").read() == data
+
+    again = store.stage_file(io.BytesIO(data), "pdf")
+    assert again["tmp_path"] is None
+    assert store.commit_staged(again)["is_new"] is False
+
+
+def test_blob_rows_keyed_by_sha_and_ext(tmp_path, unique):
+    store = BlobStore(tmp_path)
+    data = f"resume {unique}".encode()
+    pdf = {**store.put_bytes(data, "pdf"), "role": "attachment", "filename": "简历.pdf"}
+    docx = {**store.put_bytes(data, "docx"), "role": "attachment", "filename": "简历.docx"}
+
+    init = ResumeInit()
+    init.link_blobs(f"{unique}-a", [pdf, docx])
+    # 重复登记不会多出行
+    init.link_blobs(f"{unique}-a", [pdf])
+
+    with Session(init.engine) as session:
+        blobs = session.exec(select(Blob).where(Blob.sha256 == pdf["sha256"]).order_by(Blob.ext)).all()
+        links = session.exec(select(ResumeBlob).where(ResumeBlob.resume_uid == f"{unique}-a")).all()
+    assert [(b.ext, b.path) for b in blobs] == [(".docx", docx["path"]), (".pdf", pdf["path"])]
+    assert sorted(link.ext for link in links) == [".docx", ".pdf"]
+    assert init.get_blob_filename(pdf["sha256"], ".docx") == "简历.docx"
+    assert init.get_blob_filename(pdf["sha256"], ".pdf") == "简历.pdf"
+
+
+def test_migrate_old_blob_key(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("""CREATE TABLE blob (sha256 VARCHAR PRIMARY KEY, ext VARCHAR NOT NULL,
+            size INTEGER NOT NULL, path VARCHAR NOT NULL, created_at DATETIME NOT NULL, pack VARCHAR)""")
+        conn.exec_driver_sql("""CREATE TABLE resumeblob (id INTEGER PRIMARY KEY, resume_uid VARCHAR NOT NULL,
+            sha256 VARCHAR NOT NULL, ext VARCHAR NOT NULL DEFAULT '', role VARCHAR NOT NULL, filename VARCHAR)""")
+        conn.exec_driver_sql("INSERT INTO blob VALUES ('ab', '.pdf', 3, '/x/ab.pdf', '2025-01-01 00:00:00', NULL)")
+        conn.exec_driver_sql("INSERT INTO resumeblob (resume_uid, sha256, role) VALUES ('u', 'ab', 'attachment')")
+
+    _migrate_blob_key(engine)
+
+    assert inspect(engine).get_pk_constraint("blob")["constrained_columns"] == ["sha256", "ext"]
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT sha256, ext, path FROM blob").all() == [("ab", ".pdf", "/x/ab.pdf")]
+        assert conn.exec_driver_sql("SELECT ext FROM resumeblob").scalar() == ".pdf"
+
+
+def test_split_paths():
+    assert split_paths(None) == []
+    assert split_paths("a.pdf") == ["a.pdf"]
+    assert split_paths("a.pdf;b.pdf;") == ["a.pdf", "b.pdf"]
+
+
+def test_stage_existing_blob_writes_no_temp_file(tmp_path, unique, monkeypatch):
+    store = BlobStore(tmp_path)
+    data = f"already stored {unique}".encode()
+    store.put_bytes(data, "pdf")
+
+    def no_write(chunks):
+        raise AssertionError("不应写临时文件")
+    monkeypatch.setattr(store, "_write_tmp", no_write)
+
+    staged = store.stage_file(io.BytesIO(data), "pdf")
+    assert staged["tmp_path"] is None and staged["size"] == len(data)
+    assert store.commit_staged(staged)["is_new"] is False
+
+
+def test_extension_validation(tmp_path):
+    assert BlobStore.normalize_ext("PDF") == ".pdf"
+    assert BlobStore.normalize_ext("") == ""
+    assert filename_ext("简历.Docx") == ".docx"
+    assert filename_ext("resume") == ""
+    for bad in ["/../../evil", "p/df", "..pdf", "pdf ", "a" * 11]:
+        with pytest.raises(InvalidExtension):
+            BlobStore.normalize_ext(bad)
+    with pytest.raises(InvalidExtension):
+        filename_ext("x./../../evil")
+    with pytest.raises(InvalidExtension):
+        BlobStore(root=tmp_path).stage_file(io.BytesIO(b"x"), "/../x")
+
+    # 不传 ext 时用文件后缀，后缀不合法就不带后缀
+    src = tmp_path / "weird.p df"
+    src.write_bytes(b"x")
+    assert BlobStore(root=tmp_path / "blobs").put_path(src)["ext"] == ""
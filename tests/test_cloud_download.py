@@ -0,0 +1,130 @@
+'''
+FilePath: /AutoEmail/tests/test_cloud_download.py
+Description: 云附件下载器：跳转页解析、直链只请求一次、.part 续传、失败原因
+'''
+import hashlib
+
+import pytest
+
+from backend.app.cloud_download import CloudDownloadError, CloudDownloader, extract_jump_links
+from backend.bench.fake_http import FakeCloudServer
+
+
+@pytest.fixture
+def cloud():
+    server = FakeCloudServer(file_size=300 * 1024).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def downloader():
+    dl = CloudDownloader(max_workers=2, chunk_size=16 * 1024)
+    yield dl
+    dl.shutdown()
+
+
+def test_extract_jump_links_unescapes_ampersands():
+    html = '<a href="https://mail.qq.com/cgi-bin/ftnExs_download?k=1&amp;t=2">下载</a><a href="https://x.com/a">x</a>'
+    assert extract_jump_links([html]) == ["https://mail.qq.com/cgi-bin/ftnExs_download?k=1&t=2"]
+    assert extract_jump_links(None) == [] and extract_jump_links("not a list") == []
+
+
+def test_jump_page_then_direct_link(cloud, downloader, tmp_path):
+    result = downloader.download_link(cloud.link("a1"), tmp_path)
+    data = cloud.file_bytes("a1")
+    assert result["filename"] == "cloud_resume_a1.pdf"
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert open(result["path"], "rb").read() == data
+    assert [path for path, _ in cloud.requests] == ["/ftn/jump?f=a1", "/ftn/download?f=a1"]
+
+
+def test_direct_file_link_is_requested_once(cloud, downloader, tmp_path):
+    url = f"{cloud.base_url}/ftn/download?f=d1"
+    result = downloader.download_link(url, tmp_path)
+    assert result["size"] == len(cloud.file_bytes("d1"))
+    assert cloud.requests == [("/ftn/download?f=d1", None)]
+    assert cloud.bytes_sent == len(cloud.file_bytes("d1"))
+
+
+def test_partial_file_is_resumed_with_range(cloud, downloader, tmp_path):
+    url = f"{cloud.base_url}/ftn/download?f=r1"
+    data = cloud.file_bytes("r1")
+    downloader._part_path(url, tmp_path).write_bytes(data[:1000])
+
+    result = downloader.download_link(url, tmp_path)
+
+    assert cloud.requests == [("/ftn/download?f=r1", "bytes=1000-")]
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+    assert not downloader._part_path(url, tmp_path).exists()
+
+
+def test_login_wall_raises_retryable_error(cloud, downloader, tmp_path):
+    with pytest.raises(CloudDownloadError) as info:
+        downloader.download_link(f"{cloud.base_url}/ftn/login?f=x&download=1", tmp_path)
+    assert info.value.retry
+    assert "直链" in str(info.value)
+
+
+def _queue(tmp_path, unique, downloader, cloud, **kwargs):
+    from backend.app.blob_store import BlobStore
+    from backend.app.cloud_jobs import CloudJobQueue
+    from backend.app.database import ResumeInit
+
+    init = ResumeInit()
+    uid = f"{unique}-cloud"
+    init.create_resumes_bulk([{"uid": uid, "name": "云", "phone_num": "1"}])
+    init.enqueue_cloud_jobs({uid: [cloud.link(f"{unique}a")]})
+    return CloudJobQueue(init, BlobStore(tmp_path / "blobs"), downloader, **kwargs), uid
+
+
+def _job(uid):
+    from sqlmodel import Session, select
+    from backend.app.database import CloudJob, get_engine
+
+    with Session(get_engine()) as session:
+        return session.exec(select(CloudJob).where(CloudJob.resume_uid == uid)).one()
+
+
+def test_error_after_download_is_recorded_as_failure(cloud, downloader, tmp_path, unique, monkeypatch):
+    queue, uid = _queue(tmp_path, unique, downloader, cloud)
+
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(queue.blob_store, "put_path", broken)
+    queue.drain()
+
+    # 不再停在 "下载中" 直到租约到期，而是按失败记录、退避后重试
+    job = _job(uid)
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert job.last_error == "OSError: disk full"
+
+
+def test_on_complete_error_keeps_job_done(cloud, downloader, tmp_path, unique):
+    def on_complete(resume_uid):
+        raise RuntimeError("extract failed")
+
+    queue, uid = _queue(tmp_path, unique, downloader, cloud, on_complete=on_complete)
+    queue.drain()
+
+    job = _job(uid)
+    assert (job.status, job.last_error) == ("done", None)
+
+
+def test_terminal_failure_removes_partial_download(cloud, downloader, tmp_path, unique, monkeypatch):
+    queue, uid = _queue(tmp_path, unique, downloader, cloud, max_attempts=2, base_delay=0)
+    save_dir = queue.blob_store.tmp_dir / uid
+    resumed = []
+
+    def interrupted(url, save_dir):
+        part = downloader._part_path(url, save_dir)
+        # 还能重试时 .part 留着，下一次接着续传
+        resumed.append(part.exists())
+        part.write_bytes(b"partial")
+        raise OSError("connection reset")
+    monkeypatch.setattr(downloader, "download_link", interrupted)
+    queue.drain()
+
+    assert resumed == [False, True]
+    assert _job(uid).status == "failed"
+    assert not save_dir.exists()
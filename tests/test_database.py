@@ -0,0 +1,231 @@
+'''
+FilePath: /AutoEmail/tests/test_database.py
+Description: ResumeInit 的写入与查询
+'''
+import pytest
+from sqlmodel import Session, select
+
+from backend.app import database
+from backend.app.database import CloudJob, Resume, ResumeBlob, ResumeInit, StatusAudit, status_update_result
+
+
+def _resume(unique, i, **kw):
+    return {"uid": f"{unique}-{i}", "name": f"候选人{i}", "phone_num": f"138{i:08d}",
+            "job_position": "测试", "attachment_path": f"/x/{unique}-{i}.pdf", **kw}
+
+
+def _ref(unique, i):
+    return {"sha256": f"{unique}{i:052d}", "ext": ".pdf", "size": 1, "path": f"/x/{unique}-{i}.pdf",
+            "role": "attachment", "filename": f"{i}.pdf"}
+
+
+def test_ingest_batch_writes_everything(unique):
+    init = ResumeInit()
+    mailbox = f"{unique}@example.com:INBOX"
+    stats = init.ingest_batch(
+        [_resume(unique, 1), _resume(unique, 2)],
+        {f"{unique}-1": [_ref(unique, 1)]},
+        {f"{unique}-2": ["http://127.0.0.1/ftn/jump?f=1"]},
+        mailbox, 7, 42,
+    )
+    assert stats == {"inserted": 2, "skipped": 0, "cloud_jobs": 1}
+    state = init.get_sync_state(mailbox)
+    assert (state.uidvalidity, state.last_uid) == (7, 42)
+
+    # 同一批再来一次：uid 已存在，全部跳过
+    again = init.ingest_batch([_resume(unique, 1)], {f"{unique}-1": [_ref(unique, 1)]},
+                              {f"{unique}-2": ["http://127.0.0.1/ftn/jump?f=1"]}, mailbox, 7, 43)
+    assert again == {"inserted": 0, "skipped": 1, "cloud_jobs": 0}
+    with Session(init.engine) as session:
+        assert len(session.exec(select(ResumeBlob).where(ResumeBlob.resume_uid == f"{unique}-1")).all()) == 1
+
+
+def test_ingest_batch_is_one_transaction(unique):
+    init = ResumeInit()
+    mailbox = f"{unique}@example.com:INBOX"
+    init.save_sync_state(mailbox, 7, 10)
+    bad_ref = {"sha256": "x", "role": "attachment"}   # 缺 path/size，登记文件时出错
+
+    with pytest.raises(KeyError):
+        init.ingest_batch([_resume(unique, 1)], {f"{unique}-1": [bad_ref]},
+                          {f"{unique}-1": ["http://127.0.0.1/ftn/jump?f=1"]}, mailbox, 7, 20)
+
+    with Session(init.engine) as session:
+        assert session.exec(select(Resume).where(Resume.uid == f"{unique}-1")).first() is None
+        assert session.exec(select(CloudJob).where(CloudJob.resume_uid == f"{unique}-1")).first() is None
+    assert init.get_sync_state(mailbox).last_uid == 10
+
+
+def test_engine_is_shared_and_tuned():
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.app.database import get_engine
+
+    with ThreadPoolExecutor(8) as pool:
+        engines = set(map(id, pool.map(lambda _: get_engine(), range(16))))
+    assert engines == {id(ResumeInit().engine)}
+
+    with get_engine().connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1   # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+
+@pytest.mark.parametrize("ascending", [False, True])
+def test_keyset_paging_keeps_null_send_time(unique, ascending):
+    init = ResumeInit()
+    job = f"岗位-{unique}-{ascending}"
+    times = ["2025-01-02 10:00:00", None, "2025-01-01 09:00:00", None, "2025-01-02 10:00:00", None, None]
+    init.create_resumes_bulk([_resume(f"{unique}-{ascending}", i, send_time=t, job_position=job)
+                              for i, t in enumerate(times)])
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = init.query_resumes(jobs=[job], ascending=ascending, cursor=cursor, limit=2)
+        seen.extend(rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == len(times)
+    keys = [(r.send_time or "", r.id) for r in seen]
+    assert keys == sorted(keys, reverse=not ascending)
+
+
+def test_short_search_terms_skip_resume_body(unique):
+    init = ResumeInit()
+    job = f"岗位-{unique}"
+    init.create_resumes_bulk([_resume(unique, 1, name="甄嬛", job_position=job),
+                              _resume(unique, 2, name="路人", job_position=job)])
+    with Session(init.engine) as session:
+        ids = {r.uid: r.id for r in session.exec(select(Resume).where(Resume.job_position == job))}
+    init.update_search_content({ids[f"{unique}-2"]: "推荐人：甄嬛；熟悉分布式存储"})
+
+    # 两个字的词只查姓名/电话/岗位，不去正文里 LIKE
+    rows, _ = init.search_resumes("甄嬛", jobs=[job])
+    assert [r.uid for r in rows] == [f"{unique}-1"]
+    # 三个字以上走 MATCH，正文照样能搜到
+    rows, _ = init.search_resumes("分布式", jobs=[job])
+    assert [r.uid for r in rows] == [f"{unique}-2"]
+    assert init.count_resumes(jobs=[job], keyword="甄嬛") == 1
+
+
+def test_migrate_adds_columns_with_sql_literal_defaults(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlmodel import SQLModel
+    from backend.app.database import _migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE resumeblob DROP COLUMN ext")
+    # 带引号的默认值：Python repr 会生成 "it's"，SQLite 里是标识符而不是字符串
+    monkeypatch.setattr(ResumeBlob.__table__.c.ext.default, "arg", "it's")
+
+    _migrate(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO resumeblob (resume_uid, sha256, role) VALUES ('u', 'ab', 'attachment')")
+        assert conn.exec_driver_sql("SELECT ext FROM resumeblob").scalar() == "it's"
+
+
+def test_submit_resume_conflict_skips_files(unique):
+    init = ResumeInit()
+    calls = []
+    assert init.submit_resume(_resume(unique, 1), lambda: calls.append(1) or [])
+    # 第二次由 ON CONFLICT 决定：不插入，也不把文件放进仓库
+    assert init.submit_resume(_resume(unique, 1), lambda: calls.append(2) or []) is None
+    assert calls == [1]
+
+
+def test_uid_cache_remembers_absent_uids(unique, monkeypatch):
+    init = ResumeInit()
+    uid = f"{unique}-1"
+    assert init.uid_exists(uid) is False
+    assert database.cached_uid_exists(uid) is False
+    # 本进程写入后 "不存在" 的缓存被清掉
+    init.create_resumes_bulk([_resume(unique, 1)])
+    assert database.cached_uid_exists(uid) is None
+    assert init.uid_exists(uid) is True
+
+    # 别的进程写入的 uid：负缓存过期后重新查库
+    other = f"{unique}-2"
+    assert init.uid_exists(other) is False
+    with Session(init.engine) as session:
+        session.add(Resume(**_resume(unique, 2)))
+        session.commit()
+    assert init.uid_exists(other) is False
+    monkeypatch.setattr(database, "ABSENT_UID_TTL", 0)
+    assert init.uid_exists(other) is True
+
+
+def _ids(init, unique, count):
+    init.create_resumes_bulk([_resume(unique, i) for i in range(count)])
+    with Session(init.engine) as session:
+        rows = session.exec(select(Resume).where(Resume.uid.startswith(unique)).order_by(Resume.id)).all()
+    return [(r.id, r.version) for r in rows]
+
+
+def test_update_statuses_classifies_rows(unique):
+    init = ResumeInit()
+    (a, va), (b, vb), (c, vc), (d, vd) = _ids(init, unique, 4)
+    init.update_statuses({c: vc}, "rejected")          # c 已经是目标状态
+    init.update_statuses({d: vd}, "interview")         # d 被别人改过，页面上的版本过期
+
+    result = init.update_statuses({a: va, b: None, c: vc + 1, d: vd, 10**9: 0}, "rejected")
+    assert result == {"updated": [a, b], "unchanged": [c], "conflicts": [d], "missing": [10**9]}
+
+    with Session(init.engine) as session:
+        rows = {r.id: (r.status, r.version) for r in session.exec(select(Resume).where(Resume.id.in_([a, b, c, d])))}
+        audits = session.exec(select(StatusAudit).where(StatusAudit.resume_id.in_([a, b, c, d]))
+                              .order_by(StatusAudit.id)).all()
+    assert rows == {a: ("rejected", va + 1), b: ("rejected", vb + 1), c: ("rejected", vc + 1),
+                    d: ("interview", vd + 1)}
+    # 审计记录与实际改到的行一一对应：c 没改，不重复记录；d 冲突，不记录
+    assert [(x.resume_id, x.from_status, x.to_status, x.version) for x in audits] == [
+        (c, "new", "rejected", vc + 1), (d, "new", "interview", vd + 1),
+        (a, "new", "rejected", va + 1), (b, "new", "rejected", vb + 1)]
+    assert [x.to_status for x in init.get_status_history(a)] == ["rejected"]
+
+
+def test_status_audit_is_append_only(unique):
+    from sqlalchemy.exc import DatabaseError
+
+    init = ResumeInit()
+    (rid, version), = _ids(init, unique, 1)
+    init.update_statuses({rid: version}, "finished")
+    with pytest.raises(DatabaseError, match="append-only"):
+        with init.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM status_audit WHERE resume_id = ?", (rid,))
+    assert len(init.get_status_history(rid)) == 1
+
+
+def test_status_update_result_empty():
+    assert status_update_result({}, "new", [], []) == {"updated": [], "unchanged": [], "conflicts": [], "missing": []}
+
+
+def test_migrate_drops_revision_triggers_and_column(tmp_path):
+    from sqlalchemy import create_engine, inspect
+    from sqlmodel import SQLModel
+    from backend.app.database import _migrate
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE resume ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        conn.exec_driver_sql("CREATE INDEX ix_resume_revision ON resume (revision)")
+        conn.exec_driver_sql("""CREATE TRIGGER resume_rev_ai AFTER INSERT ON resume BEGIN
+            UPDATE resume SET revision = 1 WHERE id = new.id; END""")
+
+    _migrate(engine)
+    assert "revision" not in {c["name"] for c in inspect(engine).get_columns("resume")}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                    "AND tbl_name = 'resume'").all() == []
+
+
+def test_status_update_sets_updated_at(unique):
+    init = ResumeInit()
+    (rid, version), = _ids(init, unique, 1)
+    with Session(init.engine) as session:
+        assert session.get(Resume, rid).updated_at is None
+    init.update_statuses({rid: version}, "finished")
+    with Session(init.engine) as session:
+        assert session.get(Resume, rid).updated_at is not None
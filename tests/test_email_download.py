@@ -0,0 +1,139 @@
+'''
+FilePath: /AutoEmail/tests/test_email_download.py
+Description: EmailDownloader：增量同步 / UIDVALIDITY 变化后的全量同步
+'''
+from backend.app.database import ResumeInit
+from backend.bench.fake_imap import StoredMessage
+
+
+def test_make_resume_uid_prefers_message_id(downloader_factory, imap_server):
+    downloader = downloader_factory(imap_server({}))
+    downloader.uidvalidity = 1
+    by_message_id = downloader.make_resume_uid("<a@example.com>", 7)
+    assert by_message_id.startswith("mail_")
+    # Message-ID 相同时与 UIDVALIDITY / UID 无关
+    downloader.uidvalidity = 2
+    assert downloader.make_resume_uid("<a@example.com>", 99) == by_message_id
+    assert downloader.make_resume_uid("<b@example.com>", 7) != by_message_id
+
+
+def test_make_resume_uid_falls_back_to_uidvalidity_and_uid(downloader_factory, imap_server):
+    downloader = downloader_factory(imap_server({}))
+    downloader.uidvalidity = 1
+    first = downloader.make_resume_uid(None, 7)
+    assert downloader.make_resume_uid("", 7) == first
+    assert downloader.make_resume_uid(None, 8) != first
+    downloader.uidvalidity = 2
+    assert downloader.make_resume_uid(None, 7) != first
+
+
+def test_incremental_sync_only_fetches_after_high_water_mark(downloader_factory, imap_server, mailbox_factory):
+    imap = imap_server(mailbox_factory(3, mix="pdf=1"))
+    downloader = downloader_factory(imap)
+
+    assert downloader.sync_emalls_to_db() == 3
+    state = ResumeInit().get_sync_state(downloader.mailbox_key)
+    assert (state.uidvalidity, state.last_uid) == (1, 3)
+
+    imap.log.clear()
+    assert downloader.sync_emalls_to_db() == 0
+    assert any("UID 4:*" in line for line in imap.log)
+    assert not any("BODY.PEEK[]" in line for line in imap.log)
+
+
+def test_uidvalidity_change_triggers_full_resync_without_duplicates(downloader_factory, imap_server, mailbox_factory):
+    msgs = mailbox_factory(4, mix="pdf=1")
+    imap = imap_server({uid: msgs[uid] for uid in (1, 2, 3)}, uidvalidity=1)
+    downloader = downloader_factory(imap)
+    assert downloader.sync_emalls_to_db() == 3
+
+    # 服务器重建邮箱：UIDVALIDITY 变化，旧邮件换了 UID，另外多了一封新邮件
+    imap.uidvalidity = 2
+    imap.msgs = {10 + uid: StoredMessage(msgs[uid]) for uid in (1, 2, 3, 4)}
+    downloader._disconnect()
+    imap.log.clear()
+
+    assert downloader.sync_emalls_to_db() == 1
+    # 已入库的邮件按 Message-ID 跳过，只下载新的那一封
+    assert [line for line in imap.log if "BODY.PEEK[]" in line] == ["UID FETCH 14 (BODY.PEEK[] FLAGS)"]
+    state = ResumeInit().get_sync_state(downloader.mailbox_key)
+    assert (state.uidvalidity, state.last_uid) == (2, 14)
+    # 之后回到增量
+    assert downloader.sync_emalls_to_db() == 0
+
+
+def test_parallel_fetch_keeps_uid_order(downloader_factory, imap_server, mailbox_factory):
+    imap = imap_server(mailbox_factory(9, mix="pdf=1,none=1", attachment_kb=8))
+    downloader = downloader_factory(imap, fetch_mode="structure", fetch_workers=3, fetch_batch_size=2)
+    downloader._connect()
+    logins_before = sum(line.startswith("LOGIN") for line in imap.log)
+
+    fetched = list(downloader._iter_messages(list(range(1, 10))))
+
+    assert [uid for uid, _ in fetched] == list(range(1, 10))
+    assert [msg.message_id for _, msg in fetched] == [str(imap.msgs[u].msg["Message-ID"]) for u in range(1, 10)]
+    # 主连接之外另开了 3 条只读连接，结束后都已登出
+    assert sum(line.startswith("LOGIN") for line in imap.log) - logins_before == 3
+    assert sum(line.startswith("LOGOUT") for line in imap.log) == 3
+
+
+def test_parallel_sync_inserts_every_message(downloader_factory, imap_server, mailbox_factory):
+    imap = imap_server(mailbox_factory(7, mix="pdf=1", attachment_kb=8))
+    downloader = downloader_factory(imap, fetch_mode="structure", fetch_workers=2, fetch_batch_size=3)
+    assert downloader.sync_emalls_to_db() == 7
+    assert ResumeInit().get_sync_state(downloader.mailbox_key).last_uid == 7
+
+
+def test_watch_survives_unexpected_errors(downloader_factory, imap_server, mailbox_factory, monkeypatch):
+    from backend.app import email_download
+
+    downloader = downloader_factory(imap_server(mailbox_factory(1, mix="pdf=1")))
+    monkeypatch.setattr(email_download.random, "uniform", lambda a, b: 0.0)
+    calls = []
+
+    def flaky_sync(incremental=False):
+        calls.append(incremental)
+        if len(calls) == 1:
+            raise ValueError("bad row")
+        downloader.stop()
+        return 0
+    monkeypatch.setattr(downloader, "sync_emalls_to_db", flaky_sync)
+
+    downloader.watch()
+    # 第一轮出错后退避重连，第二轮照常执行
+    assert calls == [True, True]
+
+
+def test_sync_hands_off_cloud_jobs_without_waiting(downloader_factory, imap_server, mailbox_factory, monkeypatch):
+    downloader = downloader_factory(imap_server(mailbox_factory(2, mix="pdf=1")))
+    calls = []
+    monkeypatch.setattr(downloader.cloud_queue, "drain", lambda: calls.append("drain"))
+    monkeypatch.setattr(downloader.cloud_queue, "run_due", lambda: calls.append("run_due") or 0)
+
+    assert downloader.sync_emalls_to_db() == 2
+    assert calls == ["run_due"]
+    # 没有新邮件：不碰云附件队列
+    calls.clear()
+    assert downloader.sync_emalls_to_db() == 0
+    assert calls == []
+
+
+def test_sync_drains_cloud_jobs_when_asked(downloader_factory, imap_server, mailbox_factory, monkeypatch):
+    downloader = downloader_factory(imap_server(mailbox_factory(1, mix="pdf=1")), cloud_drain=True)
+    calls = []
+    monkeypatch.setattr(downloader.cloud_queue, "drain", lambda: calls.append("drain"))
+    assert downloader.sync_emalls_to_db() == 1
+    assert calls == ["drain"]
+
+
+def test_full_sync_fetches_message_ids_in_batches(downloader_factory, imap_server, mailbox_factory):
+    imap = imap_server(mailbox_factory(5, mix="pdf=1"))
+    downloader = downloader_factory(imap, header_batch_size=2)
+    downloader._connect()
+    imap.log.clear()
+
+    ids = downloader._fetch_message_ids([1, 2, 3, 4, 5])
+    assert sorted(ids) == [1, 2, 3, 4, 5]
+    fetches = [line for line in imap.log if "MESSAGE-ID" in line]
+    assert len(fetches) == 3
+    assert [f.split("FETCH ", 1)[1].split(" ", 1)[0] for f in fetches] == ["1:2", "3:4", "5"]
@@ -0,0 +1,75 @@
+'''
+FilePath: /AutoEmail/tests/test_file_server.py
+Description: /files 接口：整文件、Range (206 / 416)、ETag (304)、已归档文件
+'''
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.file_server import router, blob_store
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as c:
+        yield c
+
+
+def test_full_file_with_etag(client, unique):
+    data = os.urandom(5000) + unique.encode()
+    ref = blob_store.put_bytes(data, "pdf")
+    resp = client.get(f"/files/{ref['sha256']}.pdf")
+    assert resp.status_code == 200
+    assert resp.content == data
+    assert resp.headers["etag"] == f'"{ref["sha256"]}"'
+    assert resp.headers["content-type"] == "application/pdf"
+    assert resp.headers["accept-ranges"] == "bytes"
+
+    cached = client.get(f"/files/{ref['sha256']}.pdf", headers={"If-None-Match": resp.headers["etag"]})
+    assert cached.status_code == 304 and cached.content == b""
+
+
+def test_range_request(client, unique):
+    data = os.urandom(5000) + unique.encode()
+    ref = blob_store.put_bytes(data, "mp4")
+    resp = client.get(f"/files/{ref['sha256']}.mp4", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.content == data[100:200]
+    assert resp.headers["content-range"] == f"bytes 100-199/{len(data)}"
+
+
+def test_download_uses_original_filename(client, unique):
+    ref = blob_store.put_bytes(unique.encode(), "pdf")
+    resp = client.get(f"/files/{ref['sha256']}.pdf", params={"download": 1, "filename": "张三_resume.pdf"})
+    assert resp.headers["content-disposition"].startswith("attachment;")
+    assert "filename*=utf-8''%E5%BC%A0%E4%B8%89_resume.pdf" in resp.headers["content-disposition"]
+
+
+@pytest.mark.parametrize("name", ["../etc/passwd", "abc.pdf", "0" * 64 + ".pdf"])
+def test_unknown_or_invalid_names(client, name):
+    assert client.get(f"/files/{name}").status_code == 404
+
+
+def test_archived_file_range(client, unique, tmp_path):
+    from backend.app.archive import PackWriter
+    from backend.app.file_server import archive
+
+    data = os.urandom(3000) + unique.encode()
+    src = tmp_path / "loose.pdf"
+    src.write_bytes(data)
+    sha256 = blob_store.put_path(src, ".pdf")["sha256"]
+    loose = blob_store.path_for(sha256, ".pdf")
+    writer = PackWriter(archive.root)
+    assert writer.add(sha256, loose)
+    writer.close()
+    loose.unlink()
+
+    resp = client.get(f"/files/{sha256}.pdf", headers={"Range": "bytes=-100"})
+    assert resp.status_code == 206
+    assert resp.content == data[-100:]
+    assert resp.headers["content-range"] == f"bytes {len(data) - 100}-{len(data) - 1}/{len(data)}"
+    assert client.get(f"/files/{sha256}.pdf", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
@@ -0,0 +1,122 @@
+'''
+FilePath: /AutoEmail/tests/test_imap_fetch.py
+Description: BODYSTRUCTURE 优先的按需拉取：响应解析、part 展开、只下载白名单附件
+'''
+import base64
+import imaplib
+import os
+import quopri
+
+import pytest
+
+from backend.app.imap_fetch import (StructureFetcher, decode_part, iter_decoded, parse_fetch_response,
+                                    uid_set, walk_bodystructure)
+
+
+def test_parse_fetch_response_handles_literals_and_nested_lists():
+    data = [
+        (b'1 (UID 12 BODY[1] {5}', b'hello'),
+        b' FLAGS (\\Seen) ENVELOPE ("Mon, 1 Dec 2025" "subj" NIL NIL NIL NIL NIL NIL NIL "<id@x>"))',
+        b'2 (UID 13 BODY[2]<1024> "quoted \\"text\\"")',
+    ]
+    first, second = parse_fetch_response(data)
+    assert first["UID"] == "12"
+    assert first["BODY[1]"] == b"hello"
+    assert first["FLAGS"] == ["\\Seen"]
+    assert first["ENVELOPE"][1] == b"subj" and first["ENVELOPE"][2] is None
+    # 分段拉取的 <offset> 去掉，与请求的 part 名对应
+    assert second["BODY[2]"] == b'quoted "text"'
+
+
+def test_walk_bodystructure_numbers_parts_and_decodes_filenames():
+    bs = [
+        [b"text", b"plain", [b"charset", b"utf-8"], None, None, b"base64", "120", "3", None, None, None],
+        [b"application", b"pdf", [b"name", b"=?utf-8?B?566A5Y6G?=.pdf"], None, None, b"base64", "4096",
+         None, [b"attachment", [b"filename*", b"utf-8''%E7%AE%80%E5%8E%86.pdf"]], None],
+        [b"video", b"mp4", None, None, None, b"base64", "99999", None, [b"attachment", [b"filename", b"a.mp4"]], None],
+        b"mixed",
+    ]
+    parts = walk_bodystructure(bs)
+    assert [p["part"] for p in parts] == ["1", "2", "3"]
+    assert parts[0]["mime"] == "text/plain" and parts[0]["params"]["charset"] == "utf-8"
+    assert parts[1]["filename"] == "简历.pdf" and parts[1]["size"] == 4096
+    assert parts[2]["disposition"] == "attachment"
+
+
+@pytest.mark.parametrize("uids, expected", [
+    ([], ""),
+    ([5], "5"),
+    ([1, 2, 3, 7, 9, 10], "1:3,7,9:10"),
+    ([10, 9, 9, 1], "1,9:10"),
+    (list(range(1, 100001)), "1:100000"),
+])
+def test_uid_set_collapses_runs(uids, expected):
+    assert uid_set(uids) == expected
+
+
+def _split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+BINARY = os.urandom(3001) + "简历 résumé".encode()
+# quoted-printable 用于文本：长行 (会有软换行)、非 ASCII (=XX)、行尾空格
+TEXT = ("简历 résumé = café " * 12 + " \n").encode() * 40
+
+
+@pytest.mark.parametrize("size", [1, 3, 5, 76, 77, 4096])
+@pytest.mark.parametrize("encoding, encoded, payload", [
+    ("base64", base64.encodebytes(BINARY), BINARY),           # 每 76 个字符一个换行
+    ("base64", base64.b64encode(BINARY), BINARY),             # 没有换行
+    ("quoted-printable", quopri.encodestring(TEXT), TEXT),
+    ("quoted-printable", quopri.encodestring(TEXT).replace(b"\n", b"\r\n"), TEXT.replace(b"\n", b"\r\n")),
+    ("7bit", BINARY, BINARY),
+])
+def test_iter_decoded_matches_decode_part(encoding, encoded, payload, size):
+    # 任意位置切开 (base64 的 4 字符组、=XX、=\r\n 都可能被切断)，拼起来与整体解码一致
+    assert b"".join(iter_decoded(_split(encoded, size), encoding)) == decode_part(encoded, encoding) == payload
+
+
+def test_iter_decoded_edge_cases():
+    assert b"".join(iter_decoded([], "base64")) == b""
+    # 结尾缺少 = 填充
+    assert b"".join(iter_decoded([b"aGVsbG", b"8"], "base64")) == b"hello"
+    # 结尾没有换行的 quoted-printable
+    assert b"".join(iter_decoded([b"caf=C3", b"=A9=\r\n", b"!"], "quoted-printable")) == "café!".encode()
+
+
+def test_structure_mode_downloads_only_wanted_parts(imap_server, mailbox_factory):
+    msgs = mailbox_factory(4, mix="pdf=1,mp4=1", attachment_kb=64, seed=3)
+    imap = imap_server(msgs)
+    conn = imaplib.IMAP4("127.0.0.1", imap.port)
+    conn.login("hr@example.com", "test")
+    conn.select("INBOX", readonly=True)
+    try:
+        fetcher = StructureFetcher(conn, {".pdf"})
+        fetched = dict(fetcher.iter_messages(sorted(msgs)))
+    finally:
+        conn.logout()
+
+    assert not any("BODY.PEEK[]" in line for line in imap.log)
+    for uid, msg in msgs.items():
+        names = [a["filename"] for a in fetched[uid].attachments]
+        expected = [p.get_filename() for p in msg.iter_attachments() if p.get_filename().endswith(".pdf")]
+        assert names == expected
+        for att, part in zip(fetched[uid].attachments, (p for p in msg.iter_attachments())):
+            assert att["content"].getvalue() == part.get_content()
+        assert fetched[uid].message_id == msg["Message-ID"]
+        assert fetched[uid].body["plain"] and fetched[uid].raw_email is None
+
+
+def test_structure_mode_does_not_save_eml_by_default(downloader_factory, imap_server, mailbox_factory):
+    msgs = mailbox_factory(6, mix="mp4=1", attachment_kb=256)
+    imap = imap_server(msgs)
+    assert downloader_factory(imap).save_raw_eml is True
+    downloader = downloader_factory(imap, fetch_mode="structure")
+    assert downloader.save_raw_eml is False
+    assert downloader_factory(imap, fetch_mode="structure", save_raw_eml=True).save_raw_eml is True
+
+    imap.bytes_sent = 0
+    assert downloader.sync_emalls_to_db() == 6
+    mailbox_bytes = sum(len(m.raw) for m in imap.msgs.values())
+    # 视频附件不在白名单里，structure 模式下整封邮件都不用下载
+    assert imap.bytes_sent < mailbox_bytes / 10
@@ -0,0 +1,54 @@
+'''
+FilePath: /AutoEmail/tests/test_ingest_bench.py
+Description: 压测结果对比：按指标方向和容差判断回退，缺少的指标跳过
+'''
+import pytest
+
+from backend.bench.ingest_bench import _lookup, bench_dashboard, compare
+
+
+def _result(messages_per_s=100.0, cold_s=0.01, rss=50.0, **extra):
+    return {"sync": {"messages_per_s": messages_per_s, "mb_per_s": 10.0},
+            "db_insert": {"rows_per_s": 5000.0},
+            "dashboard": {"cold_s": cold_s, "warm_s": 0.005, "next_page_s": 0.005},
+            "peak_rss_mb": rss, **extra}
+
+
+def test_no_regression_within_tolerance():
+    assert compare(_result(messages_per_s=85, cold_s=0.0115, rss=59), _result(), 0.2) == []
+    # 变快 / 变省不算回退
+    assert compare(_result(messages_per_s=500, cold_s=0.001, rss=10), _result(), 0.2) == []
+
+
+@pytest.mark.parametrize("current, metric, change", [
+    (_result(messages_per_s=70), "sync.messages_per_s", -0.3),          # 越大越好：下降
+    (_result(cold_s=0.02), "dashboard.cold_s", 1.0),                    # 越小越好：上升
+    (_result(rss=75), "peak_rss_mb", 0.5),
+    (_result(messages_per_s=0), "sync.messages_per_s", -1.0),           # 掉到 0 也要报
+])
+def test_regression_reported(current, metric, change):
+    regressions = compare(current, _result(), 0.2)
+    assert [(r["metric"], r["change"]) for r in regressions] == [(metric, change)]
+    assert regressions[0]["baseline"] == _lookup(_result(), metric)
+
+
+def test_missing_metrics_are_skipped():
+    # 旧基线没有看板指标 (或值为 None)
+    baseline = _result()
+    del baseline["dashboard"]
+    current = _result(cold_s=None)
+    assert compare(current, baseline, 0.2) == []
+    assert compare({}, _result(), 0.2) == []
+
+
+
+def test_dashboard_cold_query_uses_a_new_engine(unique):
+    from backend.app import database
+
+    database.ResumeInit().create_resumes_bulk([{"uid": f"{unique}-{i}", "name": "x", "phone_num": "1"} for i in range(3)])
+    old_engine = database.get_engine()
+    result = bench_dashboard(page_size=2)
+    assert database.get_engine() is not old_engine
+    assert result["rows"] >= 3
+    for key in ("cold_s", "warm_s", "next_page_s", "after_update_s", "count_s"):
+        assert result[key] >= 0
@@ -0,0 +1,107 @@
+'''
+FilePath: /AutoEmail/tests/test_job_classifier.py
+Description: 岗位识别：最长命中、主题优先、英文别名的词边界、自定义同义词，与逐词查找的结果一致；历史简历回填
+'''
+import random
+
+import pytest
+
+from backend.app.job_classifier import JobClassifier, backfill_job_positions
+
+
+@pytest.fixture(scope="module")
+def clf():
+    return JobClassifier()
+
+
+@pytest.mark.parametrize("subject, body, expected", [
+    ("应聘前端-张三", "", "前端工程师"),
+    ("商业化运营岗位申请", "", "商业化运营"),                 # 最长命中优先于 "运营" 类的短词
+    ("简历-李四", "您好，我想应聘后台开发，附件是简历", "后端工程师"),
+    ("应聘测试开发", "之前做过前端", "测试工程师"),            # 主题命中时不看正文
+    ("投递 Android / iOS 开发", "", "移动端工程师"),
+    ("Senior Product Manager 申请", "", "产品经理"),          # 不区分大小写
+    ("你好", "", None),
+    ("", "", None),
+])
+def test_classify(clf, subject, body, expected):
+    assert clf.classify(subject, body) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("PM-王五", "产品经理"),
+    ("PMP证书持有者", None),          # 英文别名两侧不能是字母数字
+    ("iOS开发", "移动端工程师"),
+    ("bios调试", None),
+    ("QA工程师", "测试工程师"),
+    ("AQA", None),
+])
+def test_ascii_aliases_need_word_boundaries(clf, text, expected):
+    assert clf.classify(text) == expected
+
+
+def test_body_limit():
+    clf = JobClassifier(body_limit=10)
+    assert clf.classify("简历", "x" * 20 + "前端") is None
+    assert clf.classify("简历", "前端" + "x" * 20) == "前端工程师"
+
+
+def test_extra_synonyms_and_new_jobs():
+    clf = JobClassifier({"前端工程师": ["大前端"], "运维工程师": ["SRE", "运维"]})
+    assert clf.classify("应聘大前端") == "前端工程师"
+    assert clf.classify("SRE 申请") == "运维工程师"
+    # 默认同义词归属不会被追加的配置改掉
+    assert JobClassifier({"全栈工程师": ["前端"]}).classify("前端") == "前端工程师"
+
+
+def test_classify_many(clf):
+    assert clf.classify_many([("应聘BD", ""), ("hello", "数据分析师 简历"), ("", "")]) == \
+        ["BD", "数据分析", None]
+
+
+def _naive(clf, text):
+    """逐个词 str.find 的参考实现：最长优先，一样长取靠前的"""
+    text = text.lower()
+    best = None
+    for word, job in clf.patterns.items():
+        start = text.find(word)
+        while start != -1:
+            end = start + len(word)
+            ok_left = not (word[0].isascii() and word[0].isalnum()) or start == 0 \
+                or not (text[start - 1].isascii() and text[start - 1].isalnum())
+            ok_right = not (word[-1].isascii() and word[-1].isalnum()) or end == len(text) \
+                or not (text[end].isascii() and text[end].isalnum())
+            if ok_left and ok_right and (best is None or (len(word), -start) > best[:2]):
+                best = (len(word), -start, job)
+            start = text.find(word, start + 1)
+    return best[2] if best else None
+
+
+def test_matches_naive_search(clf):
+    rng = random.Random(0)
+    fragments = list(clf.patterns) + ["应聘", "-", " ", "张三", "x", "1", "开发", "运营", "a", "前", "工程"]
+    for _ in range(500):
+        text = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 8)))
+        assert clf.classify(text) == _naive(clf, text), text
+
+
+def test_backfill_uses_eml_subject_and_body(unique, tmp_path):
+    from backend.app.blob_store import BlobStore
+    from sqlmodel import Session, select
+    from backend.app.database import Resume, ResumeInit
+
+    store = BlobStore(tmp_path / "blobs")
+    eml = store.put_bytes(b"Subject: hi\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n"
+                          + "我想应聘数据分析".encode() + unique.encode(), "eml")
+    init = ResumeInit()
+    init.create_resumes_bulk([{"uid": f"{unique}-{i}", "name": "x", "phone_num": "1"} for i in range(3)])
+    init.link_blobs(f"{unique}-0", [{**store.put_bytes(unique.encode() + b"0", "eml"), "role": "eml",
+                                     "filename": "应聘前端-张三.eml"}])
+    init.link_blobs(f"{unique}-1", [{**eml, "role": "eml", "filename": "简历.eml"}])
+
+    stats = backfill_job_positions(JobClassifier())
+    assert stats["updated"] >= 2 and stats["from_body"] >= 1
+    with Session(init.engine) as session:
+        rows = session.exec(select(Resume.uid, Resume.job_position).where(Resume.uid.startswith(unique))).all()
+    jobs = dict(rows)
+    assert jobs == {f"{unique}-0": "前端工程师", f"{unique}-1": "数据分析", f"{unique}-2": None}
@@ -0,0 +1,44 @@
+'''
+FilePath: /AutoEmail/tests/test_learn.py
+Description: 后端入口：只有 /uploads 允许跨域，/api 与 /metrics 只给内部调用
+'''
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import auth
+from backend.learn import CORS_ORIGINS, app
+
+LOOPBACK = ("127.0.0.1", 50000)
+REMOTE = ("203.0.113.7", 50000)
+
+
+def _preflight(client, path, origin):
+    return client.options(path, headers={"Origin": origin, "Access-Control-Request-Method": "PUT"})
+
+
+def test_cors_only_on_uploads():
+    client = TestClient(app, client=REMOTE)
+    origin = CORS_ORIGINS[0]
+    resp = _preflight(client, "/uploads/abc/chunks/0", origin)
+    assert resp.headers.get("access-control-allow-origin") == origin
+    assert "PATCH" not in resp.headers.get("access-control-allow-methods", "")
+
+    assert "access-control-allow-origin" not in _preflight(client, "/uploads", "https://evil.example").headers
+    api = client.get("/api/jobs", headers={"Origin": origin})
+    assert "access-control-allow-origin" not in api.headers
+
+
+@pytest.mark.parametrize("path", ["/api/jobs", "/metrics"])
+def test_internal_endpoints_reject_remote_clients(path):
+    assert TestClient(app, client=REMOTE).get(path).status_code == 403
+    assert TestClient(app, client=LOOPBACK).get(path).status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/api/jobs", "/metrics"])
+def test_internal_endpoints_with_token(path, monkeypatch):
+    monkeypatch.setattr(auth, "API_TOKEN", "s3cret")
+    # 配置了 token 时本机也要带 token
+    assert TestClient(app, client=LOOPBACK).get(path).status_code == 401
+    client = TestClient(app, client=REMOTE)
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -0,0 +1,62 @@
+'''
+FilePath: /AutoEmail/tests/test_metrics.py
+Description: 阶段统计：多线程同时到点写文件不出错，统计写入失败不影响被计时的代码
+'''
+import json
+import threading
+
+import pytest
+
+from backend.app import metrics
+from backend.app.metrics import REGISTRY, STAGE_TOTAL, timed
+
+
+@pytest.fixture
+def publishing(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", tmp_path)
+    monkeypatch.setattr(REGISTRY, "_source", None)
+    monkeypatch.setattr(REGISTRY, "_publish_interval", 10.0)
+    # interval=0：每次 timed 结束都到点
+    REGISTRY.publish("test", interval=0)
+    return tmp_path
+
+
+def test_concurrent_flush(publishing):
+    errors = []
+
+    def work():
+        for _ in range(150):
+            try:
+                with timed("test_concurrent"):
+                    pass
+            except Exception as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    REGISTRY.flush()
+    assert list(publishing.glob("*.tmp")) == []
+    published = json.loads((publishing / "test.json").read_text())["metrics"]
+    samples = dict((tuple(k), v) for k, v in published["autoemail_stage_total"]["samples"])
+    assert samples[("test_concurrent", "ok")] == 1200
+
+
+def test_publish_errors_do_not_escape_timed(publishing, monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(metrics.json, "dumps", broken)
+
+    with timed("test_publish_error"):
+        pass
+    # 被计时代码自己的异常照常抛出，不被统计的异常盖掉
+    with pytest.raises(ValueError):
+        with timed("test_publish_error"):
+            raise ValueError("business")
+    samples = dict((tuple(k), v) for k, v in STAGE_TOTAL.snapshot()["samples"])
+    assert samples[("test_publish_error", "ok")] == 1
+    assert samples[("test_publish_error", "error")] == 1
@@ -0,0 +1,69 @@
+'''
+FilePath: /AutoEmail/tests/test_preview_cache.py
+Description: 预览缓存：内存层按字节数淘汰，内容 hash 表有上限，磁盘层命中时不再生成
+'''
+import sys
+
+from preview_cache import PreviewCache
+
+
+def _files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"f{i}.docx"
+        path.write_bytes(f"file {i}".encode())
+        paths.append(path)
+    return paths
+
+
+def test_memory_tier_bounded_by_bytes(tmp_path):
+    value = "x" * 1000
+    cache = PreviewCache(tmp_path / "cache", memory_bytes=sys.getsizeof(value) * 3)
+    for path in _files(tmp_path, 5):
+        cache.get(path, "docx_html", lambda p: value)
+
+    assert len(cache._memory) == 3
+    assert cache._memory_used <= cache.memory_bytes
+    # 最早的两个已被挤出内存层
+    assert cache.key_for(tmp_path / "f0.docx", "docx_html") not in cache._memory
+    assert cache.key_for(tmp_path / "f4.docx", "docx_html") in cache._memory
+
+
+def test_oversized_value_stays_on_disk_only(tmp_path):
+    cache = PreviewCache(tmp_path / "cache", memory_bytes=100)
+    path, = _files(tmp_path, 1)
+    calls = []
+
+    def build(p):
+        calls.append(p)
+        return "y" * 10000
+
+    assert cache.get(path, "pdf_b64", build) == "y" * 10000
+    assert not cache._memory and cache._memory_used == 0
+    # 第二次从磁盘层读出，不再生成
+    assert cache.get(path, "pdf_b64", build) == "y" * 10000
+    assert len(calls) == 1
+
+
+def test_hash_table_is_lru(tmp_path):
+    cache = PreviewCache(tmp_path / "cache", hash_items=2)
+    paths = _files(tmp_path, 4)
+    for path in paths:
+        cache.key_for(path, "docx_html")
+    assert len(cache._hashes) == 2
+    assert [sig[0] for sig in cache._hashes] == [str(paths[2]), str(paths[3])]
+
+
+def test_overwriting_a_key_counts_its_size_once(tmp_path):
+    cache = PreviewCache(tmp_path / "cache")
+    cache._write_disk("docx_html/k", "x" * 1000)
+    cache._write_disk("docx_html/k", "y" * 400)
+    assert cache._disk_bytes == 400
+    assert PreviewCache(tmp_path / "cache")._disk_bytes == 400
+
+
+def test_default_dir_follows_storage_dir():
+    from backend.app.utils import STORAGE_DIR
+    from preview_cache import PREVIEW_CACHE_DIR
+
+    assert PREVIEW_CACHE_DIR == STORAGE_DIR / "preview_cache"
@@ -0,0 +1,79 @@
+'''
+FilePath: /AutoEmail/tests/test_rate_limit.py
+Description: 提交限流：令牌桶的扣减/补充/清理，IP 与手机号两个桶，X-Forwarded-For 只信可信代理
+'''
+import pytest
+
+from backend.app import rate_limit
+from backend.app.rate_limit import SqliteTokenBucket, SubmitRateLimiter, TokenBucket, resolve_client_ip
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+def test_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(burst=2, rate=1 / 60)
+    assert bucket.acquire("a") == (True, 0.0)
+    assert bucket.acquire("a") == (True, 0.0)
+    allowed, wait = bucket.acquire("a")
+    assert not allowed and wait == pytest.approx(60)
+    # 别的 key 不受影响
+    assert bucket.acquire("b")[0]
+
+    clock[0] += 30
+    allowed, wait = bucket.acquire("a")
+    assert not allowed and wait == pytest.approx(30)
+    clock[0] += 30
+    assert bucket.acquire("a")[0]
+
+
+def test_bucket_evicts_idle_and_excess_keys(clock):
+    bucket = TokenBucket(burst=1, rate=1, max_keys=2)
+    for key in "abc":
+        bucket.acquire(key)
+    assert list(bucket._buckets) == ["b", "c"]
+    # 闲置到令牌回满的 key 被清理
+    clock[0] += 5
+    bucket.acquire("d")
+    assert list(bucket._buckets) == ["d"]
+
+
+def test_sqlite_bucket(clock, unique):
+    from backend.app.database import get_engine
+
+    bucket = SqliteTokenBucket(get_engine(), f"test-{unique}", burst=2, rate=1 / 60)
+    assert bucket.acquire("1.1.1.1")[0] and bucket.acquire("1.1.1.1")[0]
+    allowed, wait = bucket.acquire("1.1.1.1")
+    assert not allowed and wait == pytest.approx(60)
+    clock[0] += 60
+    assert bucket.acquire("1.1.1.1")[0]
+
+
+def test_ip_rejection_does_not_spend_phone_tokens(clock):
+    limiter = SubmitRateLimiter(ip_rule="1,60", phone_rule="1,600", backend="memory")
+    assert limiter.check(ip="1.1.1.1", phone="138") is None
+    assert limiter.check(ip="1.1.1.1", phone="139") == pytest.approx(60)
+    # 139 没被扣过，换个 IP 仍能提交
+    assert limiter.check(ip="2.2.2.2", phone="139") is None
+    assert limiter.check(ip="3.3.3.3", phone="138") == pytest.approx(600)
+
+
+@pytest.mark.parametrize("peer, forwarded, expected", [
+    ("203.0.113.9", "1.2.3.4", "203.0.113.9"),               # 不是代理直连：忽略伪造的头
+    ("10.0.0.2", None, "10.0.0.2"),
+    ("10.0.0.2", "1.2.3.4", "1.2.3.4"),
+    ("10.0.0.2", "6.6.6.6, 1.2.3.4", "1.2.3.4"),             # 客户端自己带的头在左边，不采用
+    ("10.0.0.2", "1.2.3.4, 10.0.0.3", "1.2.3.4"),            # 跳过多层可信代理
+    ("127.0.0.1", "bogus, 1.2.3.4", "1.2.3.4"),
+])
+def test_forwarded_for_only_from_trusted_proxy(peer, forwarded, expected):
+    assert resolve_client_ip(peer, forwarded, "127.0.0.1, 10.0.0.0/8") == expected
+
+
+def test_forwarded_for_ignored_without_trusted_proxies():
+    assert resolve_client_ip("127.0.0.1", "1.2.3.4", "") == "127.0.0.1"
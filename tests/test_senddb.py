@@ -0,0 +1,51 @@
+'''
+FilePath: /AutoEmail/tests/test_senddb.py
+Description: 页面直连数据库的提交：扩展名与后端接口走同一个校验
+'''
+import io
+
+from sqlmodel import Session, select
+
+from backend.app.database import Resume
+from conftest import make_pdf
+from senddb import ResumeDataManager
+
+
+def _upload(name, data):
+    f = io.BytesIO(data)
+    f.name = name
+    return f
+
+
+def _resume(unique):
+    return {"uid": unique, "name": "张三", "phone_num": "13800000000", "job_position": "设计"}
+
+
+def test_save_rejects_unsafe_extension(unique):
+    manager = ResumeDataManager()
+    before = set(manager.blob_store.tmp_dir.iterdir())
+    assert manager.save(_resume(unique), _upload("x./../../evil", b"data"), None) == "invalid_file"
+    assert manager.save(_resume(unique), _upload("a.pdf", b"data"), _upload("b.m/ov", b"v")) == "invalid_file"
+    assert not manager.is_uid_exists(unique)
+    assert set(manager.blob_store.tmp_dir.iterdir()) == before
+
+    assert manager.save(_resume(unique), _upload("简历.PDF", make_pdf(unique)), None) == "ok"
+    with Session(manager.engine) as session:
+        path = session.exec(select(Resume.attachment_path).where(Resume.uid == unique)).one()
+    assert path.endswith(".pdf")
+    assert manager.original_filename(path) == "张三_resume.pdf"
+
+
+def test_pages_skip_senddb_when_api_configured(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    code = ("import sys, candidate, hr_app; "
+            "assert type(candidate.get_data_manager()).__name__ == 'ResumeApiClient'; "
+            "assert type(hr_app.get_data_manager()).__name__ == 'ResumeApiClient'; "
+            "assert not {'senddb', 'backend.app.upload', 'backend.app.text_extract'} & set(sys.modules)")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "AUTOEMAIL_STORAGE_DIR": str(tmp_path), "AUTOEMAIL_API_URL": "http://127.0.0.1:9",
+           "PYTHONPATH": os.pathsep.join([root, os.path.join(root, "frontend", "app")])}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env, cwd=root, capture_output=True)
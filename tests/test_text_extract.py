@@ -0,0 +1,86 @@
+'''
+FilePath: /AutoEmail/tests/test_text_extract.py
+Description: 简历正文抽取：PDF 能抽出文字，候选人提交后正文进入全文索引
+'''
+import io
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.text_extract import extract_file
+from conftest import make_pdf
+
+
+def test_extract_pdf_text(tmp_path):
+    path = tmp_path / "resume.pdf"
+    path.write_bytes(make_pdf("Kubernetes operator experience"))
+    status, text, error, _ = extract_file(str(path), timeout=10)
+    assert (status, error) == ("ok", None)
+    assert "Kubernetes operator" in text
+
+
+def test_submitted_resume_is_searchable(unique):
+    from backend.app.api import router
+    from backend.app.database import ResumeInit
+
+    app = FastAPI()
+    app.include_router(router)
+    word = f"zq{unique}"
+    with TestClient(app, client=("127.0.0.1", 50000)) as client:
+        resp = client.post("/api/resumes", data={
+            "uid": f"{unique}-1", "name": "王五", "phone_num": f"139{int(unique[:6], 16) % 10**8:08d}",
+            "job_position": f"岗位-{unique}",
+        }, files={"resume_file": ("resume.pdf", io.BytesIO(make_pdf(f"skills {word}")), "application/pdf")})
+    assert resp.status_code == 201
+
+    # BackgroundTasks 在响应返回前已执行完
+    rows, _ = ResumeInit().search_resumes(word)
+    assert [r.uid for r in rows] == [f"{unique}-1"]
+
+
+def test_synced_resume_is_searchable(mailbox_factory, imap_server, downloader_factory, unique):
+    from backend.app.database import ResumeInit
+
+    word = f"zq{unique}"
+    msgs = mailbox_factory(1, mix="pdf=1")
+    for part in msgs[1].iter_attachments():
+        part.set_content(make_pdf(f"golang {word}"), maintype="application", subtype="pdf",
+                         filename=part.get_filename())
+    downloader = downloader_factory(imap_server(msgs))
+    assert downloader.sync_emalls_to_db() == 1
+
+    rows, _ = ResumeInit().search_resumes(word)
+    assert len(rows) == 1
+
+
+def test_executor_is_reused_and_not_forked(tmp_path):
+    from backend.app.text_extract import TextExtractor
+
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(f"resume {i}")
+        paths.append(str(path))
+    extractor = TextExtractor(workers=1, timeout=10)
+    try:
+        first = extractor.extract_paths({"a": paths[0]})
+        executor = extractor._executor
+        second = extractor.extract_paths({"b": paths[1]})
+        assert extractor._executor is executor
+        assert executor._mp_context.get_start_method() in ("forkserver", "spawn")
+        assert [(r["status"], r["text"]) for r in first + second] == [("ok", "resume 0"), ("ok", "resume 1")]
+    finally:
+        extractor.close()
+    assert extractor._executor is None
+
+
+def test_api_import_does_not_touch_database(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    code = ("import backend.app.api as api, backend.app.database as db; "
+            "assert api._text_extractor is None and db._engine is None")
+    env = {**os.environ, "AUTOEMAIL_STORAGE_DIR": str(tmp_path)}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,104 @@
+'''
+FilePath: /AutoEmail/tests/test_upload.py
+Description: 分块上传：乱序/续传、校验、按 IP 的配额与全局并发上限、闲置清理
+'''
+import os
+import time
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.upload import UploadError, UploadManager
+
+
+def _manager(tmp_path, **kwargs):
+    kwargs.setdefault("chunk_size", 1024)
+    kwargs.setdefault("max_size", 10 * 1024)
+    return UploadManager(tmp_path / "uploads", **kwargs)
+
+
+def test_chunks_out_of_order_and_resume(tmp_path, unique, monkeypatch):
+    from backend.app import upload
+
+    manager = _manager(tmp_path)
+    monkeypatch.setattr(upload, "upload_manager", manager)
+    app = FastAPI()
+    app.include_router(upload.router)
+    client = TestClient(app)
+
+    data = os.urandom(2500) + unique.encode()
+    created = client.post("/uploads", json={"filename": "作品.mp4", "size": len(data),
+                                            "sha256": hashlib.sha256(data).hexdigest()}).json()
+    upload_id, size = created["upload_id"], created["chunk_size"]
+    assert created["total_chunks"] == 3
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+
+    for i in (2, 0):
+        resp = client.put(f"/uploads/{upload_id}/chunks/{i}", content=chunks[i],
+                          headers={"X-Chunk-Sha256": hashlib.sha256(chunks[i]).hexdigest()})
+        assert resp.status_code == 200
+    assert client.get(f"/uploads/{upload_id}").json()["received"] == [0, 2]
+    assert client.post(f"/uploads/{upload_id}/complete").status_code == 409
+
+    bad = client.put(f"/uploads/{upload_id}/chunks/1", content=chunks[1], headers={"X-Chunk-Sha256": "0" * 64})
+    assert bad.status_code == 422
+    assert client.put(f"/uploads/{upload_id}/chunks/1", content=chunks[1] + b"x").status_code == 400
+    assert client.put(f"/uploads/{upload_id}/chunks/1", content=chunks[1]).status_code == 200
+    blob = client.post(f"/uploads/{upload_id}/complete").json()
+    assert blob["sha256"] == hashlib.sha256(data).hexdigest()
+    assert open(manager.get_completed(upload_id)["path"], "rb").read() == data
+
+
+def test_create_does_not_preallocate(tmp_path):
+    manager = _manager(tmp_path)
+    upload_id = manager.create("a.pdf", 10 * 1024)["upload_id"]
+    assert (manager.root / upload_id / "data.part").stat().st_size == 0
+
+
+def test_per_client_quota(tmp_path):
+    manager = _manager(tmp_path, max_open_per_client=2, max_bytes_per_client=15 * 1024)
+    manager.create("a.pdf", 8 * 1024, client="1.1.1.1")
+    with pytest.raises(UploadError) as exc:
+        manager.create("b.pdf", 8 * 1024, client="1.1.1.1")
+    assert exc.value.status_code == 429
+    manager.create("b.pdf", 4 * 1024, client="1.1.1.1")
+    with pytest.raises(UploadError) as exc:
+        manager.create("c.pdf", 1024, client="1.1.1.1")
+    assert exc.value.status_code == 429
+    # 别的 IP 不受影响
+    manager.create("c.pdf", 8 * 1024, client="2.2.2.2")
+
+
+def test_global_open_cap(tmp_path):
+    manager = _manager(tmp_path, max_open=2)
+    manager.create("a.pdf", 1024, client="1.1.1.1")
+    manager.create("b.pdf", 1024, client="2.2.2.2")
+    with pytest.raises(UploadError) as exc:
+        manager.create("c.pdf", 1024, client="3.3.3.3")
+    assert exc.value.status_code == 503
+
+
+def test_create_rate_limited(tmp_path):
+    manager = _manager(tmp_path, rate_rule="2,3600", max_open_per_client=100)
+    manager.create("a.pdf", 1024, client="1.1.1.1")
+    manager.create("b.pdf", 1024, client="1.1.1.1")
+    with pytest.raises(UploadError) as exc:
+        manager.create("c.pdf", 1024, client="1.1.1.1")
+    assert exc.value.status_code == 429 and "Retry-After" in exc.value.headers
+
+
+def test_idle_uploads_are_cleaned(tmp_path):
+    manager = _manager(tmp_path, max_open_per_client=1)
+    upload_id = manager.create("a.pdf", 1024, client="1.1.1.1")["upload_id"]
+    upload_dir = manager.root / upload_id
+    meta = manager._meta(upload_dir)
+    meta["created"] -= 7200
+    manager._save_meta(upload_dir, meta)
+    os.utime(upload_dir / "data.part", (time.time() - 7200, time.time() - 7200))
+
+    assert manager.cleanup(idle=3600) == []
+    assert not upload_dir.exists()
+    # 名额释放，同一 IP 可以重新开始
+    manager.create("a.pdf", 1024, client="1.1.1.1")